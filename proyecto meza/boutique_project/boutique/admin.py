@@ -1,12 +1,34 @@
+from datetime import date
+
 from django.contrib import admin
-from .models import Categoria, Producto, Carrito, Pedido, ItemPedido, Oferta
+from django.core.exceptions import PermissionDenied
+from django.db.models import F, Sum
+from django.http import StreamingHttpResponse
+from django.template.response import TemplateResponse
+from django.urls import path
+from django.utils import timezone
+from .busqueda import fts_disponible, ids_coincidentes
+from .intercambio import exportar_pedidos
+from .models import (
+    AGRUPACIONES_VENTAS, PRECIO_LINEA, Categoria, Producto, Carrito, Pedido, ItemPedido, EventoPedido, Oferta, Reserva, Tarea, VentaDiaria,
+)
+from .paginacion import PaginadorEstimado
+
+def _fecha(request, nombre):
+    try:
+        return date.fromisoformat(request.GET.get(nombre, ''))
+    except ValueError:
+        return None
 
 class ProductoAdmin(admin.ModelAdmin):
     list_display = ['nombre', 'precio', 'categoria', 'cantidad', 'disponible', 'fecha_creacion']
     list_filter = ['categoria', 'disponible', 'fecha_creacion']
     search_fields = ['nombre', 'descripcion']
     list_editable = ['precio', 'cantidad', 'disponible']
+    list_select_related = ['categoria']
     readonly_fields = ['fecha_creacion']
+    paginator = PaginadorEstimado
+    show_full_result_count = False
     
     fieldsets = (
         ('Información Básica', {
@@ -20,6 +42,12 @@ class ProductoAdmin(admin.ModelAdmin):
             'classes': ('collapse',)
         }),
     )
+    
+    def get_search_results(self, request, queryset, search_term):
+        # Índice FTS5 en lugar de LIKE '%x%' sobre nombre y descripción
+        if not search_term or not fts_disponible():
+            return super().get_search_results(request, queryset, search_term)
+        return queryset.filter(pk__in=ids_coincidentes(search_term)), False
 
 class CategoriaAdmin(admin.ModelAdmin):
     list_display = ['nombre', 'descripcion_corta']
@@ -29,37 +57,136 @@ class CategoriaAdmin(admin.ModelAdmin):
         return obj.descripcion[:50] + '...' if len(obj.descripcion) > 50 else obj.descripcion
     descripcion_corta.short_description = 'Descripción'
 
+class EventoPedidoInline(admin.TabularInline):
+    # Historial de estados; lo escribe Pedido.save() al cambiar el estado
+    model = EventoPedido
+    fields = ['fecha', 'anterior', 'estado']
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+    
+    def has_add_permission(self, request, obj=None):
+        return False
+
 class PedidoAdmin(admin.ModelAdmin):
     list_display = ['id', 'usuario', 'estado', 'total', 'fecha_pedido', 'metodo_pago']
     list_filter = ['estado', 'metodo_pago', 'fecha_pedido']
     search_fields = ['usuario__username', 'usuario__first_name', 'usuario__last_name']
     readonly_fields = ['fecha_pedido', 'fecha_actualizacion', 'total']
+    change_list_template = 'admin/boutique/pedido/change_list.html'
+    list_select_related = ['usuario']
+    # Navegación por año/mes/día sobre pedido_fecha_idx
+    date_hierarchy = 'fecha_pedido'
+    raw_id_fields = ['usuario']
+    inlines = [EventoPedidoInline]
+    paginator = PaginadorEstimado
+    show_full_result_count = False
     
     def get_readonly_fields(self, request, obj=None):
         if obj:  # editing an existing object
             return self.readonly_fields + ['usuario']
         return self.readonly_fields
+    
+    def get_urls(self):
+        return [
+            path('exportar/', self.admin_site.admin_view(self.exportar), name='boutique_pedido_exportar'),
+            path('reporte/', self.admin_site.admin_view(self.reporte), name='boutique_pedido_reporte'),
+        ] + super().get_urls()
+    
+    def exportar(self, request):
+        """Items de pedido en CSV o JSON Lines, enviados mientras se leen"""
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        formato = 'jsonl' if request.GET.get('formato') == 'jsonl' else 'csv'
+        response = StreamingHttpResponse(
+            exportar_pedidos(formato, _fecha(request, 'desde'), _fecha(request, 'hasta')),
+            content_type='text/csv; charset=utf-8' if formato == 'csv' else 'application/x-ndjson; charset=utf-8',
+        )
+        response['Content-Disposition'] = f'attachment; filename="pedidos.{formato}"'
+        return response
+    
+    def reporte(self, request):
+        """Ventas agrupadas por día, categoría, producto o método de pago (desde VentaDiaria)"""
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        por = request.GET.get('por') if request.GET.get('por') in AGRUPACIONES_VENTAS else 'dia'
+        desde, hasta = _fecha(request, 'desde'), _fecha(request, 'hasta')
+        ventas = VentaDiaria.objects.entre(desde, hasta)
+        filas = list(ventas.resumen(por))
+        if por == 'metodo_pago':
+            nombres = dict(Pedido.METODO_PAGO_CHOICES)
+            for fila in filas:
+                fila['clave'] = nombres.get(fila['clave'], fila['clave'])
+        return TemplateResponse(request, 'admin/boutique/pedido/reporte.html', {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'Reporte de ventas',
+            'filas': filas,
+            'totales': ventas.aggregate(unidades=Sum('unidades'), ingresos=Sum('ingresos')),
+            'agrupaciones': AGRUPACIONES_VENTAS,
+            'por': por,
+            'desde': desde,
+            'hasta': hasta,
+        })
 
 class OfertaAdmin(admin.ModelAdmin):
-    list_display = ['nombre', 'tipo_descuento', 'valor_descuento', 'fecha_inicio', 'fecha_fin', 'activa', 'esta_activa']
-    list_filter = ['activa', 'tipo_descuento', 'fecha_inicio']
+    list_display = ['nombre', 'tipo_descuento', 'valor_descuento', 'fecha_inicio', 'fecha_fin', 'activa', 'vigente']
+    list_filter = ['activa', 'vigente', 'tipo_descuento', 'fecha_inicio']
     list_editable = ['activa']
-    filter_horizontal = ['productos']
-    
-    def esta_activa(self, obj):
-        return obj.esta_activa()
-    esta_activa.boolean = True
-    esta_activa.short_description = 'Vigente'
+    # Búsqueda en vez de un <select> con todo el catálogo
+    autocomplete_fields = ['productos']
 
 class CarritoAdmin(admin.ModelAdmin):
     list_display = ['usuario', 'producto', 'cantidad', 'subtotal', 'fecha_agregado']
     list_filter = ['fecha_agregado']
     search_fields = ['usuario__username', 'producto__nombre']
+    list_select_related = ['usuario', 'producto']
+    raw_id_fields = ['usuario', 'producto']
+    paginator = PaginadorEstimado
+    show_full_result_count = False
+    
+    def get_queryset(self, request):
+        # El subtotal sale de la misma consulta, no de leer el precio efectivo fila por fila
+        return super().get_queryset(request).annotate(importe=F('cantidad') * PRECIO_LINEA)
+    
+    @admin.display(description='Subtotal', ordering='importe')
+    def subtotal(self, obj):
+        return obj.importe
+
+class ReservaAdmin(admin.ModelAdmin):
+    list_display = ['usuario', 'producto', 'cantidad', 'vence', 'vigente']
+    search_fields = ['usuario__username', 'producto__nombre']
+    list_select_related = ['usuario', 'producto']
+    raw_id_fields = ['usuario', 'producto']
+    paginator = PaginadorEstimado
+    show_full_result_count = False
+    
+    @admin.display(boolean=True, description='Vigente')
+    def vigente(self, obj):
+        return obj.vence > timezone.now()
+
+class ItemPedidoAdmin(admin.ModelAdmin):
+    list_display = ['pedido', 'producto', 'cantidad', 'precio']
+    list_select_related = ['pedido__usuario', 'producto']
+    raw_id_fields = ['pedido', 'producto']
+    search_fields = ['=pedido__id']
+    paginator = PaginadorEstimado
+    show_full_result_count = False
+
+class TareaAdmin(admin.ModelAdmin):
+    list_display = ['id', 'nombre', 'estado', 'intentos', 'ejecutar_despues', 'fecha_actualizacion']
+    list_filter = ['estado', 'nombre']
+    search_fields = ['clave']
+    readonly_fields = ['fecha_creacion', 'fecha_actualizacion']
+    paginator = PaginadorEstimado
+    show_full_result_count = False
 
 # Registrar modelos en el admin
 admin.site.register(Categoria, CategoriaAdmin)
 admin.site.register(Producto, ProductoAdmin)
 admin.site.register(Carrito, CarritoAdmin)
+admin.site.register(Reserva, ReservaAdmin)
 admin.site.register(Pedido, PedidoAdmin)
-admin.site.register(ItemPedido)
-admin.site.register(Oferta, OfertaAdmin)
\ No newline at end of file
+admin.site.register(ItemPedido, ItemPedidoAdmin)
+admin.site.register(Oferta, OfertaAdmin)
+admin.site.register(Tarea, TareaAdmin)
\ No newline at end of file
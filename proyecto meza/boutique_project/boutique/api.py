@@ -0,0 +1,217 @@
+import hashlib
+from functools import wraps
+
+from django.db.models import Count, Max, Prefetch
+from django.http import JsonResponse
+from django.shortcuts import aget_object_or_404
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.http import require_safe
+
+from .models import Producto, Categoria, Oferta
+from .paginacion import PaginaPorClave, leer_por_pagina
+
+# API de solo lectura, versión 1.
+#
+# Cada listado responde con ETag y Last-Modified calculados con un solo
+# agregado (máxima fecha_actualizacion y número de filas), así que un cliente
+# que revalida recibe un 304 sin que se serialice ni se lea el catálogo.
+# Las vistas son async y leen con el ORM async.
+
+CAMPOS_PRODUCTO = {
+    'id': lambda p: p.id,
+    'nombre': lambda p: p.nombre,
+    'precio': lambda p: p.precio,
+    'precio_final': lambda p: p.precio_final,
+    'cantidad': lambda p: p.cantidad,
+    'descripcion': lambda p: p.descripcion,
+    'categoria': lambda p: p.categoria_id,
+    'imagen': lambda p: p.imagen.url if p.imagen else None,
+    'fecha_actualizacion': lambda p: p.fecha_actualizacion,
+}
+
+# Columnas que necesita cada campo, para pedir solo esas con only()
+COLUMNAS_PRODUCTO = {
+    'categoria': ('categoria_id',),
+    'precio_final': ('precio', 'precio_efectivo__precio'),
+}
+
+
+class ParametroInvalido(ValueError):
+    pass
+
+
+class CampoInvalido(ParametroInvalido):
+    pass
+
+
+def leer_id(request, nombre):
+    valor = request.GET.get(nombre)
+    if not valor:
+        return None
+    try:
+        return int(valor)
+    except ValueError:
+        raise ParametroInvalido(f'"{nombre}" debe ser un id numérico') from None
+
+
+def leer_campos(request, disponibles):
+    valor = request.GET.get('campos')
+    if not valor:
+        return list(disponibles)
+    campos = [campo.strip() for campo in valor.split(',') if campo.strip()]
+    invalidos = [campo for campo in campos if campo not in disponibles]
+    if invalidos:
+        raise CampoInvalido(f'Campos no válidos: {", ".join(invalidos)}')
+    return campos
+
+
+def error(mensaje, status=400):
+    return JsonResponse({'error': mensaje}, status=status)
+
+
+def _url_pagina(request, **parametros):
+    query = request.GET.copy()
+    for nombre, valor in parametros.items():
+        query.pop(nombre, None)
+        if valor is not None:
+            query[nombre] = valor
+    return request.build_absolute_uri(f'{request.path}?{query.urlencode()}')
+
+
+def condicional(version):
+    """Como @condition de Django, para vistas async.
+
+    ``version(request, *args, **kwargs)`` es una corrutina que devuelve
+    ``(etag, ultima_modificacion)``, así ambas salen de la misma consulta.
+    """
+    def decorador(vista):
+        @wraps(vista)
+        async def envoltura(request, *args, **kwargs):
+            try:
+                etag, ultima = await version(request, *args, **kwargs)
+            except ParametroInvalido as e:
+                # Parámetros de filtro no válidos: 400 antes de consultar la versión
+                return error(str(e))
+            etag = quote_etag(etag) if etag is not None else None
+            ultima = int(ultima.timestamp()) if ultima else None
+            response = get_conditional_response(request, etag=etag, last_modified=ultima)
+            if response is None:
+                response = await vista(request, *args, **kwargs)
+            if request.method in ('GET', 'HEAD'):
+                if ultima and not response.has_header('Last-Modified'):
+                    response.headers['Last-Modified'] = http_date(ultima)
+                if etag:
+                    response.headers.setdefault('ETag', etag)
+            return response
+        return envoltura
+    return decorador
+
+
+def version_listado(queryset_de):
+    """Versión de un listado: máxima fecha_actualizacion y número de filas"""
+    async def version(request):
+        datos = await queryset_de(request).order_by().aaggregate(
+            ultima=Max('fecha_actualizacion'), filas=Count('id')
+        )
+        clave = f'{request.path}?{request.GET.urlencode()}|{datos["ultima"]}|{datos["filas"]}'
+        return hashlib.sha1(clave.encode()).hexdigest(), datos['ultima']
+    return version
+
+
+# Productos
+
+def _productos(request):
+    productos = Producto.objects.disponibles()
+    categoria_id = leer_id(request, 'categoria')
+    if categoria_id is not None:
+        productos = productos.filter(categoria_id=categoria_id)
+    return productos
+
+
+@require_safe
+@condicional(version_listado(_productos))
+async def productos(request):
+    try:
+        campos = leer_campos(request, CAMPOS_PRODUCTO)
+    except CampoInvalido as e:
+        return error(str(e))
+
+    # Solo se leen las columnas pedidas; nombre e id hacen falta para el cursor
+    columnas = {'nombre', 'id'}
+    for campo in campos:
+        columnas.update(COLUMNAS_PRODUCTO.get(campo, (campo,)))
+    productos = _productos(request)
+    if 'precio_final' in campos:
+        productos = productos.con_precio()
+    pagina = PaginaPorClave(
+        productos.only(*columnas),
+        despues=request.GET.get('despues'),
+        antes=request.GET.get('antes'),
+        por_pagina=leer_por_pagina(request.GET.get('por_pagina')),
+    )
+    if pagina.cursor_invalido:
+        return error('Cursor de paginación no válido')
+    await pagina.acargar()
+    return JsonResponse({
+        'resultados': [{campo: CAMPOS_PRODUCTO[campo](p) for campo in campos} for p in pagina],
+        'siguiente': _url_pagina(request, despues=pagina.cursor_siguiente, antes=None) if pagina.tiene_siguiente else None,
+        'anterior': _url_pagina(request, antes=pagina.cursor_anterior, despues=None) if pagina.tiene_anterior else None,
+    })
+
+
+async def _version_producto(request, producto_id):
+    fecha = await Producto.objects.filter(pk=producto_id).values_list('fecha_actualizacion', flat=True).afirst()
+    if fecha is None:
+        return None, None
+    return hashlib.sha1(f'{request.get_full_path()}|{fecha}'.encode()).hexdigest(), fecha
+
+
+@require_safe
+@condicional(_version_producto)
+async def producto(request, producto_id):
+    try:
+        campos = leer_campos(request, CAMPOS_PRODUCTO)
+    except CampoInvalido as e:
+        return error(str(e))
+    producto = await aget_object_or_404(Producto.objects.con_precio(), pk=producto_id)
+    return JsonResponse({campo: CAMPOS_PRODUCTO[campo](producto) for campo in campos})
+
+
+# Categorías
+
+@require_safe
+@condicional(version_listado(lambda request: Categoria.objects.all()))
+async def categorias(request):
+    return JsonResponse({
+        'resultados': [
+            categoria async for categoria in Categoria.objects.order_by('nombre').values('id', 'nombre', 'descripcion')
+        ],
+    })
+
+
+# Ofertas vigentes
+
+def _ofertas():
+    return Oferta.objects.vigentes()
+
+
+@require_safe
+@condicional(version_listado(lambda request: _ofertas()))
+async def ofertas(request):
+    ofertas = _ofertas().prefetch_related(Prefetch('productos', queryset=Producto.objects.only('id')))
+    return JsonResponse({
+        'resultados': [
+            {
+                'id': oferta.id,
+                'nombre': oferta.nombre,
+                'descripcion': oferta.descripcion,
+                'tipo_descuento': oferta.tipo_descuento,
+                'valor_descuento': oferta.valor_descuento,
+                'fecha_inicio': oferta.fecha_inicio,
+                'fecha_fin': oferta.fecha_fin,
+                'productos': [producto.id for producto in oferta.productos.all()],
+            }
+            async for oferta in ofertas
+        ],
+    })
@@ -3,4 +3,7 @@ from django.apps import AppConfig
 class CafeteriaConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'boutique'
-    verbose_name = 'Boutique'
\ No newline at end of file
+    verbose_name = 'Boutique'
+
+    def ready(self):
+        from . import basedatos, metricas, signals, tareas  # noqa: F401
\ No newline at end of file
@@ -0,0 +1,82 @@
+import logging
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+# Modo de producción de SQLite.
+#
+# Cada conexión nueva recibe los PRAGMA de BOUTIQUE_SQLITE_PRAGMAS: WAL para
+# que las lecturas no esperen a los escritores, busy_timeout para que un
+# escritor espere su turno en vez de fallar con "database is locked",
+# synchronous=NORMAL (seguro con WAL) y cache/mmap por conexión. Con
+# CONN_MAX_AGE las conexiones se reutilizan y esto se paga una vez por hilo.
+#
+# RouterLectura manda las lecturas del catálogo al alias BOUTIQUE_DB_LECTURA
+# (por defecto el mismo archivo, abierto en query_only) y todo lo demás, y
+# cualquier escritura, a 'default'.
+
+logger = logging.getLogger(__name__)
+
+# Modelos que se pueden leer desde la conexión de lectura
+MODELOS_CATALOGO = {
+    'boutique.categoria',
+    'boutique.producto',
+    'boutique.oferta',
+    'boutique.oferta_productos',
+    'boutique.precioefectivo',
+}
+
+
+@receiver(connection_created)
+def configurar_sqlite(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    # Sobre la conexión de sqlite3 directamente: no cuentan como consultas de la petición
+    crudo = connection.connection
+    for nombre, valor in settings.BOUTIQUE_SQLITE_PRAGMAS.items():
+        crudo.execute(f'PRAGMA {nombre} = {valor}')
+    if connection.alias == settings.BOUTIQUE_DB_LECTURA:
+        # Aunque apunte al mismo archivo, esta conexión nunca escribe
+        crudo.execute('PRAGMA query_only = ON')
+    if settings.BOUTIQUE_SQLITE_PRAGMAS.get('journal_mode', '').lower() == 'wal':
+        modo = crudo.execute('PRAGMA journal_mode').fetchone()[0]
+        # Las bases en memoria (las de las pruebas) no admiten WAL
+        if modo not in ('wal', 'memory'):
+            logger.warning('SQLite no pudo pasar a WAL', extra={'alias': connection.alias, 'modo': modo})
+
+
+def pragma(conexion, nombre):
+    with conexion.cursor() as cursor:
+        cursor.execute(f'PRAGMA {nombre}')
+        fila = cursor.fetchone()
+    return fila[0] if fila else None
+
+
+class RouterLectura:
+    """Lecturas del catálogo a la réplica; carritos, pedidos y escrituras a 'default'.
+
+    Dentro de una transacción de 'default' todo se lee de 'default': la
+    réplica no vería lo que la transacción acaba de escribir.
+    """
+
+    def db_for_read(self, model, **hints):
+        alias = settings.BOUTIQUE_DB_LECTURA
+        if alias not in settings.DATABASES or model._meta.label_lower not in MODELOS_CATALOGO:
+            return 'default'
+        if connections['default'].in_atomic_block:
+            return 'default'
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Las dos conexiones ven los mismos datos
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == settings.BOUTIQUE_DB_LECTURA:
+            return False
+        return None
@@ -0,0 +1,372 @@
+import asyncio
+import gzip
+import http.cookiejar
+import json
+import math
+import os
+import random
+import shutil
+import socket
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+from http import HTTPStatus
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+from django.db import connections, transaction
+from django.utils import timezone
+
+try:
+    import uvicorn
+except ImportError:  # opcional: sin él se usa ServidorASGI
+    uvicorn = None
+
+# Utilidades de los comandos de benchmark. Nunca tocan db.sqlite3: trabajan
+# sobre una base temporal que se borra al terminar.
+
+
+@contextmanager
+def base_temporal(alias='default'):
+    """Crea una base SQLite temporal en disco con las migraciones aplicadas.
+
+    Es un archivo y no una base en memoria para que los hilos del benchmark
+    compitan por el bloqueo de escritura igual que en producción.
+    """
+    conexion = connections[alias]
+    nombre_original = conexion.settings_dict['NAME']
+    carpeta = tempfile.mkdtemp(prefix='boutique-bench-')
+    conexion.settings_dict['TEST'] = {
+        **conexion.settings_dict.get('TEST', {}),
+        'NAME': os.path.join(carpeta, 'bench.sqlite3'),
+    }
+    connections.close_all()
+    conexion.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    # Los espejos (la conexión de lectura) pasan a leer la base temporal
+    espejos = {
+        otro.alias: otro.settings_dict['NAME'] for otro in connections.all()
+        if otro.settings_dict['TEST'].get('MIRROR') == alias
+    }
+    for nombre in espejos:
+        connections[nombre].creation.set_as_test_mirror(conexion.settings_dict)
+    try:
+        yield conexion.settings_dict['NAME']
+    finally:
+        connections.close_all()
+        for nombre, original in espejos.items():
+            connections[nombre].settings_dict['NAME'] = original
+        conexion.creation.destroy_test_db(nombre_original, verbosity=0)
+        shutil.rmtree(carpeta, ignore_errors=True)
+
+
+CLAVE_USUARIOS = 'clave-de-bench'
+
+PALABRAS = (
+    'vestido', 'blusa', 'falda', 'pantalón', 'chaqueta', 'bolso', 'collar', 'pulsera',
+    'seda', 'lino', 'algodón', 'cuero', 'rojo', 'negro', 'plateado', 'clásico', 'noche', 'verano',
+)
+
+
+def _lotes(objetos, tamano=5000):
+    for inicio in range(0, len(objetos), tamano):
+        yield objetos[inicio:inicio + tamano]
+
+
+def sembrar_datos(categorias=20, productos=100_000, ofertas=50, usuarios=50,
+                  lineas_carrito=3, pedidos=5, semilla=0):
+    """Llena la base con un catálogo sintético del tamaño pedido.
+
+    Usa bulk_create para que sembrar 100.000 productos tarde segundos; lo que
+    save() mantendría (precios efectivos, resúmenes de carrito) se reconstruye
+    al final en bloque. Los usuarios son ``bench0..benchN`` con la contraseña
+    ``CLAVE_USUARIOS``. Devuelve la lista de nombres de usuario.
+    """
+    from .models import (
+        Carrito, Categoria, ItemPedido, Oferta, Pedido, PrecioEfectivo, Producto, ResumenCarrito,
+    )
+
+    azar = random.Random(semilla)
+    ahora = timezone.now()
+    with transaction.atomic():
+        lista_categorias = Categoria.objects.bulk_create([
+            Categoria(nombre=f'Categoría {c}', descripcion=f'Categoría sintética {c}')
+            for c in range(categorias)
+        ])
+        for lote in _lotes([
+            Producto(
+                nombre=' '.join(azar.sample(PALABRAS, 3)).capitalize() + f' {p}',
+                precio=Decimal(azar.randrange(100, 500_000)) / 100,
+                cantidad=10**6,
+                descripcion=' '.join(azar.choices(PALABRAS, k=12)),
+                categoria=lista_categorias[p % categorias],
+            )
+            for p in range(productos)
+        ]):
+            Producto.objects.bulk_create(lote)
+        producto_ids = list(Producto.objects.order_by('pk').values_list('pk', flat=True))
+
+        lista_ofertas = Oferta.objects.bulk_create([
+            Oferta(
+                nombre=f'Oferta {o}', descripcion='Oferta sintética',
+                tipo_descuento=azar.choice(['porcentaje', 'monto_fijo']),
+                valor_descuento=azar.randrange(5, 40),
+                fecha_inicio=ahora - timedelta(days=1), fecha_fin=ahora + timedelta(days=30),
+                activa=True, vigente=True,
+            )
+            for o in range(ofertas)
+        ])
+        Relacion = Oferta.productos.through
+        Relacion.objects.bulk_create([
+            Relacion(oferta_id=oferta.pk, producto_id=producto_id)
+            for oferta in lista_ofertas
+            for producto_id in azar.sample(producto_ids, min(20, len(producto_ids)))
+        ], ignore_conflicts=True)
+        PrecioEfectivo.recalcular()
+
+        clave = make_password(CLAVE_USUARIOS)
+        lista_usuarios = User.objects.bulk_create([
+            User(username=f'bench{u}', password=clave, email=f'bench{u}@example.com')
+            for u in range(usuarios)
+        ])
+        Carrito.objects.bulk_create([
+            Carrito(usuario=usuario, producto_id=producto_id, cantidad=azar.randint(1, 3))
+            for usuario in lista_usuarios
+            for producto_id in azar.sample(producto_ids, min(lineas_carrito, len(producto_ids)))
+        ])
+        for usuario in lista_usuarios:
+            ResumenCarrito.reconstruir(usuario.pk)
+
+        lista_pedidos = Pedido.objects.bulk_create([
+            Pedido(usuario=usuario, total=0, metodo_pago='efectivo')
+            for usuario in lista_usuarios
+            for _ in range(pedidos)
+        ])
+        ItemPedido.objects.bulk_create([
+            ItemPedido(pedido=pedido, producto_id=azar.choice(producto_ids), cantidad=1, precio=Decimal('100'))
+            for pedido in lista_pedidos
+        ])
+    return [usuario.username for usuario in lista_usuarios]
+
+
+def comparar(actual, base, tolerancia=0.2):
+    """Rutas cuyo p95 o número de consultas empeoró más de ``tolerancia`` respecto a ``base``"""
+    regresiones = []
+    for ruta, medida in actual.items():
+        anterior = base.get(ruta)
+        if not anterior:
+            continue
+        if anterior['p95'] and medida['p95'] > anterior['p95'] * (1 + tolerancia):
+            regresiones.append(f'{ruta}: p95 {anterior["p95"]:.1f} -> {medida["p95"]:.1f} ms')
+        # Con tolerancia: los aciertos de caché varían entre corridas
+        if medida['consultas'] > anterior['consultas'] * (1 + tolerancia):
+            regresiones.append(f'{ruta}: consultas {anterior["consultas"]:.1f} -> {medida["consultas"]:.1f}')
+    return regresiones
+
+
+def percentil(valores, p):
+    """Percentil ``p`` (0-100) por rango más cercano; None si no hay valores"""
+    if not valores:
+        return None
+    ordenados = sorted(valores)
+    posicion = max(math.ceil(p / 100 * len(ordenados)) - 1, 0)
+    return ordenados[posicion]
+
+
+# Clientes y servidores HTTP
+
+class _Silencioso(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+class _SinRedirecciones(urllib.request.HTTPRedirectHandler):
+    # Cada redirección se mide como su propia petición
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class Cliente:
+    """Navegador mínimo: cookies, token CSRF y medición de cada petición"""
+
+    def __init__(self, base, medidas):
+        self.base = base
+        self.medidas = medidas
+        self.cookies = http.cookiejar.CookieJar()
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(self.cookies), _SinRedirecciones()
+        )
+
+    def pedir(self, nombre, ruta, datos=None, datos_json=None):
+        peticion = urllib.request.Request(self.base + ruta, headers={'Accept-Encoding': 'gzip'})
+        if datos_json is not None:
+            peticion.data = json.dumps(datos_json).encode()
+            peticion.add_header('Content-Type', 'application/json')
+        elif datos is not None:
+            peticion.data = urllib.parse.urlencode(datos).encode()
+        if peticion.data is not None:
+            token = next((c.value for c in self.cookies if c.name == 'csrftoken'), '')
+            peticion.add_header('X-CSRFToken', token)
+
+        inicio = time.perf_counter()
+        try:
+            respuesta = self.opener.open(peticion, timeout=60)
+        except urllib.error.HTTPError as e:
+            respuesta = e
+        except OSError as e:
+            self.medidas[nombre].append((time.perf_counter() - inicio, 0, True))
+            return ''
+        with respuesta:
+            cuerpo = respuesta.read()
+        duracion = time.perf_counter() - inicio
+
+        consultas = int(respuesta.headers.get('X-Bench-Consultas', 0))
+        self.medidas[nombre].append((duracion, consultas, respuesta.getcode() >= 400))
+        if respuesta.headers.get('Content-Encoding') == 'gzip':
+            cuerpo = gzip.decompress(cuerpo)
+        return cuerpo.decode('utf-8', 'replace')
+
+
+@contextmanager
+def servidor_wsgi(aplicacion):
+    """Sirve la app WSGI en un puerto libre con un hilo por conexión, como runserver"""
+    servidor = ThreadedWSGIServer(('127.0.0.1', 0), _Silencioso, allow_reuse_address=False)
+    servidor.set_app(aplicacion)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    try:
+        yield f'http://127.0.0.1:{servidor.server_port}'
+    finally:
+        servidor.shutdown()
+        servidor.server_close()
+
+
+class ServidorASGI:
+    """Servidor HTTP/1.1 mínimo para una app ASGI: una petición por conexión.
+
+    Solo para los benchmarks cuando uvicorn no está instalado. Corre un bucle
+    de eventos en su propio hilo; no implementa keep-alive, chunked ni TLS.
+    """
+
+    def __init__(self, aplicacion):
+        self.aplicacion = aplicacion
+        self.bucle = asyncio.new_event_loop()
+        self.listo = threading.Event()
+        self.puerto = None
+
+    def iniciar(self):
+        self.hilo = threading.Thread(target=self._correr, daemon=True)
+        self.hilo.start()
+        self.listo.wait()
+        return self.puerto
+
+    def detener(self):
+        self.bucle.call_soon_threadsafe(self.bucle.stop)
+        self.hilo.join()
+
+    def _correr(self):
+        asyncio.set_event_loop(self.bucle)
+        servidor = self.bucle.run_until_complete(
+            asyncio.start_server(self._atender, '127.0.0.1', 0, backlog=1024)
+        )
+        self.puerto = servidor.sockets[0].getsockname()[1]
+        self.listo.set()
+        try:
+            self.bucle.run_forever()
+        finally:
+            servidor.close()
+            # Django termina cada petición (request_finished) después de responder
+            pendientes = asyncio.all_tasks(self.bucle)
+            self.bucle.run_until_complete(asyncio.gather(*pendientes, return_exceptions=True))
+            self.bucle.run_until_complete(servidor.wait_closed())
+            self.bucle.close()
+
+    async def _atender(self, lector, escritor):
+        try:
+            cabecera = await lector.readuntil(b'\r\n\r\n')
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            escritor.close()
+            return
+        primera, *lineas = cabecera.decode('latin-1').rstrip('\r\n').split('\r\n')
+        metodo, destino, _ = primera.split(' ', 2)
+        cabeceras = []
+        for linea in lineas:
+            nombre, _, valor = linea.partition(':')
+            cabeceras.append((nombre.strip().lower().encode('latin-1'), valor.strip().encode('latin-1')))
+        largo = int(dict(cabeceras).get(b'content-length', 0))
+        cuerpo = await lector.readexactly(largo) if largo else b''
+
+        ruta, _, query = destino.partition('?')
+        scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': metodo,
+            'scheme': 'http',
+            'path': urllib.parse.unquote(ruta),
+            'raw_path': ruta.encode('latin-1'),
+            'query_string': query.encode('latin-1'),
+            'root_path': '',
+            'headers': cabeceras,
+            'client': escritor.get_extra_info('peername')[:2],
+            'server': escritor.get_extra_info('sockname')[:2],
+        }
+        pendientes = [{'type': 'http.request', 'body': cuerpo, 'more_body': False}]
+        terminado = asyncio.Event()
+
+        async def recibir():
+            if pendientes:
+                return pendientes.pop()
+            # Django escucha la desconexión mientras corre la vista
+            await terminado.wait()
+            return {'type': 'http.disconnect'}
+
+        async def enviar(mensaje):
+            if mensaje['type'] == 'http.response.start':
+                estado = mensaje['status']
+                lineas = [f'HTTP/1.1 {estado} {HTTPStatus(estado).phrase}', 'Connection: close']
+                lineas += [f'{k.decode("latin-1")}: {v.decode("latin-1")}' for k, v in mensaje.get('headers', [])]
+                escritor.write(('\r\n'.join(lineas) + '\r\n\r\n').encode('latin-1'))
+            elif mensaje['type'] == 'http.response.body':
+                escritor.write(mensaje.get('body', b''))
+                if not mensaje.get('more_body', False):
+                    terminado.set()
+            await escritor.drain()
+
+        try:
+            await self.aplicacion(scope, recibir, enviar)
+        finally:
+            terminado.set()
+            escritor.close()
+
+
+@contextmanager
+def servidor_asgi(aplicacion):
+    """Sirve la app ASGI en un puerto libre: con uvicorn si está instalado, si no con ServidorASGI"""
+    if uvicorn is None:
+        servidor = ServidorASGI(aplicacion)
+        puerto = servidor.iniciar()
+        try:
+            yield f'http://127.0.0.1:{puerto}'
+        finally:
+            servidor.detener()
+        return
+
+    conector = socket.socket()
+    conector.bind(('127.0.0.1', 0))
+    servidor = uvicorn.Server(uvicorn.Config(aplicacion, lifespan='off', log_level='warning', access_log=False))
+    hilo = threading.Thread(target=servidor.run, kwargs={'sockets': [conector]}, daemon=True)
+    hilo.start()
+    while not servidor.started:
+        time.sleep(0.01)
+    try:
+        yield f'http://127.0.0.1:{conector.getsockname()[1]}'
+    finally:
+        servidor.should_exit = True
+        hilo.join()
+        conector.close()
@@ -0,0 +1,122 @@
+import re
+
+from django.db import connection, connections, router
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .models import Producto
+
+TABLA_FTS = 'boutique_producto_fts'
+TABLA_PRODUCTO = Producto._meta.db_table
+
+# Peso de cada columna en el ranking bm25: el nombre pesa más que la descripción
+PESOS = (10.0, 1.0)
+
+_TRIGGERS = {
+    f'{TABLA_FTS}_ai': f'''
+        AFTER INSERT ON {TABLA_PRODUCTO} BEGIN
+            INSERT INTO {TABLA_FTS}(rowid, nombre, descripcion) VALUES (new.id, new.nombre, new.descripcion);
+        END''',
+    f'{TABLA_FTS}_ad': f'''
+        AFTER DELETE ON {TABLA_PRODUCTO} BEGIN
+            INSERT INTO {TABLA_FTS}({TABLA_FTS}, rowid, nombre, descripcion)
+            VALUES ('delete', old.id, old.nombre, old.descripcion);
+        END''',
+    f'{TABLA_FTS}_au': f'''
+        AFTER UPDATE OF nombre, descripcion ON {TABLA_PRODUCTO} BEGIN
+            INSERT INTO {TABLA_FTS}({TABLA_FTS}, rowid, nombre, descripcion)
+            VALUES ('delete', old.id, old.nombre, old.descripcion);
+            INSERT INTO {TABLA_FTS}(rowid, nombre, descripcion) VALUES (new.id, new.nombre, new.descripcion);
+        END''',
+}
+
+
+def fts_disponible(conexion=connection):
+    return conexion.vendor == 'sqlite'
+
+
+def instalar_fts(conexion=connection):
+    """Crea la tabla FTS5 y los triggers que la sincronizan con boutique_producto.
+
+    Es idempotente. SQLite elimina los triggers cuando una migración reconstruye
+    la tabla de productos, por eso se vuelve a llamar tras cada ``migrate``; si
+    faltaba algún trigger el índice se reconstruye completo.
+    """
+    if not fts_disponible(conexion):
+        return
+    with conexion.cursor() as cursor:
+        cursor.execute(f'''
+            CREATE VIRTUAL TABLE IF NOT EXISTS {TABLA_FTS} USING fts5(
+                nombre, descripcion,
+                content='{TABLA_PRODUCTO}', content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2',
+                prefix='2 3'
+            )
+        ''')
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = %s", [TABLA_PRODUCTO])
+        existentes = {fila[0] for fila in cursor.fetchall()}
+        faltantes = [nombre for nombre in _TRIGGERS if nombre not in existentes]
+        for nombre in faltantes:
+            cursor.execute(f'CREATE TRIGGER {nombre} {_TRIGGERS[nombre]}')
+        if faltantes:
+            cursor.execute(f"INSERT INTO {TABLA_FTS}({TABLA_FTS}) VALUES ('rebuild')")
+
+
+def desinstalar_fts(conexion=connection):
+    if not fts_disponible(conexion):
+        return
+    with conexion.cursor() as cursor:
+        for nombre in _TRIGGERS:
+            cursor.execute(f'DROP TRIGGER IF EXISTS {nombre}')
+        cursor.execute(f'DROP TABLE IF EXISTS {TABLA_FTS}')
+
+
+def consulta_fts(texto):
+    """Convierte el texto del usuario en una consulta FTS5 segura.
+
+    Cada palabra se busca como prefijo (``"pla"*`` encuentra "Playera") y todas
+    deben aparecer. Las comillas y operadores del usuario se descartan.
+    """
+    palabras = re.findall(r'\w+', texto or '')[:10]
+    return ' '.join(f'"{palabra}"*' for palabra in palabras)
+
+
+def ids_coincidentes(texto):
+    """Subconsulta con los ids que coinciden, para usar en ``pk__in``"""
+    if not consulta_fts(texto):
+        return RawSQL('SELECT NULL WHERE 0', [])
+    return RawSQL(f'SELECT rowid FROM {TABLA_FTS} WHERE {TABLA_FTS} MATCH %s', [consulta_fts(texto)])
+
+
+def buscar_productos(texto, categoria_id=None, limite=20):
+    """Productos disponibles que coinciden con ``texto``, del más al menos relevante"""
+    consulta = consulta_fts(texto)
+    if not consulta:
+        return []
+
+    if not fts_disponible():
+        productos = Producto.objects.para_catalogo().filter(
+            Q(nombre__icontains=texto) | Q(descripcion__icontains=texto)
+        )
+        if categoria_id:
+            productos = productos.filter(categoria_id=categoria_id)
+        return list(productos[:limite])
+
+    sql = f'''
+        SELECT p.id FROM {TABLA_FTS} f
+        JOIN {TABLA_PRODUCTO} p ON p.id = f.rowid
+        WHERE {TABLA_FTS} MATCH %s AND p.disponible AND p.cantidad > 0
+    '''
+    parametros = [consulta]
+    if categoria_id:
+        sql += ' AND p.categoria_id = %s'
+        parametros.append(categoria_id)
+    sql += f' ORDER BY bm25({TABLA_FTS}, {PESOS[0]}, {PESOS[1]}) LIMIT %s'
+    parametros.append(limite)
+
+    with connections[router.db_for_read(Producto)].cursor() as cursor:
+        cursor.execute(sql, parametros)
+        ids = [fila[0] for fila in cursor.fetchall()]
+
+    productos = Producto.objects.select_related('categoria', 'precio_efectivo').in_bulk(ids)
+    return [productos[pk] for pk in ids if pk in productos]
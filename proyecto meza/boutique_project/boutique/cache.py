@@ -0,0 +1,52 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+
+CLAVE_VERSION_CATALOGO = 'catalogo:version'
+
+
+def version_catalogo():
+    """Versión actual del catálogo; forma parte de la clave de cada fragmento.
+
+    Si la clave se pierde (reinicio, desalojo) se vuelve a sembrar con el reloj,
+    así nunca se reutiliza una versión que ya tenga fragmentos viejos asociados.
+    """
+    version = cache.get(CLAVE_VERSION_CATALOGO)
+    if version is None:
+        cache.add(CLAVE_VERSION_CATALOGO, time.time_ns(), timeout=None)
+        version = cache.get(CLAVE_VERSION_CATALOGO)
+    return version
+
+
+async def aversion_catalogo():
+    """version_catalogo() para las vistas async"""
+    version = await cache.aget(CLAVE_VERSION_CATALOGO)
+    if version is None:
+        await cache.aadd(CLAVE_VERSION_CATALOGO, time.time_ns(), timeout=None)
+        version = await cache.aget(CLAVE_VERSION_CATALOGO)
+    return version
+
+
+async def afragmento_en_cache(nombre, *variables):
+    """Si el fragmento ``{% cache ttl nombre version_catalogo ... %}`` ya está guardado.
+
+    ``variables`` son las que siguen a version_catalogo en el tag, en el mismo
+    orden. Las vistas async lo consultan antes de leer la base: si el
+    fragmento está, la plantilla no usa los datos.
+    """
+    clave = make_template_fragment_key(nombre, [await aversion_catalogo(), *variables])
+    return await cache.ahas_key(clave)
+
+
+def invalidar_catalogo():
+    """Deja obsoletos todos los fragmentos del catálogo de una sola vez"""
+    try:
+        cache.incr(CLAVE_VERSION_CATALOGO)
+    except ValueError:
+        cache.set(CLAVE_VERSION_CATALOGO, time.time_ns(), timeout=None)
+
+
+def ttl_catalogo():
+    return settings.BOUTIQUE_CACHE_TTL
@@ -0,0 +1,128 @@
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Tarea
+
+_REGISTRO = {}
+
+
+def tarea(funcion):
+    """Registra una función como tarea y le agrega ``funcion.encolar(...)``.
+
+    Los argumentos se guardan como JSON, así que deben ser ids y valores
+    simples, no instancias de modelos.
+    """
+    nombre = funcion.__name__
+    _REGISTRO[nombre] = funcion
+    funcion.encolar = lambda *args, clave=None, retraso=0: encolar(nombre, args, clave=clave, retraso=retraso)
+    return funcion
+
+
+def encolar(nombre, argumentos=(), clave=None, retraso=0):
+    """Agrega una tarea a la cola en la transacción actual.
+
+    Si la transacción se revierte la tarea desaparece con ella. Con ``clave``
+    la operación es idempotente: si ya existe una tarea con esa clave se
+    devuelve la existente sin crear otra. Si esa tarea agotó sus intentos
+    vuelve a quedar pendiente, con los intentos en cero.
+    """
+    if nombre not in _REGISTRO:
+        raise ValueError(f'Tarea no registrada: {nombre}')
+    datos = {
+        'nombre': nombre,
+        'argumentos': list(argumentos),
+        'ejecutar_despues': timezone.now() + timedelta(seconds=retraso),
+    }
+    if clave is None:
+        nueva = Tarea.objects.create(**datos)
+    else:
+        try:
+            with transaction.atomic():
+                nueva, creada = Tarea.objects.get_or_create(clave=clave, defaults=datos)
+        except IntegrityError:
+            return Tarea.objects.get(clave=clave)
+        if not creada:
+            # UPDATE condicional: si dos encolados la reviven a la vez solo uno la programa
+            revivida = Tarea.objects.filter(pk=nueva.pk, estado='fallida').update(
+                **datos, estado='pendiente', intentos=0, error='', fecha_actualizacion=timezone.now()
+            )
+            if not revivida:
+                return nueva
+            nueva.refresh_from_db()
+
+    if settings.BOUTIQUE_TAREAS_SINCRONAS:
+        transaction.on_commit(lambda: ejecutar_tarea(nueva.pk, reclamar=True))
+    return nueva
+
+
+def recuperar_abandonadas():
+    """Devuelve a la cola las tareas cuyo worker murió a mitad de ejecución"""
+    limite = timezone.now() - timedelta(seconds=settings.BOUTIQUE_TAREAS_TIMEOUT)
+    return Tarea.objects.filter(estado='en_proceso', fecha_actualizacion__lt=limite).update(
+        estado='pendiente', fecha_actualizacion=timezone.now()
+    )
+
+
+def _reclamar(pk):
+    # UPDATE condicional: si dos workers intentan tomar la misma tarea solo uno lo logra
+    return Tarea.objects.filter(pk=pk, estado='pendiente').update(
+        estado='en_proceso', intentos=F('intentos') + 1, fecha_actualizacion=timezone.now()
+    ) == 1
+
+
+def reclamar_lote(limite):
+    candidatas = Tarea.objects.filter(
+        estado='pendiente', ejecutar_despues__lte=timezone.now()
+    ).order_by('ejecutar_despues').values_list('pk', flat=True)[:limite]
+    return [pk for pk in candidatas if _reclamar(pk)]
+
+
+def ejecutar_tarea(pk, reclamar=False):
+    """Ejecuta una tarea ya reclamada y registra el resultado.
+
+    Si falla se reintenta con espera exponencial hasta ``max_intentos``.
+    """
+    if reclamar and not _reclamar(pk):
+        return None
+    tarea = Tarea.objects.get(pk=pk)
+    try:
+        _REGISTRO[tarea.nombre](*tarea.argumentos)
+    except Exception:
+        tarea.error = traceback.format_exc()
+        if tarea.intentos >= tarea.max_intentos:
+            tarea.estado = 'fallida'
+        else:
+            tarea.estado = 'pendiente'
+            espera = settings.BOUTIQUE_TAREAS_ESPERA * 2 ** (tarea.intentos - 1)
+            tarea.ejecutar_despues = timezone.now() + timedelta(seconds=espera)
+    else:
+        tarea.estado = 'completada'
+        tarea.error = ''
+    tarea.save(update_fields=['estado', 'error', 'ejecutar_despues', 'fecha_actualizacion'])
+    return tarea.estado
+
+
+def ejecutar_en_worker(pk):
+    # Cada hilo o proceso del pool tiene su propia conexión: se cierra si quedó inservible
+    close_old_connections()
+    try:
+        return ejecutar_tarea(pk)
+    finally:
+        close_old_connections()
+
+
+def procesar_pendientes(limite=100, executor=None):
+    """Reclama hasta ``limite`` tareas y las ejecuta; devuelve cuántas procesó"""
+    recuperar_abandonadas()
+    pks = reclamar_lote(limite)
+    if executor is None:
+        for pk in pks:
+            ejecutar_tarea(pk)
+    else:
+        list(executor.map(ejecutar_en_worker, pks))
+    return len(pks)
@@ -0,0 +1,26 @@
+from django.utils.functional import SimpleLazyObject
+
+from .cache import version_catalogo, ttl_catalogo
+from .models import ResumenCarrito
+
+
+def obtener_resumen_carrito(request):
+    """Resumen del carrito del usuario, consultado como mucho una vez por petición"""
+    if not hasattr(request, '_resumen_carrito'):
+        request._resumen_carrito = ResumenCarrito.obtener(request.user)
+    return request._resumen_carrito
+
+
+def carrito(request):
+    # Perezoso: las páginas que no muestran la insignia no hacen la consulta
+    if not request.user.is_authenticated:
+        return {}
+    return {'resumen_carrito': SimpleLazyObject(lambda: obtener_resumen_carrito(request))}
+
+
+def catalogo(request):
+    # Datos para la clave de {% cache %} en los listados públicos
+    return {
+        'version_catalogo': SimpleLazyObject(version_catalogo),
+        'cache_ttl': ttl_catalogo(),
+    }
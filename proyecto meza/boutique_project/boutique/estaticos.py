@@ -0,0 +1,120 @@
+import gzip
+import mimetypes
+import posixpath
+import re
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.http import FileResponse, Http404
+from django.utils._os import safe_join
+from django.utils.cache import patch_vary_headers
+from django.views.decorators.http import require_safe
+
+try:
+    import brotli
+except ImportError:  # opcional: sin él solo se generan los .gz
+    brotli = None
+
+# Archivos estáticos con hash en el nombre y copias precomprimidas.
+#
+# collectstatic deja junto a cada archivo de texto su versión .gz (y .br si
+# está instalado brotli); la vista ``servir`` entrega la mejor que acepte el
+# navegador. Como el nombre cambia con el contenido, los que llevan hash se
+# pueden cachear un año sin revalidar.
+
+EXTENSIONES_COMPRIMIBLES = ('.css', '.js', '.svg', '.json', '.txt', '.map', '.html')
+
+# Por debajo de esto la cabecera Content-Encoding cuesta más de lo que ahorra
+TAMANO_MINIMO = 256
+
+UN_ANO = 60 * 60 * 24 * 365
+
+
+def comprimir(ruta):
+    """Escribe ``ruta.gz`` (y ``ruta.br``) si comprimida ocupa menos; devuelve las rutas escritas"""
+    datos = Path(ruta).read_bytes()
+    if len(datos) < TAMANO_MINIMO:
+        return []
+    versiones = [('.gz', gzip.compress(datos, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        versiones.append(('.br', brotli.compress(datos, quality=11)))
+
+    escritas = []
+    for extension, comprimido in versiones:
+        if len(comprimido) < len(datos):
+            destino = f'{ruta}{extension}'
+            Path(destino).write_bytes(comprimido)
+            escritas.append(destino)
+    return escritas
+
+
+class EstaticosComprimidos(ManifestStaticFilesStorage):
+    """ManifestStaticFilesStorage que además precomprime los archivos de texto"""
+
+    def post_process(self, paths, dry_run=False, **options):
+        procesados = []
+        for original, con_hash, procesado in super().post_process(paths, dry_run, **options):
+            if con_hash and not isinstance(procesado, Exception):
+                procesados.append(con_hash)
+            yield original, con_hash, procesado
+        if dry_run:
+            return
+        for nombre in procesados:
+            if nombre.endswith(EXTENSIONES_COMPRIMIBLES):
+                comprimir(self.path(nombre))
+
+
+# nombre.<12 hex>.ext, como los genera ManifestStaticFilesStorage
+CON_HASH = re.compile(r'\.[0-9a-f]{12}\.[^/.]+$')
+
+
+def codificaciones_aceptadas(request):
+    """Codificaciones de Accept-Encoding, sin las marcadas con q=0"""
+    aceptadas = set()
+    for parte in request.headers.get('Accept-Encoding', '').split(','):
+        nombre, _, parametro = parte.partition(';')
+        nombre, parametro = nombre.strip().lower(), parametro.strip()
+        if parametro.startswith('q='):
+            try:
+                if float(parametro[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        if nombre:
+            aceptadas.add(nombre)
+    return aceptadas
+
+
+@require_safe
+def servir(request, ruta):
+    """Sirve STATIC_ROOT con la versión precomprimida y caché larga para los archivos con hash"""
+    ruta = posixpath.normpath(ruta).lstrip('/')
+    try:
+        completa = Path(safe_join(settings.STATIC_ROOT, ruta))
+    except SuspiciousFileOperation:
+        raise Http404
+    if not completa.is_file():
+        raise Http404
+
+    tipo, _ = mimetypes.guess_type(completa.name)
+    archivo, codificacion = completa, None
+    aceptadas = codificaciones_aceptadas(request)
+    for extension, nombre in (('.br', 'br'), ('.gz', 'gzip')):
+        comprimido = completa.with_name(completa.name + extension)
+        if nombre in aceptadas and comprimido.is_file():
+            archivo, codificacion = comprimido, nombre
+            break
+
+    response = FileResponse(
+        archivo.open('rb'), filename=completa.name, content_type=tipo or 'application/octet-stream'
+    )
+    if codificacion:
+        response['Content-Encoding'] = codificacion
+    if CON_HASH.search(ruta):
+        response['Cache-Control'] = f'public, max-age={UN_ANO}, immutable'
+    else:
+        response['Cache-Control'] = 'public, max-age=300'
+    patch_vary_headers(response, ['Accept-Encoding'])
+    return response
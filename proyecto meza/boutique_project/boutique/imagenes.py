@@ -0,0 +1,110 @@
+import posixpath
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+# Tamaño en CSS (ancho, alto) de cada variante. Todas se recortan a ese
+# tamaño exacto (el ancho va en el nombre del archivo y en el srcset) y nunca
+# se amplían: si el original no alcanza, esa versión no se genera
+VARIANTES = {
+    'miniatura': (80, 80),
+    'tarjeta': (400, 200),
+    'hero': (1200, 600),
+}
+
+# Se generan a 1x y 2x para pantallas de alta densidad
+DENSIDADES = (1, 2)
+
+FORMATOS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 6}),
+    'jpg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+# Atributo sizes de cada variante
+TAMANOS = {
+    'miniatura': '80px',
+    'tarjeta': '(max-width: 640px) 100vw, 400px',
+    'hero': '100vw',
+}
+
+VARIANTES_POR_MODELO = {
+    'producto': ('miniatura', 'tarjeta'),
+    'oferta': ('tarjeta', 'hero'),
+}
+
+
+def ruta_derivado(nombre, variante, ancho, extension):
+    """productos/R.jpg -> productos/derivados/R-tarjeta-400w.webp"""
+    carpeta, archivo = posixpath.split(nombre)
+    base = posixpath.splitext(archivo)[0]
+    return posixpath.join(carpeta, 'derivados', f'{base}-{variante}-{ancho}w.{extension}')
+
+
+def anchos(variante):
+    ancho = VARIANTES[variante][0]
+    return [ancho * densidad for densidad in DENSIDADES]
+
+
+def tiene_derivados(campo, variante):
+    return campo.storage.exists(ruta_derivado(campo.name, variante, anchos(variante)[0], 'jpg'))
+
+
+def generar_derivados(campo, variantes, forzar=False):
+    """Genera las versiones WebP y JPEG de cada variante junto al original.
+
+    Devuelve los nombres de los archivos escritos. Si ya existen no se
+    regeneran, salvo con ``forzar``; un archivo nuevo siempre tiene nombre nuevo.
+    Una variante cuyo tamaño 1x supera al original no se genera: la etiqueta
+    imagen_responsive usa entonces el original.
+    """
+    if not campo:
+        return []
+    pendientes = [v for v in variantes if forzar or not tiene_derivados(campo, v)]
+    if not pendientes:
+        return []
+
+    storage = campo.storage
+    with storage.open(campo.name, 'rb') as archivo:
+        original = ImageOps.exif_transpose(Image.open(archivo))
+        original.load()
+    if original.mode not in ('RGB', 'L'):
+        fondo = Image.new('RGB', original.size, 'white')
+        fondo.paste(original, mask=original.convert('RGBA').getchannel('A'))
+        original = fondo
+    original = original.convert('RGB')
+
+    escritos = []
+    for variante in pendientes:
+        ancho_css, alto_css = VARIANTES[variante]
+        for densidad in DENSIDADES:
+            tamano = (ancho_css * densidad, alto_css * densidad)
+            # Sin ampliar: si el original no cubre el recorte no se genera esa densidad
+            if original.width < tamano[0] or original.height < tamano[1]:
+                continue
+            imagen = ImageOps.fit(original, tamano, Image.LANCZOS)
+            for extension, (formato, opciones) in FORMATOS.items():
+                buffer = BytesIO()
+                imagen.save(buffer, formato, **opciones)
+                nombre = ruta_derivado(campo.name, variante, tamano[0], extension)
+                if storage.exists(nombre):
+                    storage.delete(nombre)
+                escritos.append(storage.save(nombre, ContentFile(buffer.getvalue())))
+    return escritos
+
+
+def fuentes(campo, variante):
+    """srcset por formato con los derivados que existen, o None si aún no hay"""
+    if not campo or not tiene_derivados(campo, variante):
+        return None
+    storage = campo.storage
+    srcset = {}
+    for extension in FORMATOS:
+        partes = []
+        for ancho in anchos(variante):
+            nombre = ruta_derivado(campo.name, variante, ancho, extension)
+            # La 1x siempre existe si tiene_derivados(); la 2x puede faltar
+            if ancho == anchos(variante)[0] or storage.exists(nombre):
+                partes.append(f'{storage.url(nombre)} {ancho}w')
+        srcset[extension] = ', '.join(partes)
+    return srcset
@@ -0,0 +1,434 @@
+import csv
+import gzip
+import json
+from contextlib import contextmanager
+from datetime import datetime
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .cache import invalidar_catalogo
+from .models import Categoria, ItemPedido, Oferta, PrecioEfectivo, Producto
+
+# Importación y exportación del catálogo en CSV o JSON Lines.
+#
+# Los archivos se leen y escriben fila a fila y se guardan por lotes con
+# bulk_create y bulk_update: la memoria no depende del tamaño del archivo.
+# La columna ``id`` es la clave: una fila con id existente actualiza ese
+# registro (solo las columnas que trae el archivo); sin id, o con uno que no
+# existe, se inserta. Lo que save() y las señales harían (precios efectivos,
+# vigencia de ofertas, cache) se hace una vez por lote.
+
+COLUMNAS = {
+    'categorias': ['id', 'nombre', 'descripcion'],
+    'productos': ['id', 'nombre', 'precio', 'cantidad', 'descripcion', 'categoria', 'disponible'],
+    'ofertas': [
+        'id', 'nombre', 'descripcion', 'tipo_descuento', 'valor_descuento',
+        'fecha_inicio', 'fecha_fin', 'activa', 'productos',
+    ],
+}
+
+MODELOS = {'categorias': Categoria, 'productos': Producto, 'ofertas': Oferta}
+
+COLUMNAS_POR_MODELO = {MODELOS[nombre]: columnas for nombre, columnas in COLUMNAS.items()}
+
+FORMATOS = ('csv', 'jsonl')
+
+VERDADEROS = {'1', 'true', 't', 'si', 'sí', 'yes', 'y'}
+FALSOS = {'0', 'false', 'f', 'no', 'n'}
+
+
+class ErrorFila(ValueError):
+    def __init__(self, numero, mensaje):
+        super().__init__(f'fila {numero}: {mensaje}')
+        self.numero = numero
+
+
+def formato_de(ruta):
+    """'csv' o 'jsonl' según la extensión (se ignora un .gz final)"""
+    nombre = ruta[:-3] if ruta.endswith('.gz') else ruta
+    if nombre.endswith('.csv'):
+        return 'csv'
+    if nombre.endswith(('.jsonl', '.ndjson')):
+        return 'jsonl'
+    return None
+
+
+@contextmanager
+def abrir(ruta, modo, estandar=None):
+    """Abre en texto ``ruta``, comprimida con gzip si termina en .gz; '-' devuelve ``estandar``"""
+    if ruta == '-':
+        yield estandar
+        return
+    apertura = gzip.open if ruta.endswith('.gz') else open
+    with apertura(ruta, modo + 't', encoding='utf-8', newline='') as archivo:
+        yield archivo
+
+
+# Lectura
+
+def leer_filas(archivo, formato):
+    """Genera (número de fila, dict) sin cargar el archivo entero"""
+    if formato == 'csv':
+        # La fila 1 es la cabecera
+        for numero, fila in enumerate(csv.DictReader(archivo), start=2):
+            yield numero, fila
+        return
+    for numero, linea in enumerate(archivo, start=1):
+        if not linea.strip():
+            continue
+        try:
+            fila = json.loads(linea)
+        except ValueError as e:
+            raise ErrorFila(numero, f'JSON inválido ({e})')
+        if not isinstance(fila, dict):
+            raise ErrorFila(numero, 'se esperaba un objeto JSON')
+        yield numero, fila
+
+
+def _booleano(valor):
+    if isinstance(valor, bool):
+        return valor
+    texto = str(valor).strip().lower()
+    if texto in VERDADEROS:
+        return True
+    if texto in FALSOS:
+        return False
+    raise ValidationError(f'"{valor}" no es un valor booleano')
+
+
+def _fecha(valor):
+    fecha = valor if isinstance(valor, datetime) else parse_datetime(str(valor).strip())
+    if fecha is None:
+        raise ValidationError(f'"{valor}" no es una fecha ISO 8601')
+    if timezone.is_naive(fecha):
+        fecha = timezone.make_aware(fecha)
+    return fecha
+
+
+def _ids(valor):
+    # En CSV la lista va separada por espacios; en JSON es un arreglo
+    if isinstance(valor, list):
+        return [int(pk) for pk in valor]
+    return [int(pk) for pk in str(valor).split()]
+
+
+def convertir(modelo, columna, valor):
+    """Valor de archivo -> valor de Python validado con las reglas del campo"""
+    campo = modelo._meta.get_field(columna)
+    if valor == '' and (campo.null or campo.many_to_many):
+        valor = None
+    if valor is None:
+        if campo.many_to_many:
+            return []
+        if campo.null:
+            return None
+        raise ValidationError('no puede estar vacío')
+    if campo.many_to_many:
+        return _ids(valor)
+    if isinstance(campo, models.ForeignKey) or columna == 'id':
+        return int(valor)
+    if isinstance(campo, models.BooleanField):
+        valor = _booleano(valor)
+    elif isinstance(campo, models.DateTimeField):
+        valor = _fecha(valor)
+    elif isinstance(campo, models.DecimalField):
+        valor = Decimal(str(valor).strip())
+    return campo.clean(valor, None)
+
+
+def requeridas(modelo, columnas):
+    """Columnas sin valor por defecto que hacen falta para insertar"""
+    return [
+        campo.name for campo in modelo._meta.concrete_fields
+        if campo.name in COLUMNAS_POR_MODELO[modelo] and not campo.primary_key
+        and not campo.has_default() and not campo.null and campo.name not in columnas
+    ]
+
+
+# Importación
+
+class Importacion:
+    """Importa filas de un modelo por lotes; cada lote es una transacción.
+
+    Con ``omitir_errores`` las filas inválidas se cuentan en ``omitidas`` y se
+    guardan en ``errores``; si no, la primera lanza ErrorFila (los lotes
+    anteriores ya quedaron guardados).
+    """
+
+    def __init__(self, nombre, lote=1000, omitir_errores=False):
+        self.modelo = MODELOS[nombre]
+        self.lote = lote
+        self.omitir_errores = omitir_errores
+        self.creadas = self.actualizadas = self.omitidas = 0
+        self.errores = []
+        self.columnas = None
+
+    @property
+    def procesadas(self):
+        return self.creadas + self.actualizadas + self.omitidas
+
+    def importar(self, filas, al_avanzar=None):
+        pendientes = []
+        ids = set()
+        for numero, fila in filas:
+            if self.columnas is None:
+                self._preparar_columnas(numero, fila)
+            convertida = self._convertir(numero, fila)
+            if convertida is None:
+                continue
+            # Un UPSERT no puede tocar la misma fila dos veces: la repetida va en el lote siguiente
+            if convertida.get('id') in ids or len(pendientes) >= self.lote:
+                self._guardar(pendientes)
+                pendientes = []
+                ids.clear()
+                if al_avanzar:
+                    al_avanzar(self)
+            pendientes.append((numero, convertida))
+            if 'id' in convertida:
+                ids.add(convertida['id'])
+        if pendientes:
+            self._guardar(pendientes)
+        if al_avanzar:
+            al_avanzar(self)
+        return self
+
+    def _preparar_columnas(self, numero, fila):
+        permitidas = COLUMNAS_POR_MODELO[self.modelo]
+        desconocidas = sorted(set(fila) - set(permitidas))
+        if desconocidas:
+            raise ErrorFila(numero, f'columnas desconocidas: {", ".join(desconocidas)}')
+        # Mismo orden que COLUMNAS: los archivos exportados y los escritos a mano dan igual
+        self.columnas = [columna for columna in permitidas if columna in fila]
+        self.faltantes = requeridas(self.modelo, self.columnas)
+
+    def _fallo(self, numero, mensaje):
+        error = ErrorFila(numero, mensaje)
+        if not self.omitir_errores:
+            raise error
+        self.omitidas += 1
+        self.errores.append(str(error))
+
+    def _convertir(self, numero, fila):
+        if set(fila) != set(self.columnas):
+            self._fallo(numero, 'las columnas no coinciden con las de la primera fila')
+            return None
+        convertida = {}
+        for columna in self.columnas:
+            valor = fila[columna]
+            if columna == 'id' and valor in ('', None):
+                continue
+            try:
+                convertida[columna] = convertir(self.modelo, columna, valor)
+            except (ValidationError, ValueError, ArithmeticError) as e:
+                mensaje = '; '.join(e.messages) if isinstance(e, ValidationError) else str(e)
+                self._fallo(numero, f'{columna}: {mensaje}')
+                return None
+        return convertida
+
+    def _guardar(self, pendientes):
+        ids = [datos['id'] for _, datos in pendientes if 'id' in datos]
+        existentes = set(self.modelo.objects.filter(pk__in=ids).values_list('pk', flat=True))
+        referencias = self._referencias_validas(pendientes)
+
+        validas = []
+        for numero, datos in pendientes:
+            nueva = datos.get('id') not in existentes
+            if nueva and self.faltantes:
+                self._fallo(numero, f'faltan columnas para crear: {", ".join(self.faltantes)}')
+            elif referencias is not None and not referencias(datos):
+                columna = 'categoria' if self.modelo is Producto else 'productos'
+                self._fallo(numero, f'{columna}: hace referencia a registros que no existen')
+            else:
+                validas.append((nueva, datos))
+        if not validas:
+            return
+
+        with transaction.atomic():
+            objetos = self._guardar_lote(validas)
+            if self.modelo is Producto:
+                PrecioEfectivo.recalcular([objeto.pk for objeto in objetos])
+            elif self.modelo is Oferta:
+                self._marcar_vigentes(objetos)
+                if 'productos' in self.columnas:
+                    self._guardar_productos(objetos, [datos['productos'] for _, datos in validas])
+                else:
+                    PrecioEfectivo.recalcular(list(
+                        Oferta.productos.through.objects.filter(oferta__in=objetos).values_list('producto_id', flat=True)
+                    ))
+            transaction.on_commit(invalidar_catalogo)
+
+        nuevas = sum(1 for nueva, _ in validas if nueva)
+        self.creadas += nuevas
+        self.actualizadas += len(validas) - nuevas
+
+    def _referencias_validas(self, pendientes):
+        if self.modelo is Producto and 'categoria' in self.columnas:
+            pedidas = {datos['categoria'] for _, datos in pendientes}
+            existen = set(Categoria.objects.filter(pk__in=pedidas).values_list('pk', flat=True))
+            return lambda datos: datos['categoria'] in existen
+        if self.modelo is Oferta and 'productos' in self.columnas:
+            pedidas = {pk for _, datos in pendientes for pk in datos['productos']}
+            existen = set(Producto.objects.filter(pk__in=pedidas).values_list('pk', flat=True))
+            return lambda datos: existen.issuperset(datos['productos'])
+        return None
+
+    def _guardar_lote(self, validas):
+        concretas = [columna for columna in self.columnas if columna not in ('id', 'productos')]
+        ahora = timezone.now()
+        objetos = [
+            self.modelo(**{
+                (f'{columna}_id' if columna == 'categoria' else columna): valor
+                for columna, valor in datos.items() if columna != 'productos'
+            })
+            for _, datos in validas
+        ]
+        if not self.faltantes:
+            # Filas completas: un solo INSERT ... ON CONFLICT DO UPDATE por lote
+            self.modelo.objects.bulk_create(
+                objetos, update_conflicts=True, unique_fields=['id'],
+                update_fields=concretas + ['fecha_actualizacion'],
+            )
+            return objetos
+
+        # Con columnas parciales el INSERT violaría los NOT NULL: las existentes
+        # van por bulk_update, en tandas cortas porque genera un CASE por fila
+        nuevos = [objeto for objeto, (nueva, _) in zip(objetos, validas) if nueva]
+        existentes = [objeto for objeto, (nueva, _) in zip(objetos, validas) if not nueva]
+        for objeto in existentes:
+            objeto.fecha_actualizacion = ahora  # bulk_update no aplica auto_now
+        if nuevos:
+            self.modelo.objects.bulk_create(nuevos)
+        if existentes:
+            self.modelo.objects.bulk_update(existentes, concretas + ['fecha_actualizacion'], batch_size=100)
+        return objetos
+
+    def _marcar_vigentes(self, ofertas):
+        # Lo que haría save(), en SQL: una actualización parcial puede no traer las fechas
+        ahora = timezone.now()
+        lote = Oferta.objects.filter(pk__in=[oferta.pk for oferta in ofertas])
+        abiertas = Q(activa=True, fecha_inicio__lte=ahora, fecha_fin__gte=ahora)
+        lote.filter(abiertas).update(vigente=True)
+        lote.exclude(abiertas).update(vigente=False)
+
+    def _guardar_productos(self, ofertas, listas):
+        # La columna reemplaza la lista completa de productos de cada oferta
+        Relacion = Oferta.productos.through
+        relaciones = Relacion.objects.filter(oferta__in=ofertas)
+        afectados = set(relaciones.values_list('producto_id', flat=True))
+        relaciones.delete()
+        Relacion.objects.bulk_create([
+            Relacion(oferta_id=oferta.pk, producto_id=producto_id)
+            for oferta, producto_ids in zip(ofertas, listas)
+            for producto_id in dict.fromkeys(producto_ids)
+        ])
+        afectados.update(pk for producto_ids in listas for pk in producto_ids)
+        PrecioEfectivo.recalcular(sorted(afectados))
+
+
+# Exportación
+
+def _texto(valor):
+    if valor is None:
+        return ''
+    if isinstance(valor, bool):
+        return 'true' if valor else 'false'
+    if isinstance(valor, datetime):
+        return valor.isoformat()
+    if isinstance(valor, list):
+        return ' '.join(str(pk) for pk in valor)
+    return str(valor)
+
+
+def _json(valor):
+    if isinstance(valor, datetime):
+        return valor.isoformat()
+    if isinstance(valor, Decimal):
+        # Como cadena: un float perdería los centavos exactos
+        return str(valor)
+    return valor
+
+
+def exportar(nombre, archivo, formato, lote=1000, al_avanzar=None):
+    """Escribe todos los registros del modelo por bloques de pk; devuelve cuántos"""
+    modelo = MODELOS[nombre]
+    columnas = COLUMNAS[nombre]
+    concretas = [columna for columna in columnas if columna != 'productos']
+    consulta = modelo.objects.order_by('pk').values(*concretas)
+
+    escritor = None
+    if formato == 'csv':
+        escritor = csv.writer(archivo)
+        escritor.writerow(columnas)
+
+    escritas = 0
+    ultimo = 0
+    while True:
+        bloque = list(consulta.filter(pk__gt=ultimo)[:lote])
+        if not bloque:
+            break
+        ultimo = bloque[-1]['id']
+        if 'productos' in columnas:
+            productos = {fila['id']: [] for fila in bloque}
+            for oferta_id, producto_id in Oferta.productos.through.objects.filter(
+                oferta_id__in=productos
+            ).order_by('producto_id').values_list('oferta_id', 'producto_id'):
+                productos[oferta_id].append(producto_id)
+            for fila in bloque:
+                fila['productos'] = productos[fila['id']]
+
+        for fila in bloque:
+            if escritor:
+                escritor.writerow([_texto(fila[columna]) for columna in columnas])
+            else:
+                archivo.write(json.dumps({c: _json(fila[c]) for c in columnas}, ensure_ascii=False) + '\n')
+        escritas += len(bloque)
+        if al_avanzar:
+            al_avanzar(escritas)
+    return escritas
+
+
+# Pedidos: una fila por item, para las respuestas en streaming del admin
+
+COLUMNAS_PEDIDOS = [
+    'pedido', 'fecha_pedido', 'usuario', 'estado', 'metodo_pago',
+    'producto_id', 'producto', 'cantidad', 'precio', 'subtotal',
+]
+
+
+class _Linea:
+    # csv.writer escribe en un "archivo" que solo devuelve la línea formateada
+    def write(self, texto):
+        return texto
+
+
+def exportar_pedidos(formato, desde=None, hasta=None, lote=2000):
+    """Genera el export de los items de pedido línea a línea.
+
+    Los datos se leen con iterator(chunk_size=lote) y values_list: en
+    memoria nunca hay más de un bloque, ni instancias de modelos.
+    """
+    items = ItemPedido.objects.all()
+    if desde:
+        items = items.filter(pedido__fecha_pedido__date__gte=desde)
+    if hasta:
+        items = items.filter(pedido__fecha_pedido__date__lte=hasta)
+    filas = items.order_by('pedido_id', 'id').values_list(
+        'pedido_id', 'pedido__fecha_pedido', 'pedido__usuario__username', 'pedido__estado',
+        'pedido__metodo_pago', 'producto_id', 'producto__nombre', 'cantidad', 'precio',
+    )
+
+    if formato == 'csv':
+        escritor = csv.writer(_Linea())
+        yield escritor.writerow(COLUMNAS_PEDIDOS)
+        for fila in filas.iterator(chunk_size=lote):
+            yield escritor.writerow([_texto(valor) for valor in fila + (fila[7] * fila[8],)])
+    else:
+        for fila in filas.iterator(chunk_size=lote):
+            valores = [_json(valor) for valor in fila + (fila[7] * fila[8],)]
+            yield json.dumps(dict(zip(COLUMNAS_PEDIDOS, valores)), ensure_ascii=False) + '\n'
+
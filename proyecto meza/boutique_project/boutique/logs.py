@@ -0,0 +1,25 @@
+import logging
+
+# Atributos que trae todo LogRecord; el resto viene de ``extra={...}``
+_ESTANDAR = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class FormatoClaveValor(logging.Formatter):
+    """Añade al mensaje los campos de ``extra`` como ``clave=valor``.
+
+    Así las trazas se pueden filtrar con grep o cargar en cualquier
+    agregador sin parsear frases.
+    """
+
+    def format(self, record):
+        texto = super().format(record)
+        campos = ' '.join(
+            f'{clave}={valor!r}' if isinstance(valor, str) and ' ' in valor else f'{clave}={valor}'
+            for clave, valor in vars(record).items()
+            if clave not in _ESTANDAR
+        )
+        if not campos:
+            return texto
+        # La traza de una excepción va al final, después de los campos
+        primera, salto, resto = texto.partition('\n')
+        return f'{primera} {campos}{salto}{resto}'
@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from boutique.models import Oferta
+
+
+class Command(BaseCommand):
+    help = 'Abre y cierra las ofertas según sus fechas y recalcula los precios afectados'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--continuo', action='store_true', help='Sigue barriendo hasta que se detenga con Ctrl+C')
+        parser.add_argument('--intervalo', type=float, default=60.0, help='Máximo de segundos entre barridos')
+
+    def handle(self, *args, **options):
+        try:
+            while True:
+                abiertas, cerradas = Oferta.barrer()
+                if abiertas or cerradas or not options['continuo']:
+                    self.stdout.write(f'{len(abiertas)} ofertas abiertas, {len(cerradas)} cerradas')
+                if not options['continuo']:
+                    break
+                time.sleep(self._espera(options['intervalo']))
+        except KeyboardInterrupt:
+            pass
+
+    def _espera(self, intervalo):
+        # Se despierta justo en el próximo inicio o fin si llega antes que el intervalo
+        proximo = Oferta.proximo_cambio()
+        if proximo is None:
+            return intervalo
+        segundos = (proximo - timezone.now()).total_seconds()
+        return min(intervalo, max(segundos, 0) + 0.5)
@@ -0,0 +1,130 @@
+import random
+import threading
+import time
+from collections import defaultdict
+
+from django.core.cache import cache
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+from django.urls import reverse
+
+from boutique.bench import Cliente, base_temporal, percentil, sembrar_datos, servidor_asgi, servidor_wsgi
+from boutique.models import Categoria, Producto
+
+SERVIDORES = {
+    'wsgi': lambda: servidor_wsgi(WSGIHandler()),
+    'asgi': lambda: servidor_asgi(ASGIHandler()),
+}
+
+
+class Command(BaseCommand):
+    help = ('Compara rendimiento y latencia de cola de las vistas de lectura (inicio, productos, '
+            'ofertas y la API) servidas por WSGI y por ASGI con muchos clientes concurrentes')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--categorias', type=int, default=20)
+        parser.add_argument('--productos', type=int, default=20_000)
+        parser.add_argument('--ofertas', type=int, default=50)
+        parser.add_argument('--clientes', type=int, default=64, help='Clientes concurrentes')
+        parser.add_argument('--peticiones', type=int, default=40, help='Peticiones por cliente')
+        parser.add_argument('--servidores', nargs='+', choices=list(SERVIDORES), default=list(SERVIDORES))
+        parser.add_argument('--sin-cache', action='store_true',
+                            help='Sin caché de fragmentos: cada página lee de la base')
+
+    def handle(self, *args, **options):
+        if options['clientes'] < 1 or options['peticiones'] < 1:
+            raise CommandError('--clientes y --peticiones deben ser al menos 1')
+        if options['productos'] < 1 or options['categorias'] < 1:
+            raise CommandError('Hacen falta al menos una categoría y un producto')
+
+        ajustes = {'DEBUG': False, 'ALLOWED_HOSTS': ['*']}
+        if options['sin_cache']:
+            ajustes['BOUTIQUE_CACHE_TTL'] = 0
+        with base_temporal(), override_settings(**ajustes):
+            sembrar_datos(
+                categorias=options['categorias'], productos=options['productos'],
+                ofertas=options['ofertas'], usuarios=1,
+            )
+            self.producto_ids = list(Producto.objects.values_list('pk', flat=True)[:1000])
+            self.categoria_id = Categoria.objects.values_list('pk', flat=True).first()
+
+            resultados = {}
+            for nombre in options['servidores']:
+                # Cada servidor empieza con la caché vacía
+                cache.clear()
+                with SERVIDORES[nombre]() as base:
+                    medidas, duracion = self._cargar(base, options['clientes'], options['peticiones'])
+                resultados[nombre] = self._resumir(medidas), duracion
+
+        self._imprimir(resultados)
+
+    def _cargar(self, base, clientes, peticiones):
+        medidas = defaultdict(list)
+        barrera = threading.Barrier(clientes)
+        hilos = [
+            threading.Thread(target=self._navegar, args=(Cliente(base, medidas), peticiones, semilla, barrera))
+            for semilla in range(clientes)
+        ]
+        inicio = time.perf_counter()
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        return medidas, time.perf_counter() - inicio
+
+    def _navegar(self, cliente, peticiones, semilla, barrera):
+        azar = random.Random(semilla)
+        rutas = [
+            ('inicio', lambda: reverse('inicio')),
+            ('productos', lambda: reverse('productos')),
+            ('productos?categoria', lambda: f'{reverse("productos")}?categoria={self.categoria_id}'),
+            ('ofertas', lambda: reverse('ofertas')),
+            ('api_productos', lambda: reverse('api_productos')),
+            ('api_producto', lambda: reverse('api_producto', args=[azar.choice(self.producto_ids)])),
+            ('api_categorias', lambda: reverse('api_categorias')),
+            ('api_ofertas', lambda: reverse('api_ofertas')),
+        ]
+        barrera.wait()
+        for _ in range(peticiones):
+            nombre, ruta = azar.choice(rutas)
+            cliente.pedir(nombre, ruta())
+
+    def _resumir(self, medidas):
+        resultados = {}
+        todas = [fila for filas in medidas.values() for fila in filas]
+        for nombre, filas in sorted(medidas.items()) + [('total', todas)]:
+            tiempos = [duracion * 1000 for duracion, _, _ in filas]
+            resultados[nombre] = {
+                'peticiones': len(filas),
+                'errores': sum(1 for _, _, error in filas if error),
+                'p50': percentil(tiempos, 50),
+                'p95': percentil(tiempos, 95),
+                'p99': percentil(tiempos, 99),
+            }
+        return resultados
+
+    def _imprimir(self, resultados):
+        servidores = list(resultados)
+        encabezado = f'{"ruta":<20}' + ''.join(
+            f' {f"{servidor} p50":>10} {f"{servidor} p95":>10} {f"{servidor} p99":>10} {"err":>5}'
+            for servidor in servidores
+        )
+        self.stdout.write(encabezado)
+        rutas = list(resultados[servidores[0]][0])
+        for ruta in rutas:
+            linea = f'{ruta:<20}'
+            for servidor in servidores:
+                r = resultados[servidor][0].get(ruta)
+                if r is None:
+                    linea += f' {"-":>10} {"-":>10} {"-":>10} {"-":>5}'
+                    continue
+                linea += f' {r["p50"]:>10.1f} {r["p95"]:>10.1f} {r["p99"]:>10.1f} {r["errores"]:>5}'
+            self.stdout.write(linea)
+        for servidor in servidores:
+            total, duracion = resultados[servidor][0]['total'], resultados[servidor][1]
+            self.stdout.write(
+                f'{servidor}: {total["peticiones"]} peticiones en {duracion:.1f} s, '
+                f'{total["peticiones"] / duracion:.1f} req/s, {total["errores"]} errores'
+            )
@@ -0,0 +1,190 @@
+import json
+import random
+import re
+import threading
+import time
+from collections import defaultdict
+from contextlib import ExitStack
+
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import override_settings
+from django.urls import get_resolver, reverse
+
+from boutique.bench import CLAVE_USUARIOS, Cliente, base_temporal, comparar, percentil, sembrar_datos, servidor_wsgi
+from boutique.models import Categoria, Producto
+
+
+def _contar_consultas(aplicacion):
+    """Envuelve la app WSGI para devolver en una cabecera cuántas consultas hizo la petición"""
+    def app(environ, start_response):
+        consultas = [0]
+
+        def contar(execute, sql, params, many, context):
+            consultas[0] += 1
+            return execute(sql, params, many, context)
+
+        def responder(status, headers, exc_info=None):
+            return start_response(status, headers + [('X-Bench-Consultas', str(consultas[0]))], exc_info)
+
+        # Todas las conexiones del hilo: el catálogo se lee por la de lectura
+        with ExitStack() as pila:
+            for conexion in connections.all(initialized_only=False):
+                pila.enter_context(conexion.execute_wrapper(contar))
+            return aplicacion(environ, responder)
+    return app
+
+
+class Command(BaseCommand):
+    help = ('Siembra un catálogo sintético, recorre todas las rutas de la tienda con clientes '
+            'concurrentes contra un servidor local y mide latencia, rendimiento y consultas')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--categorias', type=int, default=20)
+        parser.add_argument('--productos', type=int, default=100_000)
+        parser.add_argument('--ofertas', type=int, default=50)
+        parser.add_argument('--usuarios', type=int, default=50)
+        parser.add_argument('--clientes', type=int, default=8, help='Clientes concurrentes')
+        parser.add_argument('--rondas', type=int, default=5, help='Vueltas completas por cliente')
+        parser.add_argument('--guardar', metavar='ARCHIVO', help='Guarda los resultados como línea base (JSON)')
+        parser.add_argument('--comparar', metavar='ARCHIVO', help='Compara con una línea base guardada')
+        parser.add_argument('--tolerancia', type=float, default=0.2,
+                            help='Empeoramiento de p95 permitido frente a la línea base (0.2 = 20%%)')
+
+    def handle(self, *args, **options):
+        if not 1 <= options['clientes'] <= options['usuarios']:
+            raise CommandError('--clientes debe estar entre 1 y --usuarios')
+        if options['productos'] < 1 or options['categorias'] < 1:
+            raise CommandError('Hacen falta al menos una categoría y un producto')
+
+        ajustes = override_settings(
+            DEBUG=False,
+            ALLOWED_HOSTS=['*'],
+            PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+        )
+        with base_temporal(), ajustes:
+            inicio = time.perf_counter()
+            usuarios = sembrar_datos(
+                categorias=options['categorias'], productos=options['productos'],
+                ofertas=options['ofertas'], usuarios=options['usuarios'],
+            )
+            self.stdout.write(f'Datos sembrados en {time.perf_counter() - inicio:.1f} s')
+            self.producto_ids = list(Producto.objects.values_list('pk', flat=True)[:1000])
+            self.categoria_id = Categoria.objects.values_list('pk', flat=True).first()
+
+            medidas, duracion = self._cargar(usuarios[:options['clientes']], options['rondas'])
+
+        resultados = self._resumir(medidas)
+        total = sum(r['peticiones'] for r in resultados.values())
+        self._imprimir(resultados)
+        self.stdout.write(f'{total} peticiones en {duracion:.1f} s: {total / duracion:.1f} req/s')
+
+        no_cubiertas = self._rutas_sin_cubrir(medidas)
+        if no_cubiertas:
+            self.stdout.write(self.style.WARNING(f'Rutas sin escenario: {", ".join(sorted(no_cubiertas))}'))
+
+        if options['guardar']:
+            with open(options['guardar'], 'w', encoding='utf-8') as archivo:
+                json.dump({'rutas': resultados, 'por_segundo': total / duracion}, archivo, indent=2)
+            self.stdout.write(f'Línea base guardada en {options["guardar"]}')
+        if options['comparar']:
+            with open(options['comparar'], encoding='utf-8') as archivo:
+                base = json.load(archivo)
+            regresiones = comparar(resultados, base['rutas'], options['tolerancia'])
+            for regresion in regresiones:
+                self.stdout.write(self.style.ERROR(regresion))
+            if regresiones:
+                raise CommandError(f'{len(regresiones)} regresiones frente a {options["comparar"]}')
+            self.stdout.write(self.style.SUCCESS('Sin regresiones frente a la línea base'))
+
+    def _cargar(self, usuarios, rondas):
+        medidas = defaultdict(list)
+        with servidor_wsgi(_contar_consultas(WSGIHandler())) as base:
+            hilos = [
+                threading.Thread(target=self._navegar, args=(Cliente(base, medidas), usuario, rondas, semilla))
+                for semilla, usuario in enumerate(usuarios)
+            ]
+            inicio = time.perf_counter()
+            for hilo in hilos:
+                hilo.start()
+            for hilo in hilos:
+                hilo.join()
+        return medidas, time.perf_counter() - inicio
+
+    def _navegar(self, cliente, usuario, rondas, semilla):
+        azar = random.Random(semilla)
+        lecturas = [
+            ('inicio', reverse('inicio')),
+            ('productos', reverse('productos')),
+            ('productos?categoria', f'{reverse("productos")}?categoria={self.categoria_id}'),
+            ('ofertas', reverse('ofertas')),
+            ('buscar', f'{reverse("buscar")}?q=vestido'),
+            ('ubicaciones', reverse('ubicaciones')),
+            ('registro', reverse('registro')),
+            ('contacto', reverse('contacto')),
+            ('acerca_de', reverse('acerca_de')),
+            ('perfil', reverse('perfil')),
+            ('api_buscar', f'{reverse("api_buscar")}?q=seda'),
+            ('api_productos', reverse('api_productos')),
+            ('api_categorias', reverse('api_categorias')),
+            ('api_ofertas', reverse('api_ofertas')),
+            ('metricas', reverse('metricas')),
+        ]
+
+        cliente.pedir('login', reverse('login'))
+        cliente.pedir('login POST', reverse('login'), {'username': usuario, 'password': CLAVE_USUARIOS})
+        for _ in range(rondas):
+            for nombre, ruta in lecturas:
+                cliente.pedir(nombre, ruta)
+            producto_id = azar.choice(self.producto_ids)
+            cliente.pedir('api_producto', reverse('api_producto', args=[producto_id]))
+            cliente.pedir('agregar_al_carrito', reverse('agregar_al_carrito', args=[producto_id]))
+            cliente.pedir('agregar_al_carrito', reverse('agregar_al_carrito', args=[azar.choice(self.producto_ids)]))
+
+            html = cliente.pedir('carrito', reverse('carrito'))
+            lineas = re.findall(r'/actualizar-carrito/(\d+)/', html)
+            if lineas:
+                cliente.pedir('actualizar_carrito', reverse('actualizar_carrito', args=[lineas[0]]), {'cantidad': 2})
+            if len(lineas) > 1:
+                cliente.pedir('eliminar_del_carrito', reverse('eliminar_del_carrito', args=[lineas[-1]]))
+            # Lo mismo que las tres vistas anteriores, en un lote
+            otro_id = azar.choice(self.producto_ids)
+            cliente.pedir('api_carrito POST', reverse('api_carrito'), datos_json={'operaciones': [
+                {'op': 'agregar', 'producto': producto_id},
+                {'op': 'agregar', 'producto': otro_id},
+                {'op': 'fijar', 'producto': producto_id, 'cantidad': 2},
+                {'op': 'quitar', 'producto': otro_id},
+            ]})
+            cliente.pedir('api_carrito', reverse('api_carrito'))
+            cliente.pedir('realizar_pedido', reverse('realizar_pedido'))
+        cliente.pedir('logout', reverse('logout'))
+
+    def _resumir(self, medidas):
+        resultados = {}
+        for nombre, filas in sorted(medidas.items()):
+            tiempos = [duracion * 1000 for duracion, _, _ in filas]
+            resultados[nombre] = {
+                'peticiones': len(filas),
+                'errores': sum(1 for _, _, error in filas if error),
+                'p50': percentil(tiempos, 50),
+                'p95': percentil(tiempos, 95),
+                'p99': percentil(tiempos, 99),
+                'consultas': sum(consultas for _, consultas, _ in filas) / len(filas),
+            }
+        return resultados
+
+    def _imprimir(self, resultados):
+        self.stdout.write(
+            f'{"ruta":<22} {"n":>6} {"err":>5} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} {"consultas":>10}'
+        )
+        for nombre, r in resultados.items():
+            linea = (f'{nombre:<22} {r["peticiones"]:>6} {r["errores"]:>5} {r["p50"]:>8.1f} '
+                     f'{r["p95"]:>8.1f} {r["p99"]:>8.1f} {r["consultas"]:>10.1f}')
+            self.stdout.write(self.style.ERROR(linea) if r['errores'] else linea)
+
+    def _rutas_sin_cubrir(self, medidas):
+        # Un escenario se llama como su ruta (más un sufijo opcional)
+        cubiertas = {nombre.split('?')[0].split(' ')[0] for nombre in medidas}
+        nombres = {patron.name for patron in get_resolver('boutique.urls').url_patterns if patron.name}
+        return nombres - cubiertas
@@ -0,0 +1,107 @@
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from boutique.bench import base_temporal, percentil
+from boutique.models import Carrito, Categoria, Producto
+
+CLAVE = 'clave-de-bench'
+
+
+class Command(BaseCommand):
+    help = 'Compara el rendimiento de los motores de sesión con varios clientes que inician sesión a la vez'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--motores', nargs='+', choices=list(settings.MOTORES_SESION),
+                            default=list(settings.MOTORES_SESION), help='Motores a comparar (por defecto todos)')
+        parser.add_argument('--clientes', type=int, default=8, help='Clientes concurrentes')
+        parser.add_argument('--rondas', type=int, default=20, help='Rondas de navegación por cliente')
+
+    def handle(self, *args, **options):
+        if options['clientes'] < 1 or options['rondas'] < 1:
+            raise CommandError('--clientes y --rondas deben ser al menos 1')
+
+        # El hash de contraseñas por defecto dominaría el tiempo de cada login
+        ajustes = override_settings(
+            ALLOWED_HOSTS=['*'],
+            PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+        )
+        with base_temporal(), ajustes:
+            self._preparar(options['clientes'])
+            self.stdout.write(f'{"motor":<10} {"peticiones":>10} {"errores":>8} {"req/s":>8} {"p50 ms":>8} {"p95 ms":>8}')
+            for motor in options['motores']:
+                fila = self._medir(motor, options['clientes'], options['rondas'])
+                self.stdout.write(
+                    f'{motor:<10} {fila["peticiones"]:>10} {fila["errores"]:>8} {fila["por_segundo"]:>8.1f}'
+                    f' {fila["p50"]:>8.1f} {fila["p95"]:>8.1f}'
+                )
+
+    def _preparar(self, clientes):
+        categoria = Categoria.objects.create(nombre='Bench', descripcion='...')
+        self.productos = [
+            Producto.objects.create(nombre=f'Producto {i}', precio=100, cantidad=10**6,
+                                    descripcion='...', categoria=categoria).pk
+            for i in range(10)
+        ]
+        self.usuarios = [
+            User.objects.create_user(username=f'bench{i}', password=CLAVE).username
+            for i in range(clientes)
+        ]
+
+    def _medir(self, motor, clientes, rondas):
+        # Mismo punto de partida para cada motor
+        Carrito.objects.all().delete()
+        caches[settings.SESSION_CACHE_ALIAS].clear()
+
+        tiempos, errores = [], []
+        with override_settings(SESSION_ENGINE=settings.MOTORES_SESION[motor]):
+            hilos = [
+                threading.Thread(target=self._navegar, args=(usuario, rondas, tiempos, errores))
+                for usuario in self.usuarios
+            ]
+            inicio = time.perf_counter()
+            for hilo in hilos:
+                hilo.start()
+            for hilo in hilos:
+                hilo.join()
+            duracion = time.perf_counter() - inicio
+
+        return {
+            'peticiones': len(tiempos),
+            'errores': len(errores),
+            'por_segundo': len(tiempos) / duracion,
+            'p50': percentil(tiempos, 50) * 1000,
+            'p95': percentil(tiempos, 95) * 1000,
+        }
+
+    def _navegar(self, usuario, rondas, tiempos, errores):
+        cliente = Client()
+
+        def pedir(metodo, url, **datos):
+            inicio = time.perf_counter()
+            try:
+                respuesta = getattr(cliente, metodo)(url, datos)
+                if respuesta.status_code >= 400:
+                    errores.append(f'{url}: {respuesta.status_code}')
+            except Exception as e:
+                errores.append(f'{url}: {e}')
+            tiempos.append(time.perf_counter() - inicio)
+
+        try:
+            pedir('post', reverse('login'), username=usuario, password=CLAVE)
+            for ronda in range(rondas):
+                producto_id = self.productos[ronda % len(self.productos)]
+                # agregar deja un aviso que la siguiente página consume
+                pedir('get', reverse('agregar_al_carrito', args=[producto_id]))
+                pedir('get', reverse('carrito'))
+                pedir('get', reverse('perfil'))
+                pedir('get', reverse('inicio'))
+        finally:
+            connections.close_all()
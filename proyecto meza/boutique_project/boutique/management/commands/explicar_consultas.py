@@ -0,0 +1,94 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+from boutique.models import Categoria
+
+# Rutas GET cuyas consultas se analizan; las protegidas se piden con sesión iniciada
+RUTAS = [
+    ('inicio', False),
+    ('productos', False),
+    ('ofertas', False),
+    ('carrito', True),
+    ('perfil', True),
+]
+
+
+def plan_de_ejecucion(cursor, sql):
+    if connection.vendor == 'sqlite':
+        cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+        return [fila[-1] for fila in cursor.fetchall()]
+    cursor.execute('EXPLAIN ' + sql)
+    return [fila[0] for fila in cursor.fetchall()]
+
+
+def es_recorrido_completo(linea):
+    # SQLite: "SCAN tabla" sin índice; PostgreSQL: "Seq Scan"
+    linea = linea.strip()
+    return (linea.startswith('SCAN ') and ' USING ' not in linea) or 'Seq Scan' in linea
+
+
+class Command(BaseCommand):
+    help = 'Ejecuta EXPLAIN sobre las consultas de cada vista y marca los recorridos completos de tabla'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--usuario', help='Usuario para las vistas que requieren sesión (por defecto el primero)')
+        parser.add_argument('--estricto', action='store_true', help='Termina con error si hay recorridos completos')
+
+    def handle(self, *args, **options):
+        usuario = User.objects.filter(username=options['usuario']).first() if options['usuario'] else User.objects.order_by('pk').first()
+        if options['usuario'] and usuario is None:
+            raise CommandError(f'No existe el usuario "{options["usuario"]}"')
+
+        rutas = [(reverse(nombre), requiere_sesion) for nombre, requiere_sesion in RUTAS]
+        categoria = Categoria.objects.order_by('pk').first()
+        if categoria:
+            rutas.insert(2, (f'{reverse("productos")}?categoria={categoria.pk}', False))
+
+        recorridos = 0
+        # Sin caché para que las vistas consulten de verdad; todo se revierte al final
+        with override_settings(
+            CACHES={**settings.CACHES, 'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}},
+            ALLOWED_HOSTS=['*'],
+        ), transaction.atomic():
+            cliente = Client()
+            for url, requiere_sesion in rutas:
+                if requiere_sesion:
+                    if usuario is None:
+                        self.stdout.write(self.style.WARNING(f'{url}: omitida, no hay usuarios'))
+                        continue
+                    cliente.force_login(usuario)
+                else:
+                    cliente.logout()
+
+                with CaptureQueriesContext(connection) as consultas:
+                    cliente.get(url)
+
+                self.stdout.write(self.style.MIGRATE_HEADING(f'{url} ({len(consultas)} consultas)'))
+                with connection.cursor() as cursor:
+                    for consulta in consultas.captured_queries:
+                        sql = consulta['sql']
+                        if not sql.lstrip().upper().startswith('SELECT'):
+                            continue
+                        self.stdout.write(f'  {sql[:160]}')
+                        # Un listado sin WHERE (p. ej. todas las categorías) recorre la tabla por definición
+                        filtrada = ' WHERE ' in sql.upper()
+                        for linea in plan_de_ejecucion(cursor, sql):
+                            if filtrada and es_recorrido_completo(linea):
+                                recorridos += 1
+                                self.stdout.write(self.style.ERROR(f'    ! {linea}'))
+                            else:
+                                self.stdout.write(f'    {linea}')
+            transaction.set_rollback(True)
+
+        if recorridos:
+            mensaje = f'{recorridos} recorrido(s) completo(s) de tabla'
+            if options['estricto']:
+                raise CommandError(mensaje)
+            self.stdout.write(self.style.WARNING(mensaje))
+        else:
+            self.stdout.write(self.style.SUCCESS('Sin recorridos completos de tabla'))
@@ -0,0 +1,42 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from boutique.intercambio import FORMATOS, MODELOS, abrir, exportar, formato_de
+
+
+class Command(BaseCommand):
+    help = 'Exporta categorías, productos u ofertas a CSV o JSON Lines (también .gz) por bloques'
+
+    def add_arguments(self, parser):
+        parser.add_argument('modelo', choices=list(MODELOS))
+        parser.add_argument('archivo', help="Ruta del archivo, o '-' para escribir en la salida estándar")
+        parser.add_argument('--formato', choices=FORMATOS, help='Por defecto se deduce de la extensión')
+        parser.add_argument('--lote', type=int, default=1000, help='Filas leídas por consulta')
+
+    def handle(self, *args, **options):
+        formato = options['formato'] or formato_de(options['archivo'])
+        if formato is None:
+            raise CommandError('No se reconoce la extensión; indica --formato')
+        if options['lote'] < 1:
+            raise CommandError('--lote debe ser al menos 1')
+
+        self.inicio = self.ultimo_aviso = time.perf_counter()
+        try:
+            with abrir(options['archivo'], 'w', self.stdout) as archivo:
+                escritas = exportar(options['modelo'], archivo, formato, lote=options['lote'], al_avanzar=self._avance)
+        except OSError as e:
+            raise CommandError(str(e))
+
+        duracion = time.perf_counter() - self.inicio
+        # Con '-' los datos van por stdout: el resumen va siempre por stderr
+        self.stderr.write(self.style.SUCCESS(
+            f'{escritas} filas exportadas en {duracion:.1f} s ({escritas / max(duracion, 1e-9):.0f} filas/s)'
+        ))
+
+    def _avance(self, escritas):
+        ahora = time.perf_counter()
+        if ahora - self.ultimo_aviso < 1:
+            return
+        self.ultimo_aviso = ahora
+        self.stderr.write(f'{escritas} filas ({escritas / (ahora - self.inicio):.0f}/s)')
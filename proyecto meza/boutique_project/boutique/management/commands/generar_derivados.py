@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from boutique.imagenes import VARIANTES_POR_MODELO, generar_derivados
+from boutique.models import Producto, Oferta
+
+
+class Command(BaseCommand):
+    help = 'Genera las miniaturas, tarjetas y versiones hero (WebP y JPEG) de las imágenes existentes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--forzar', action='store_true', help='Regenera aunque ya existan')
+
+    def handle(self, *args, **options):
+        total = 0
+        for modelo, variantes in ((Producto, VARIANTES_POR_MODELO['producto']), (Oferta, VARIANTES_POR_MODELO['oferta'])):
+            for objeto in modelo.objects.exclude(imagen='').exclude(imagen__isnull=True).only('id', 'imagen').iterator():
+                try:
+                    escritos = generar_derivados(objeto.imagen, variantes, forzar=options['forzar'])
+                except (OSError, ValueError) as e:
+                    self.stderr.write(f'{modelo.__name__} #{objeto.pk}: {e}')
+                    continue
+                total += len(escritos)
+                if escritos:
+                    self.stdout.write(f'{modelo.__name__} #{objeto.pk}: {len(escritos)} archivos')
+        self.stdout.write(self.style.SUCCESS(f'{total} derivados generados'))
@@ -0,0 +1,57 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from boutique.intercambio import FORMATOS, MODELOS, ErrorFila, Importacion, abrir, formato_de, leer_filas
+
+
+class Command(BaseCommand):
+    help = ('Importa categorías, productos u ofertas desde CSV o JSON Lines (también .gz). '
+            'Las filas con un id existente lo actualizan; el resto se crean')
+
+    def add_arguments(self, parser):
+        parser.add_argument('modelo', choices=list(MODELOS))
+        parser.add_argument('archivo', help="Ruta del archivo, o '-' para leer de la entrada estándar")
+        parser.add_argument('--formato', choices=FORMATOS, help='Por defecto se deduce de la extensión')
+        parser.add_argument('--lote', type=int, default=1000, help='Filas por transacción')
+        parser.add_argument('--omitir-errores', action='store_true',
+                            help='Salta las filas inválidas en vez de detenerse en la primera')
+
+    def handle(self, *args, **options):
+        formato = options['formato'] or formato_de(options['archivo'])
+        if formato is None:
+            raise CommandError('No se reconoce la extensión; indica --formato')
+        if options['lote'] < 1:
+            raise CommandError('--lote debe ser al menos 1')
+
+        importacion = Importacion(options['modelo'], lote=options['lote'], omitir_errores=options['omitir_errores'])
+        self.inicio = self.ultimo_aviso = time.perf_counter()
+        try:
+            with abrir(options['archivo'], 'r', sys.stdin) as archivo:
+                importacion.importar(leer_filas(archivo, formato), al_avanzar=self._avance)
+        except ErrorFila as e:
+            raise CommandError(f'{e}. Lotes ya guardados: {importacion.creadas} creadas, '
+                               f'{importacion.actualizadas} actualizadas')
+        except OSError as e:
+            raise CommandError(str(e))
+
+        for error in importacion.errores[:20]:
+            self.stderr.write(error)
+        if len(importacion.errores) > 20:
+            self.stderr.write(f'... y {len(importacion.errores) - 20} errores más')
+
+        duracion = time.perf_counter() - self.inicio
+        self.stdout.write(self.style.SUCCESS(
+            f'{importacion.creadas} creadas, {importacion.actualizadas} actualizadas, '
+            f'{importacion.omitidas} omitidas en {duracion:.1f} s '
+            f'({importacion.procesadas / max(duracion, 1e-9):.0f} filas/s)'
+        ))
+
+    def _avance(self, importacion):
+        # Como mucho un aviso por segundo, por stderr para no mezclarse con la salida
+        ahora = time.perf_counter()
+        if ahora - self.ultimo_aviso < 1:
+            return
+        self.ultimo_aviso = ahora
+        self.stderr.write(f'{importacion.procesadas} filas ({importacion.procesadas / (ahora - self.inicio):.0f}/s)')
@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from boutique.models import Reserva
+
+
+class Command(BaseCommand):
+    help = 'Borra en lote las reservas de stock vencidas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--continuo', action='store_true', help='Sigue barriendo hasta que se detenga con Ctrl+C')
+        parser.add_argument('--intervalo', type=float, default=60.0, help='Segundos entre barridos')
+        parser.add_argument('--lote', type=int, default=1000, help='Reservas borradas por sentencia')
+
+    def handle(self, *args, **options):
+        try:
+            while True:
+                liberadas = Reserva.liberar_vencidas(lote=options['lote'])
+                if liberadas or not options['continuo']:
+                    self.stdout.write(f'{liberadas} reservas vencidas liberadas')
+                if not options['continuo']:
+                    break
+                time.sleep(options['intervalo'])
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,46 @@
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import django
+from django.core.management.base import BaseCommand
+
+from boutique.cola import procesar_pendientes
+
+
+class Command(BaseCommand):
+    help = 'Worker de la cola de tareas: procesa derivados de imágenes y el trabajo posterior a los pedidos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hilos', type=int, default=4, help='Tareas en paralelo (por defecto 4)')
+        parser.add_argument('--procesos', action='store_true', help='Usa procesos en lugar de hilos (trabajo de CPU)')
+        parser.add_argument('--lote', type=int, default=50, help='Tareas reclamadas por vuelta')
+        parser.add_argument('--intervalo', type=float, default=1.0, help='Segundos de espera cuando la cola está vacía')
+        parser.add_argument('--una-vez', action='store_true', help='Procesa lo pendiente y termina')
+
+    def handle(self, *args, **options):
+        if options['procesos']:
+            # spawn: cada proceso abre sus propias conexiones en lugar de heredarlas
+            executor = ProcessPoolExecutor(
+                max_workers=options['hilos'],
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=django.setup,
+            )
+        else:
+            executor = ThreadPoolExecutor(max_workers=options['hilos'])
+
+        total = 0
+        with executor:
+            try:
+                while True:
+                    procesadas = procesar_pendientes(options['lote'], executor)
+                    total += procesadas
+                    if procesadas:
+                        self.stdout.write(f'{procesadas} tareas procesadas')
+                    elif options['una_vez']:
+                        break
+                    else:
+                        time.sleep(options['intervalo'])
+            except KeyboardInterrupt:
+                pass
+        self.stdout.write(self.style.SUCCESS(f'Worker detenido ({total} tareas)'))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from boutique.models import PrecioEfectivo
+
+
+class Command(BaseCommand):
+    help = 'Recalcula el precio efectivo de todos los productos con las ofertas vigentes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=1000, help='Productos por bloque')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            cambiados = PrecioEfectivo.recalcular(lote=options['lote'])
+        self.stdout.write(self.style.SUCCESS(f'{len(cambiados)} precios actualizados'))
@@ -0,0 +1,17 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from boutique.models import VentaDiaria
+
+
+class Command(BaseCommand):
+    help = 'Recalcula las ventas diarias a partir de los pedidos (todas, o solo un rango de días)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', type=date.fromisoformat, help='Primer día (AAAA-MM-DD)')
+        parser.add_argument('--hasta', type=date.fromisoformat, help='Último día (AAAA-MM-DD)')
+
+    def handle(self, *args, **options):
+        filas = VentaDiaria.reconstruir(options['desde'], options['hasta'])
+        self.stdout.write(self.style.SUCCESS(f'{filas} filas de ventas diarias'))
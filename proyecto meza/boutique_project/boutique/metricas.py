@@ -0,0 +1,308 @@
+import bisect
+import cProfile
+import logging
+import random
+import threading
+import time
+import uuid
+from collections import defaultdict
+from contextvars import ContextVar
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import Http404, HttpResponse
+from django.template.backends.django import DjangoTemplates, Template
+from django.utils import timezone
+from django.utils.functional import empty
+
+# Instrumentación por petición.
+#
+# MetricasMiddleware abre una Medicion al entrar; el envoltorio de SQL, el
+# backend de plantillas y los backends de cache la van llenando mientras
+# exista. Al salir se agrega al Registro del proceso, que /metricas/ publica
+# en el formato de texto de Prometheus. Cada proceso lleva sus propios
+# contadores: con varios workers el servidor de métricas los suma.
+
+logger = logging.getLogger(__name__)
+
+_medicion = ContextVar('medicion', default=None)
+
+# Límites del histograma de duración, en segundos
+LIMITES = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class Medicion:
+    __slots__ = ('inicio', 'consultas', 'sql', 'plantillas', 'aciertos', 'fallos')
+
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.consultas = 0
+        self.sql = 0.0
+        self.plantillas = 0.0
+        self.aciertos = 0
+        self.fallos = 0
+
+    def server_timing(self, duracion):
+        """Valor de la cabecera Server-Timing (duraciones en ms)"""
+        partes = [
+            f'total;dur={duracion * 1000:.1f}',
+            f'sql;dur={self.sql * 1000:.1f};desc="{self.consultas} consultas"',
+            f'plantilla;dur={self.plantillas * 1000:.1f}',
+        ]
+        if self.aciertos or self.fallos:
+            partes.append(f'cache;desc="{self.aciertos}/{self.aciertos + self.fallos} aciertos"')
+        return ', '.join(partes)
+
+
+def medicion_actual():
+    return _medicion.get()
+
+
+class Registro:
+    """Contadores acumulados del proceso, por vista"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reiniciar()
+
+    def reiniciar(self):
+        with self._lock:
+            self.peticiones = defaultdict(int)
+            self.histogramas = defaultdict(lambda: [0] * (len(LIMITES) + 1))
+            self.segundos = defaultdict(float)
+            self.totales = defaultdict(lambda: defaultdict(float))
+
+    def registrar(self, vista, metodo, estado, medicion, duracion):
+        with self._lock:
+            self.peticiones[vista, metodo, estado] += 1
+            self.histogramas[vista][bisect.bisect_left(LIMITES, duracion)] += 1
+            self.segundos[vista] += duracion
+            totales = self.totales[vista]
+            totales['sql_consultas'] += medicion.consultas
+            totales['sql_segundos'] += medicion.sql
+            totales['plantilla_segundos'] += medicion.plantillas
+            totales['cache_aciertos'] += medicion.aciertos
+            totales['cache_fallos'] += medicion.fallos
+
+    def exportar(self):
+        with self._lock:
+            lineas = [
+                '# HELP boutique_peticiones_total Peticiones atendidas',
+                '# TYPE boutique_peticiones_total counter',
+            ]
+            for (vista, metodo, estado), n in sorted(self.peticiones.items()):
+                lineas.append(
+                    f'boutique_peticiones_total{{vista="{_escapar(vista)}",metodo="{metodo}",estado="{estado}"}} {n}'
+                )
+
+            lineas += [
+                '# HELP boutique_peticion_segundos Duración de las peticiones',
+                '# TYPE boutique_peticion_segundos histogram',
+            ]
+            for vista, cubetas in sorted(self.histogramas.items()):
+                etiqueta = f'vista="{_escapar(vista)}"'
+                acumulado = 0
+                for limite, n in zip(LIMITES + ('+Inf',), cubetas):
+                    acumulado += n
+                    lineas.append(f'boutique_peticion_segundos_bucket{{{etiqueta},le="{limite}"}} {acumulado}')
+                lineas.append(f'boutique_peticion_segundos_sum{{{etiqueta}}} {self.segundos[vista]:.6f}')
+                lineas.append(f'boutique_peticion_segundos_count{{{etiqueta}}} {acumulado}')
+
+            for nombre, ayuda in (
+                ('sql_consultas', 'Consultas SQL ejecutadas'),
+                ('sql_segundos', 'Tiempo en consultas SQL'),
+                ('plantilla_segundos', 'Tiempo renderizando plantillas'),
+                ('cache_aciertos', 'Lecturas de cache con resultado'),
+                ('cache_fallos', 'Lecturas de cache sin resultado'),
+            ):
+                lineas += [f'# HELP boutique_{nombre}_total {ayuda}', f'# TYPE boutique_{nombre}_total counter']
+                for vista, totales in sorted(self.totales.items()):
+                    valor = totales[nombre]
+                    valor = f'{valor:.6f}' if nombre.endswith('segundos') else f'{valor:.0f}'
+                    lineas.append(f'boutique_{nombre}_total{{vista="{_escapar(vista)}"}} {valor}')
+        return '\n'.join(lineas) + '\n'
+
+
+def _escapar(valor):
+    return valor.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+registro = Registro()
+
+
+# SQL
+
+def _medir_sql(execute, sql, params, many, context):
+    medicion = _medicion.get()
+    if medicion is None:
+        return execute(sql, params, many, context)
+    inicio = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        medicion.sql += time.perf_counter() - inicio
+        medicion.consultas += 1
+
+
+@receiver(connection_created)
+def instrumentar_conexion(sender, connection, **kwargs):
+    # Al principio de la lista: execute_wrapper() quita siempre el último
+    if _medir_sql not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, _medir_sql)
+
+
+# Plantillas
+
+class _PlantillaMedida(Template):
+    def render(self, context=None, request=None):
+        medicion = _medicion.get()
+        if medicion is None:
+            return super().render(context, request)
+        inicio = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            medicion.plantillas += time.perf_counter() - inicio
+
+
+class PlantillasMedidas(DjangoTemplates):
+    """Backend de Django que suma el tiempo de render (con context processors e includes)"""
+
+    def from_string(self, template_code):
+        return _PlantillaMedida(super().from_string(template_code).template, self)
+
+    def get_template(self, template_name):
+        return _PlantillaMedida(super().get_template(template_name).template, self)
+
+
+# Cache
+
+_FALTA = object()
+
+
+class _ContarAciertos:
+    # get_many, get_or_set y {% cache %} pasan todos por get()
+    def get(self, key, default=None, version=None):
+        valor = super().get(key, _FALTA, version)
+        medicion = _medicion.get()
+        if medicion is not None:
+            if valor is _FALTA:
+                medicion.fallos += 1
+            else:
+                medicion.aciertos += 1
+        return default if valor is _FALTA else valor
+
+
+class LocMemMedida(_ContarAciertos, LocMemCache):
+    pass
+
+
+class ArchivoMedida(_ContarAciertos, FileBasedCache):
+    pass
+
+
+# Middleware y vista
+
+def _nombre_vista(request):
+    coincidencia = getattr(request, 'resolver_match', None)
+    if coincidencia is None:
+        return 'sin_ruta'
+    return coincidencia.url_name or coincidencia.view_name
+
+
+def _guardar_perfil(perfil, request, duracion):
+    carpeta = Path(settings.BOUTIQUE_PERFILES_DIR)
+    carpeta.mkdir(parents=True, exist_ok=True)
+    nombre = (f'{timezone.now():%Y%m%d-%H%M%S}-{_nombre_vista(request)}'
+              f'-{duracion * 1000:.0f}ms-{uuid.uuid4().hex[:6]}.prof')
+    perfil.dump_stats(carpeta / nombre)
+    logger.info('Perfil guardado', extra={'archivo': nombre, 'ruta': request.path, 'ms': round(duracion * 1000)})
+
+
+class MetricasMiddleware:
+    """Mide cada petición: duración, SQL, plantillas y cache.
+
+    Va primero en MIDDLEWARE para que la duración incluya al resto. Añade
+    Server-Timing si BOUTIQUE_SERVER_TIMING está activo o el usuario es staff.
+    Una fracción BOUTIQUE_PERFILAR_MUESTRA de las peticiones síncronas corre
+    bajo cProfile; si tarda más de BOUTIQUE_PERFILAR_LENTAS_MS el perfil se
+    guarda en BOUTIQUE_PERFILES_DIR (se abre con ``python -m pstats``). Las
+    respuestas en streaming se miden hasta que empiezan a enviarse.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        medicion = Medicion()
+        marca = _medicion.set(medicion)
+        perfil = self._perfilador()
+        try:
+            response = self.get_response(request)
+        finally:
+            if perfil is not None:
+                perfil.disable()
+            _medicion.reset(marca)
+        duracion = time.perf_counter() - medicion.inicio
+        if perfil is not None and duracion * 1000 >= settings.BOUTIQUE_PERFILAR_LENTAS_MS:
+            _guardar_perfil(perfil, request, duracion)
+        usuario = getattr(request, 'user', None)
+        server_timing = settings.BOUTIQUE_SERVER_TIMING or (usuario is not None and usuario.is_staff)
+        return self._terminar(request, response, medicion, duracion, server_timing)
+
+    async def __acall__(self, request):
+        # cProfile mediría todo el bucle de eventos, no solo esta petición
+        medicion = Medicion()
+        marca = _medicion.set(medicion)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _medicion.reset(marca)
+        duracion = time.perf_counter() - medicion.inicio
+        server_timing = settings.BOUTIQUE_SERVER_TIMING or await self._aes_staff(request)
+        return self._terminar(request, response, medicion, duracion, server_timing)
+
+    async def _aes_staff(self, request):
+        usuario = getattr(request, 'user', None)
+        if usuario is None:
+            return False
+        # request.user es perezoso: cargarlo aquí sería una consulta síncrona en el bucle de eventos
+        if getattr(usuario, '_wrapped', None) is empty:
+            usuario = await request.auser()
+        return usuario.is_staff
+
+    def _perfilador(self):
+        muestra = settings.BOUTIQUE_PERFILAR_MUESTRA
+        if not muestra or random.random() >= muestra:
+            return None
+        perfil = cProfile.Profile()
+        try:
+            perfil.enable()
+        except ValueError:  # ya hay otro perfilador activo
+            return None
+        return perfil
+
+    def _terminar(self, request, response, medicion, duracion, server_timing):
+        registro.registrar(_nombre_vista(request), request.method, response.status_code, medicion, duracion)
+        if server_timing:
+            response.headers['Server-Timing'] = medicion.server_timing(duracion)
+        return response
+
+
+def ver(request):
+    """Métricas en formato de texto de Prometheus; solo desde BOUTIQUE_METRICAS_IPS o para staff"""
+    if request.META.get('REMOTE_ADDR') not in settings.BOUTIQUE_METRICAS_IPS and not request.user.is_staff:
+        raise Http404
+    return HttpResponse(registro.exportar(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,162 @@
+from django.conf import settings
+from django.contrib import messages
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.text import compress_sequence, compress_string
+
+from .cache import version_catalogo
+from .context_processors import obtener_resumen_carrito
+from .estaticos import brotli, codificaciones_aceptadas
+
+# Tipos que vale la pena comprimir; imágenes y fuentes ya vienen comprimidas
+TIPOS_COMPRIMIBLES = (
+    'text/',
+    'application/json',
+    'application/javascript',
+    'application/xml',
+    'image/svg+xml',
+)
+
+# Calidad de brotli para respuestas dinámicas: 11 es para estáticos precomprimidos
+CALIDAD_BROTLI = 4
+
+
+def _comprimir_brotli(iterador):
+    compresor = brotli.Compressor(quality=CALIDAD_BROTLI)
+    for fragmento in iterador:
+        datos = compresor.process(fragmento)
+        if datos:
+            yield datos
+    yield compresor.finish()
+
+
+async def _acomprimir_brotli(iterador):
+    compresor = brotli.Compressor(quality=CALIDAD_BROTLI)
+    async for fragmento in iterador:
+        datos = compresor.process(fragmento)
+        if datos:
+            yield datos
+    yield compresor.finish()
+
+
+async def _acomprimir_gzip(iterador, max_random_bytes):
+    # Cada fragmento es un miembro gzip completo; concatenados siguen siendo válidos
+    async for fragmento in iterador:
+        yield compress_string(fragmento, max_random_bytes=max_random_bytes)
+
+
+class CompresionMiddleware(MiddlewareMixin):
+    """Comprime con brotli (si está instalado) o gzip, también respuestas en streaming.
+
+    Las páginas con token CSRF siempre van con gzip, que agrega relleno
+    aleatorio contra BREACH.
+
+    Las respuestas de menos de BOUTIQUE_COMPRESION_MINIMO bytes se envían tal
+    cual: el ahorro no compensa el trabajo extra.
+    """
+
+    # Relleno aleatorio en la cabecera gzip contra BREACH, como GZipMiddleware
+    max_random_bytes = 100
+
+    def process_response(self, request, response):
+        if response.has_header('Content-Encoding'):
+            return response
+        tipo = response.get('Content-Type', '')
+        if not tipo.startswith(TIPOS_COMPRIMIBLES):
+            return response
+        # Cada evento tiene que llegar en cuanto se envía, no al llenarse el bloque comprimido
+        if tipo.startswith('text/event-stream'):
+            return response
+        if not response.streaming and len(response.content) < settings.BOUTIQUE_COMPRESION_MINIMO:
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        aceptadas = codificaciones_aceptadas(request)
+        # Contra BREACH solo gzip lleva relleno aleatorio: una respuesta que
+        # incluye el token CSRF no va con brotli. Si la página usó el token,
+        # CsrfViewMiddleware renueva la cookie en esta misma respuesta
+        con_token_csrf = settings.CSRF_COOKIE_NAME in response.cookies
+        if brotli is not None and 'br' in aceptadas and not con_token_csrf:
+            codificacion = 'br'
+        elif 'gzip' in aceptadas:
+            codificacion = 'gzip'
+        else:
+            return response
+
+        if response.streaming:
+            original = response.streaming_content
+            if codificacion == 'br':
+                response.streaming_content = (
+                    _acomprimir_brotli(original) if response.is_async else _comprimir_brotli(original)
+                )
+            elif response.is_async:
+                response.streaming_content = _acomprimir_gzip(original, self.max_random_bytes)
+            else:
+                response.streaming_content = compress_sequence(original, max_random_bytes=self.max_random_bytes)
+            # El tamaño comprimido no se conoce hasta terminar de enviar
+            del response.headers['Content-Length']
+        else:
+            if codificacion == 'br':
+                comprimido = brotli.compress(response.content, quality=CALIDAD_BROTLI)
+            else:
+                comprimido = compress_string(response.content, max_random_bytes=self.max_random_bytes)
+            if len(comprimido) >= len(response.content):
+                return response
+            response.content = comprimido
+            response.headers['Content-Length'] = str(len(comprimido))
+
+        # El cuerpo ya no es idéntico byte a byte: el ETag pasa a ser débil
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = codificacion
+        return response
+
+
+# Vistas cuyo HTML depende solo del catálogo, de quién es el usuario y de la
+# insignia del carrito en la cabecera
+VISTAS_CATALOGO = {'inicio', 'productos', 'ofertas', 'buscar'}
+
+
+def etag_catalogo(request):
+    partes = [str(version_catalogo())]
+    if request.user.is_authenticated:
+        partes += [str(request.user.pk), str(obtener_resumen_carrito(request).articulos)]
+    return 'W/"%s"' % '-'.join(partes)
+
+
+class CatalogoCondicionalMiddleware(MiddlewareMixin):
+    """GET condicional para las páginas del catálogo sin renderizar la plantilla.
+
+    El ETag sale del contador de versión del catálogo (se incrementa al
+    guardar productos, categorías u ofertas) y no de un hash del cuerpo, así
+    que un 304 cuesta una lectura de caché y, con sesión, la del resumen del
+    carrito. Va después de AuthenticationMiddleware y MessageMiddleware.
+    """
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return None
+        if request.resolver_match.url_name not in VISTAS_CATALOGO:
+            return None
+        # Un aviso pendiente se muestra en la página: no puede responderse 304
+        if len(messages.get_messages(request)):
+            return None
+
+        request._etag_catalogo = etag_catalogo(request)
+        response = get_conditional_response(request, etag=request._etag_catalogo)
+        if response is not None:
+            self._cabeceras(request, response)
+        return response
+
+    def process_response(self, request, response):
+        etag = getattr(request, '_etag_catalogo', None)
+        if etag and response.status_code == 200 and not response.has_header('ETag'):
+            self._cabeceras(request, response)
+        return response
+
+    def _cabeceras(self, request, response):
+        response.headers['ETag'] = request._etag_catalogo
+        # El navegador guarda la página pero siempre pregunta si sigue vigente
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ('Cookie',))
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:08
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('boutique', '0002_resumencarrito'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='oferta',
+            index=models.Index(condition=models.Q(('activa', True)), fields=['-fecha_inicio'], name='oferta_activa_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(fields=['usuario', '-fecha_pedido'], name='pedido_usuario_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(condition=models.Q(('cantidad__gt', 0), ('disponible', True)), fields=['categoria', 'nombre', 'id'], name='producto_cat_nombre_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(condition=models.Q(('cantidad__gt', 0), ('disponible', True)), fields=['nombre', 'id'], name='producto_nombre_idx'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+from django.db import migrations
+
+
+def crear_indice(apps, schema_editor):
+    from boutique.busqueda import instalar_fts
+    instalar_fts(schema_editor.connection)
+
+
+def eliminar_indice(apps, schema_editor):
+    from boutique.busqueda import desinstalar_fts
+    desinstalar_fts(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('boutique', '0003_indices_consultas'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indice, eliminar_indice),
+    ]
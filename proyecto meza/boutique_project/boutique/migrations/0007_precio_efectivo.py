@@ -0,0 +1,54 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:15
+
+import django.db.models.deletion
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def calcular_precios(apps, schema_editor):
+    # Mismo cálculo que PrecioEfectivo.recalcular sobre los modelos históricos
+    Producto = apps.get_model('boutique', 'Producto')
+    Oferta = apps.get_model('boutique', 'Oferta')
+    PrecioEfectivo = apps.get_model('boutique', 'PrecioEfectivo')
+    ahora = timezone.now()
+    vigentes = list(Oferta.objects.filter(activa=True, fecha_inicio__lte=ahora, fecha_fin__gte=ahora).prefetch_related('productos'))
+    nuevos = []
+    for producto in Producto.objects.all():
+        mejor, mejor_oferta = producto.precio, None
+        for oferta in vigentes:
+            if producto in oferta.productos.all():
+                if oferta.tipo_descuento == 'porcentaje':
+                    descuento = producto.precio * oferta.valor_descuento / 100
+                else:
+                    descuento = oferta.valor_descuento
+                precio = max(producto.precio - descuento, Decimal('0')).quantize(Decimal('0.01'))
+                if precio < mejor:
+                    mejor, mejor_oferta = precio, oferta
+        nuevos.append(PrecioEfectivo(producto=producto, precio=mejor, oferta=mejor_oferta))
+    PrecioEfectivo.objects.bulk_create(nuevos, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('boutique', '0006_tareas'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PrecioEfectivo',
+            fields=[
+                ('producto', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='precio_efectivo', serialize=False, to='boutique.producto')),
+                ('precio', models.DecimalField(db_index=True, decimal_places=2, max_digits=10)),
+                ('fecha_actualizacion', models.DateTimeField(auto_now=True)),
+                ('oferta', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='boutique.oferta')),
+            ],
+            options={
+                'verbose_name': 'Precio Efectivo',
+                'verbose_name_plural': 'Precios Efectivos',
+            },
+        ),
+        migrations.RunPython(calcular_precios, migrations.RunPython.noop),
+    ]
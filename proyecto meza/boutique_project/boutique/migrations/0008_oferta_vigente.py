@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:17
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def marcar_vigentes(apps, schema_editor):
+    Oferta = apps.get_model('boutique', 'Oferta')
+    ahora = timezone.now()
+    Oferta.objects.filter(activa=True, fecha_inicio__lte=ahora, fecha_fin__gte=ahora).update(vigente=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('boutique', '0007_precio_efectivo'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='oferta',
+            name='oferta_activa_fecha_idx',
+        ),
+        migrations.AddField(
+            model_name='oferta',
+            name='vigente',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.RunPython(marcar_vigentes, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='oferta',
+            index=models.Index(condition=models.Q(('vigente', True)), fields=['-fecha_inicio'], name='oferta_vigente_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='oferta',
+            index=models.Index(condition=models.Q(('activa', True), ('vigente', False)), fields=['fecha_inicio'], name='oferta_por_abrir_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='oferta',
+            index=models.Index(condition=models.Q(('vigente', True)), fields=['fecha_fin'], name='oferta_por_cerrar_idx'),
+        ),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:40
+
+from decimal import Decimal
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import DecimalField, F, Sum, Value
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+
+def acumular_historico(apps, schema_editor):
+    # Los pedidos existentes se suman de una vez; los nuevos los suma la cola
+    Pedido = apps.get_model('boutique', 'Pedido')
+    ItemPedido = apps.get_model('boutique', 'ItemPedido')
+    VentaDiaria = apps.get_model('boutique', 'VentaDiaria')
+    Pedido.objects.update(ventas_acumuladas=True)
+    campo = DecimalField(max_digits=14, decimal_places=2)
+    filas = ItemPedido.objects.exclude(pedido__estado='cancelado').annotate(
+        dia=TruncDate('pedido__fecha_pedido', tzinfo=timezone.get_current_timezone()),
+    ).values('dia', 'producto_id', 'producto__categoria_id', 'pedido__metodo_pago').annotate(
+        unidades=Sum('cantidad'),
+        ingresos=Coalesce(Sum(F('cantidad') * F('precio'), output_field=campo), Value(Decimal('0')), output_field=campo),
+    ).order_by()
+    VentaDiaria.objects.bulk_create((
+        VentaDiaria(
+            fecha=fila['dia'], producto_id=fila['producto_id'], categoria_id=fila['producto__categoria_id'],
+            metodo_pago=fila['pedido__metodo_pago'], unidades=fila['unidades'], ingresos=fila['ingresos'],
+        )
+        for fila in filas.iterator(chunk_size=2000)
+    ), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('boutique', '0008_oferta_vigente'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pedido',
+            name='ventas_acumuladas',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.CreateModel(
+            name='VentaDiaria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('metodo_pago', models.CharField(choices=[('efectivo', 'Efectivo'), ('tarjeta', 'Tarjeta de crédito/débito'), ('transferencia', 'Transferencia bancaria')], max_length=20)),
+                ('unidades', models.PositiveIntegerField(default=0)),
+                ('ingresos', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('categoria', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='boutique.categoria')),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='boutique.producto')),
+            ],
+            options={
+                'verbose_name': 'Venta Diaria',
+                'verbose_name_plural': 'Ventas Diarias',
+                'ordering': ['-fecha'],
+                'constraints': [models.UniqueConstraint(fields=('fecha', 'producto', 'metodo_pago'), name='venta_diaria_unica')],
+            },
+        ),
+        migrations.RunPython(acumular_historico, migrations.RunPython.noop),
+    ]
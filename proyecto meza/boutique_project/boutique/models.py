@@ -1,11 +1,21 @@
-from django.db import models
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import IntegrityError, models, transaction
+from django.db.models import F, Q, Min, Sum, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Now, TruncDate
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator
 from django.utils import timezone
 
+from .cache import invalidar_catalogo
+
 class Categoria(models.Model):
     nombre = models.CharField(max_length=100)
     descripcion = models.TextField()
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
     
     def __str__(self):
         return self.nombre
@@ -14,6 +24,22 @@ class Categoria(models.Model):
         verbose_name = 'Categoría'
         verbose_name_plural = 'Categorías'
 
+class ProductoQuerySet(models.QuerySet):
+    def disponibles(self):
+        return self.filter(disponible=True, cantidad__gt=0)
+
+    def con_precio(self):
+        # precio_final sale de la tabla PrecioEfectivo, en el mismo JOIN
+        return self.select_related('precio_efectivo')
+
+    def para_catalogo(self):
+        # Las tarjetas muestran la categoría: se trae en el mismo JOIN
+        return self.disponibles().con_precio().select_related('categoria')
+
+    def con_stock_disponible(self, usuario=None, ahora=None):
+        # cantidad menos lo retenido por reservas vigentes (de los demás si se da usuario)
+        return self.annotate(stock_disponible=F('cantidad') - Reserva.retenido(usuario, ahora))
+
 class Producto(models.Model):
     nombre = models.CharField(max_length=200)
     precio = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(0)])
@@ -23,6 +49,36 @@ class Producto(models.Model):
     imagen = models.ImageField(upload_to='productos/', null=True, blank=True)
     disponible = models.BooleanField(default=True)
     fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
+    
+    objects = ProductoQuerySet.as_manager()
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instancia = super().from_db(db, field_names, values)
+        instancia._precio_guardado = instancia.__dict__.get('precio')
+        return instancia
+    
+    def save(self, *args, **kwargs):
+        nuevo = self._state.adding
+        precio_anterior = getattr(self, '_precio_guardado', None)
+        super().save(*args, **kwargs)
+        if nuevo or (precio_anterior is not None and precio_anterior != self.precio):
+            # También recalcula los carritos que contienen el producto
+            PrecioEfectivo.recalcular([self.pk])
+        self._precio_guardado = self.precio
+    
+    @property
+    def precio_final(self):
+        """Precio con la mejor oferta vigente aplicada, leído de PrecioEfectivo"""
+        try:
+            return self.precio_efectivo.precio
+        except PrecioEfectivo.DoesNotExist:
+            return self.precio
+    
+    @property
+    def tiene_descuento(self):
+        return self.precio_final < self.precio
     
     def __str__(self):
         return f"{self.nombre} - ${self.precio}"
@@ -31,6 +87,24 @@ class Producto(models.Model):
         verbose_name = 'Producto'
         verbose_name_plural = 'Productos'
         ordering = ['nombre']
+        # Índices parciales: solo cubren lo que el catálogo puede mostrar
+        indexes = [
+            models.Index(
+                fields=['categoria', 'nombre', 'id'],
+                condition=Q(disponible=True, cantidad__gt=0),
+                name='producto_cat_nombre_idx',
+            ),
+            models.Index(
+                fields=['nombre', 'id'],
+                condition=Q(disponible=True, cantidad__gt=0),
+                name='producto_nombre_idx',
+            ),
+        ]
+
+class CarritoQuerySet(models.QuerySet):
+    def del_usuario(self, usuario):
+        # subtotal() lee producto.precio_final: se evita una consulta por línea
+        return self.filter(usuario=usuario).select_related('producto__precio_efectivo')
 
 class Carrito(models.Model):
     usuario = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -38,8 +112,27 @@ class Carrito(models.Model):
     cantidad = models.IntegerField(default=1, validators=[MinValueValidator(1)])
     fecha_agregado = models.DateTimeField(auto_now_add=True)
     
+    objects = CarritoQuerySet.as_manager()
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instancia = super().from_db(db, field_names, values)
+        # Cantidad tal como está en la base, para actualizar el resumen por diferencia
+        instancia._cantidad_guardada = instancia.__dict__.get('cantidad')
+        return instancia
+    
+    def save(self, *args, **kwargs):
+        anterior = 0 if self._state.adding else getattr(self, '_cantidad_guardada', None)
+        super().save(*args, **kwargs)
+        if anterior is None:
+            ResumenCarrito.reconstruir(self.usuario_id)
+        else:
+            diferencia = self.cantidad - anterior
+            ResumenCarrito.aplicar_cambio(self.usuario_id, diferencia, diferencia * self.producto.precio_final)
+        self._cantidad_guardada = self.cantidad
+    
     def subtotal(self):
-        return self.cantidad * self.producto.precio
+        return self.cantidad * self.producto.precio_final
     
     def __str__(self):
         return f"{self.cantidad} x {self.producto.nombre} - {self.usuario.username}"
@@ -49,6 +142,173 @@ class Carrito(models.Model):
         verbose_name_plural = 'Carritos'
         unique_together = ['usuario', 'producto']
 
+class ReservaQuerySet(models.QuerySet):
+    def vigentes(self, ahora=None):
+        return self.filter(vence__gt=ahora or timezone.now())
+
+    def vencidas(self, ahora=None):
+        return self.filter(vence__lte=ahora or timezone.now())
+
+class Reserva(models.Model):
+    """Unidades de un producto apartadas para el carrito de un usuario.
+
+    El stock disponible es ``cantidad`` menos las reservas vigentes. Una
+    reserva deja de contar en cuanto pasa ``vence``; liberar_vencidas() solo
+    borra las filas, así que un barrido atrasado nunca deja stock retenido.
+    """
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE)
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='reservas')
+    cantidad = models.PositiveIntegerField()
+    vence = models.DateTimeField()
+    
+    objects = ReservaQuerySet.as_manager()
+    
+    @classmethod
+    def retenido(cls, usuario=None, ahora=None):
+        """Unidades retenidas del producto de la consulta exterior (OuterRef('pk')),
+        sin contar las del usuario dado"""
+        reservas = cls.objects.vigentes(ahora).filter(producto_id=OuterRef('pk'))
+        if usuario is not None:
+            reservas = reservas.exclude(usuario=usuario)
+        suma = reservas.order_by().values('producto_id').annotate(s=Sum('cantidad')).values('s')
+        return Coalesce(Subquery(suma), 0)
+    
+    @classmethod
+    def disponible(cls, producto_id, usuario=None):
+        """Unidades que el usuario aún puede poner en el carrito, en una sola consulta"""
+        disponible = Producto.objects.filter(pk=producto_id, disponible=True).con_stock_disponible(usuario) \
+            .values_list('stock_disponible', flat=True).first()
+        return max(disponible or 0, 0)
+    
+    @classmethod
+    def reservar(cls, usuario, cantidades, ahora=None):
+        """Deja reservadas para el usuario las cantidades ``{producto_id: n}``.
+
+        Cada reserva se renueva por BOUTIQUE_RESERVA_MINUTOS y n = 0 la
+        libera. Si algún producto no tiene n unidades disponibles no se toca
+        ninguna y se devuelve ``{producto_id: disponibles}`` con los que no
+        alcanzan; si todo se reservó devuelve un diccionario vacío.
+        """
+        ahora = ahora or timezone.now()
+        pedidas = {producto_id: n for producto_id, n in cantidades.items() if n > 0}
+        # Sin savepoint: si falta stock se devuelve antes de escribir nada
+        with transaction.atomic(savepoint=False):
+            disponibles = {}
+            if pedidas:
+                # Con las filas de los productos bloqueadas nadie reserva a la vez lo mismo
+                disponibles = dict(
+                    Producto.objects.select_for_update().filter(pk__in=pedidas, disponible=True)
+                    .order_by('pk').con_stock_disponible(usuario, ahora).values_list('pk', 'stock_disponible')
+                )
+            faltan = {
+                producto_id: max(disponibles.get(producto_id, 0), 0)
+                for producto_id, n in pedidas.items()
+                if n > disponibles.get(producto_id, 0)
+            }
+            if faltan:
+                return faltan
+            liberar = [producto_id for producto_id, n in cantidades.items() if n <= 0]
+            if liberar:
+                cls.liberar(usuario, liberar)
+            if pedidas:
+                vence = ahora + timedelta(minutes=settings.BOUTIQUE_RESERVA_MINUTOS)
+                cls.objects.bulk_create(
+                    [cls(usuario=usuario, producto_id=producto_id, cantidad=n, vence=vence) for producto_id, n in pedidas.items()],
+                    update_conflicts=True, unique_fields=['usuario', 'producto'], update_fields=['cantidad', 'vence'],
+                )
+        return {}
+    
+    @classmethod
+    def liberar(cls, usuario, producto_ids):
+        return cls.objects.filter(usuario=usuario, producto_id__in=producto_ids).delete()[0]
+    
+    @classmethod
+    def liberar_vencidas(cls, ahora=None, lote=1000):
+        """Borra las reservas vencidas en lotes de ``lote`` filas; devuelve cuántas borró"""
+        ahora = ahora or timezone.now()
+        total = 0
+        while True:
+            ids = list(cls.objects.vencidas(ahora).values_list('pk', flat=True)[:lote])
+            if ids:
+                # Se vuelve a filtrar por vence: una reserva renovada mientras tanto se queda
+                total += cls.objects.vencidas(ahora).filter(pk__in=ids).delete()[0]
+            if len(ids) < lote:
+                return total
+    
+    def __str__(self):
+        return f"{self.cantidad} x {self.producto_id} para {self.usuario_id} hasta {self.vence}"
+    
+    class Meta:
+        verbose_name = 'Reserva'
+        verbose_name_plural = 'Reservas'
+        constraints = [
+            models.UniqueConstraint(fields=['usuario', 'producto'], name='reserva_unica'),
+        ]
+        indexes = [
+            # Cubre la suma de reservas vigentes de un producto sin leer la tabla
+            models.Index(fields=['producto', 'vence', 'usuario', 'cantidad'], name='reserva_producto_idx'),
+            # Barrido de las vencidas
+            models.Index(fields=['vence'], name='reserva_vence_idx'),
+        ]
+
+# Precio de una línea del carrito: el efectivo si ya se calculó, si no el base
+PRECIO_LINEA = Coalesce(F('producto__precio_efectivo__precio'), F('producto__precio'))
+
+def _importe(expresion):
+    campo = models.DecimalField(max_digits=12, decimal_places=2)
+    return Coalesce(Sum(expresion, output_field=campo), Value(Decimal('0')), output_field=campo)
+
+class ResumenCarrito(models.Model):
+    """Artículos y total del carrito de cada usuario, mantenidos por diferencia
+    cada vez que se guarda una línea de ``Carrito``; los borrados los sigue
+    la señal resumen_lineas_borradas."""
+    usuario = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='resumen_carrito')
+    articulos = models.PositiveIntegerField(default=0)
+    total = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    
+    @classmethod
+    def obtener(cls, usuario):
+        resumen = cls.objects.filter(usuario=usuario).first()
+        return resumen if resumen is not None else cls.reconstruir(usuario.pk)
+    
+    @classmethod
+    def aplicar_cambio(cls, usuario_id, articulos, total):
+        actualizados = cls.objects.filter(usuario_id=usuario_id).update(
+            articulos=F('articulos') + articulos,
+            total=F('total') + total,
+        )
+        if not actualizados:
+            cls.reconstruir(usuario_id)
+    
+    @classmethod
+    def reconstruir(cls, usuario_id):
+        """Recalcula el resumen de un usuario con un agregado en SQL"""
+        datos = Carrito.objects.filter(usuario_id=usuario_id).aggregate(
+            articulos=Coalesce(Sum('cantidad'), 0),
+            total=_importe(F('cantidad') * PRECIO_LINEA),
+        )
+        resumen, _ = cls.objects.update_or_create(usuario_id=usuario_id, defaults=datos)
+        return resumen
+    
+    @classmethod
+    def reconstruir_para_productos(cls, producto_ids):
+        """Recalcula en un solo UPDATE los resúmenes que incluyen los productos"""
+        lineas = Carrito.objects.filter(usuario_id=OuterRef('usuario_id')).order_by().values('usuario_id')
+        cls.objects.filter(usuario__carrito__producto_id__in=producto_ids).update(
+            articulos=Coalesce(Subquery(lineas.annotate(s=Sum('cantidad')).values('s')), 0),
+            total=Coalesce(
+                Subquery(lineas.annotate(s=_importe(F('cantidad') * PRECIO_LINEA)).values('s')),
+                Value(Decimal('0')),
+            ),
+        )
+    
+    def __str__(self):
+        return f"Carrito de {self.usuario.username}: {self.articulos} artículos - ${self.total}"
+    
+    class Meta:
+        verbose_name = 'Resumen de Carrito'
+        verbose_name_plural = 'Resúmenes de Carrito'
+
 class Pedido(models.Model):
     ESTADO_CHOICES = [
         ('pendiente', 'Pendiente'),
@@ -72,6 +332,32 @@ class Pedido(models.Model):
     fecha_actualizacion = models.DateTimeField(auto_now=True)
     total = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     notas = models.TextField(blank=True, null=True)
+    # Ya sumado a VentaDiaria; evita contarlo dos veces si la tarea se reintenta
+    ventas_acumuladas = models.BooleanField(default=False, editable=False)
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instancia = super().from_db(db, field_names, values)
+        # Estado tal como está en la base, para registrar solo los cambios
+        instancia._estado_guardado = instancia.__dict__.get('estado')
+        return instancia
+    
+    def save(self, *args, **kwargs):
+        # ventas_acumuladas solo lo cambia VentaDiaria.acumular con un UPDATE:
+        # guardar una instancia leída antes no debe volver a ponerlo en False
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                campo.name for campo in self._meta.concrete_fields
+                if not campo.primary_key and campo.name != 'ventas_acumuladas'
+            ]
+        anterior = '' if self._state.adding else getattr(self, '_estado_guardado', None)
+        campos = kwargs.get('update_fields')
+        super().save(*args, **kwargs)
+        if anterior != self.estado and (campos is None or 'estado' in campos):
+            EventoPedido.objects.create(
+                pedido=self, usuario_id=self.usuario_id, estado=self.estado, anterior=anterior or '',
+            )
+        self._estado_guardado = self.estado
     
     def __str__(self):
         return f"Pedido #{self.id} - {self.usuario.username} - ${self.total}"
@@ -80,6 +366,11 @@ class Pedido(models.Model):
         verbose_name = 'Pedido'
         verbose_name_plural = 'Pedidos'
         ordering = ['-fecha_pedido']
+        indexes = [
+            models.Index(fields=['usuario', '-fecha_pedido'], name='pedido_usuario_fecha_idx'),
+            # Listado y date_hierarchy del admin, reportes por periodo
+            models.Index(fields=['-fecha_pedido'], name='pedido_fecha_idx'),
+        ]
 
 class ItemPedido(models.Model):
     pedido = models.ForeignKey(Pedido, on_delete=models.CASCADE, related_name='items')
@@ -97,6 +388,47 @@ class ItemPedido(models.Model):
         verbose_name = 'Item de Pedido'
         verbose_name_plural = 'Items de Pedido'
 
+class EventoPedido(models.Model):
+    """Registro de los cambios de estado de cada pedido, en orden de id.
+
+    Lo escribe Pedido.save(); la vista eventos_pedidos lo lee por usuario a
+    partir del último id enviado para avisar al cliente sin recargar.
+    """
+    pedido = models.ForeignKey(Pedido, on_delete=models.CASCADE, related_name='eventos')
+    # Repetido del pedido: el stream de un cliente se lee solo con el índice
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE)
+    estado = models.CharField(max_length=20, choices=Pedido.ESTADO_CHOICES)
+    anterior = models.CharField(max_length=20, blank=True)
+    fecha = models.DateTimeField(auto_now_add=True)
+    
+    def como_json(self):
+        return {
+            'pedido': self.pedido_id,
+            'estado': self.estado,
+            'estado_display': self.get_estado_display(),
+            'anterior': self.anterior,
+            'fecha': self.fecha.isoformat(),
+        }
+    
+    def __str__(self):
+        return f"Pedido #{self.pedido_id}: {self.anterior or '-'} → {self.estado}"
+    
+    class Meta:
+        verbose_name = 'Evento de Pedido'
+        verbose_name_plural = 'Eventos de Pedido'
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['usuario', 'id'], name='evento_usuario_idx'),
+        ]
+
+class OfertaQuerySet(models.QuerySet):
+    def vigentes(self):
+        # vigente lo mantiene Oferta.barrer(); aquí no se comparan fechas
+        return self.filter(vigente=True)
+
+    def activas(self):
+        return self.vigentes().prefetch_related('productos')
+
 class Oferta(models.Model):
     TIPO_DESCUENTO_CHOICES = [
         ('porcentaje', 'Porcentaje'),
@@ -112,15 +444,296 @@ class Oferta(models.Model):
     productos = models.ManyToManyField(Producto, blank=True, related_name='ofertas')
     imagen = models.ImageField(upload_to='ofertas/', null=True, blank=True)
     activa = models.BooleanField(default=True)
+    # activa y dentro de fechas; lo actualizan save() y el barrido periódico
+    vigente = models.BooleanField(default=False, editable=False)
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
+    
+    objects = OfertaQuerySet.as_manager()
     
     def __str__(self):
         return self.nombre
     
-    def esta_activa(self):
-        ahora = timezone.now()
+    def save(self, *args, **kwargs):
+        self.vigente = self.esta_activa()
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'vigente'}
+        super().save(*args, **kwargs)
+    
+    def esta_activa(self, ahora=None):
+        ahora = ahora or timezone.now()
         return self.activa and self.fecha_inicio <= ahora <= self.fecha_fin
     
+    @classmethod
+    def barrer(cls, ahora=None):
+        """Abre y cierra las ofertas cuyo periodo empezó o terminó.
+
+        Se hace en lote con dos UPDATE; después se recalculan los precios de
+        los productos afectados y se invalida el catálogo. Devuelve las listas
+        de ids abiertas y cerradas.
+        """
+        ahora = ahora or timezone.now()
+        por_abrir = cls.objects.filter(vigente=False, activa=True, fecha_inicio__lte=ahora, fecha_fin__gte=ahora)
+        por_cerrar = cls.objects.filter(vigente=True).filter(
+            Q(activa=False) | Q(fecha_inicio__gt=ahora) | Q(fecha_fin__lt=ahora)
+        )
+        with transaction.atomic():
+            abiertas = list(por_abrir.values_list('pk', flat=True))
+            cerradas = list(por_cerrar.values_list('pk', flat=True))
+            if abiertas:
+                por_abrir.filter(pk__in=abiertas).update(vigente=True, fecha_actualizacion=ahora)
+            if cerradas:
+                por_cerrar.filter(pk__in=cerradas).update(vigente=False, fecha_actualizacion=ahora)
+            if abiertas or cerradas:
+                producto_ids = cls.productos.through.objects.filter(
+                    oferta_id__in=abiertas + cerradas
+                ).values_list('producto_id', flat=True).distinct()
+                PrecioEfectivo.recalcular(list(producto_ids))
+                transaction.on_commit(invalidar_catalogo)
+        return abiertas, cerradas
+    
+    @classmethod
+    def proximo_cambio(cls, ahora=None):
+        """Fecha del próximo inicio o fin de oferta, o None si no hay ninguno pendiente"""
+        ahora = ahora or timezone.now()
+        inicio = cls.objects.filter(
+            vigente=False, activa=True, fecha_inicio__gt=ahora, fecha_fin__gt=ahora
+        ).aggregate(m=Min('fecha_inicio'))['m']
+        fin = cls.objects.filter(vigente=True).aggregate(m=Min('fecha_fin'))['m']
+        fechas = [fecha for fecha in (inicio, fin) if fecha is not None]
+        return min(fechas) if fechas else None
+    
+    def aplicar_descuento(self, precio):
+        if self.tipo_descuento == 'porcentaje':
+            descuento = precio * self.valor_descuento / 100
+        else:
+            descuento = self.valor_descuento
+        return max(precio - descuento, Decimal('0')).quantize(Decimal('0.01'))
+    
     class Meta:
         verbose_name = 'Oferta'
         verbose_name_plural = 'Ofertas'
-        ordering = ['-fecha_inicio']
\ No newline at end of file
+        ordering = ['-fecha_inicio']
+        indexes = [
+            models.Index(fields=['-fecha_inicio'], condition=Q(vigente=True), name='oferta_vigente_fecha_idx'),
+            # Búsquedas del barrido: ofertas por abrir y ofertas abiertas por cerrar
+            models.Index(fields=['fecha_inicio'], condition=Q(activa=True, vigente=False), name='oferta_por_abrir_idx'),
+            models.Index(fields=['fecha_fin'], condition=Q(vigente=True), name='oferta_por_cerrar_idx'),
+        ]
+
+class PrecioEfectivo(models.Model):
+    """Precio final de cada producto con la mejor oferta vigente ya aplicada.
+
+    Se materializa aquí para que catálogo, carrito y checkout lean una sola
+    columna en lugar de evaluar cada oferta en cada petición. Se recalcula al
+    cambiar el precio de un producto o una oferta y al abrir o cerrar ofertas.
+    """
+    producto = models.OneToOneField(Producto, on_delete=models.CASCADE, primary_key=True, related_name='precio_efectivo')
+    precio = models.DecimalField(max_digits=10, decimal_places=2, db_index=True)
+    oferta = models.ForeignKey(Oferta, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
+    
+    @classmethod
+    def recalcular(cls, producto_ids=None, lote=1000):
+        """Recalcula los productos indicados (o todos) y devuelve los ids cuyo precio cambió"""
+        productos = Producto.objects.order_by('pk').values_list('pk', 'precio')
+        if producto_ids is not None:
+            productos = productos.filter(pk__in=producto_ids)
+        
+        cambiados = []
+        ultimo = 0
+        while True:
+            # Por bloques de pk para no cargar el catálogo entero en memoria
+            bloque = list(productos.filter(pk__gt=ultimo)[:lote])
+            if not bloque:
+                break
+            ultimo = bloque[-1][0]
+            ids = [pk for pk, _ in bloque]
+            
+            anteriores = dict(cls.objects.filter(producto_id__in=ids).values_list('producto_id', 'precio'))
+            ofertas = defaultdict(list)
+            relaciones = Oferta.productos.through.objects.filter(
+                producto_id__in=ids, oferta__in=Oferta.objects.vigentes()
+            ).select_related('oferta')
+            for relacion in relaciones:
+                ofertas[relacion.producto_id].append(relacion.oferta)
+            
+            nuevos = []
+            cambiados_bloque = []
+            for pk, precio in bloque:
+                mejor, mejor_oferta = precio, None
+                for oferta in ofertas[pk]:
+                    con_descuento = oferta.aplicar_descuento(precio)
+                    if con_descuento < mejor:
+                        mejor, mejor_oferta = con_descuento, oferta
+                nuevos.append(cls(producto_id=pk, precio=mejor, oferta=mejor_oferta))
+                if anteriores.get(pk) != mejor:
+                    cambiados_bloque.append(pk)
+            
+            cls.objects.bulk_create(
+                nuevos, update_conflicts=True, unique_fields=['producto'],
+                update_fields=['precio', 'oferta', 'fecha_actualizacion'],
+            )
+            if cambiados_bloque:
+                # La API usa fecha_actualizacion del producto para su ETag
+                Producto.objects.filter(pk__in=cambiados_bloque).update(fecha_actualizacion=Now())
+                ResumenCarrito.reconstruir_para_productos(cambiados_bloque)
+                cambiados += cambiados_bloque
+        
+        if cambiados:
+            transaction.on_commit(invalidar_catalogo)
+        return cambiados
+    
+    def __str__(self):
+        return f"{self.producto_id}: ${self.precio}"
+    
+    class Meta:
+        verbose_name = 'Precio Efectivo'
+        verbose_name_plural = 'Precios Efectivos'
+
+
+# Agrupaciones del reporte de ventas: parámetro -> campo de VentaDiaria
+AGRUPACIONES_VENTAS = {
+    'dia': 'fecha',
+    'categoria': 'categoria__nombre',
+    'producto': 'producto__nombre',
+    'metodo_pago': 'metodo_pago',
+}
+
+def _dia_pedido():
+    # Día en la zona horaria del sitio, no en UTC
+    return TruncDate('pedido__fecha_pedido', tzinfo=timezone.get_current_timezone())
+
+class VentaDiariaQuerySet(models.QuerySet):
+    def entre(self, desde=None, hasta=None):
+        ventas = self
+        if desde:
+            ventas = ventas.filter(fecha__gte=desde)
+        if hasta:
+            ventas = ventas.filter(fecha__lte=hasta)
+        return ventas
+
+    def resumen(self, por):
+        """Unidades e ingresos agrupados por una clave de AGRUPACIONES_VENTAS"""
+        campo = AGRUPACIONES_VENTAS[por]
+        orden = 'clave' if por == 'dia' else '-ingresos'
+        return self.values(clave=F(campo)).annotate(
+            unidades=Sum('unidades'), ingresos=Sum('ingresos'),
+        ).order_by(orden)
+
+class VentaDiaria(models.Model):
+    """Ventas por día, producto y método de pago, ya agregadas.
+
+    El reporte suma estas filas (una por combinación vendida en el día) en
+    lugar de recorrer todos los ItemPedido. Cada pedido se suma una sola vez
+    al procesarse (``acumular``); si después se edita o cancela, se
+    reconstruye el día completo (``reconstruir``). Los pedidos cancelados no
+    cuentan.
+    """
+    fecha = models.DateField()
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='+')
+    # Copia de producto.categoria: el reporte por categoría no necesita JOIN
+    categoria = models.ForeignKey(Categoria, on_delete=models.CASCADE, related_name='+')
+    metodo_pago = models.CharField(max_length=20, choices=Pedido.METODO_PAGO_CHOICES)
+    unidades = models.PositiveIntegerField(default=0)
+    ingresos = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    
+    objects = VentaDiariaQuerySet.as_manager()
+    
+    @classmethod
+    def acumular(cls, pedido_id):
+        """Suma un pedido a las ventas de su día; no hace nada si ya estaba sumado"""
+        with transaction.atomic():
+            # UPDATE condicional: de dos intentos concurrentes solo uno lo suma
+            if not Pedido.objects.filter(pk=pedido_id, ventas_acumuladas=False).update(ventas_acumuladas=True):
+                return False
+            pedido = Pedido.objects.get(pk=pedido_id)
+            if pedido.estado == 'cancelado':
+                return False
+            fecha = timezone.localdate(pedido.fecha_pedido)
+            lineas = ItemPedido.objects.filter(pedido_id=pedido_id).values(
+                'producto_id', 'producto__categoria_id',
+            ).annotate(unidades=Sum('cantidad'), ingresos=_importe(F('cantidad') * F('precio')))
+            for linea in lineas:
+                clave = {'fecha': fecha, 'producto_id': linea['producto_id'], 'metodo_pago': pedido.metodo_pago}
+                sumar = {'unidades': F('unidades') + linea['unidades'], 'ingresos': F('ingresos') + linea['ingresos']}
+                if cls.objects.filter(**clave).update(**sumar):
+                    continue
+                try:
+                    with transaction.atomic():
+                        cls.objects.create(
+                            **clave, categoria_id=linea['producto__categoria_id'],
+                            unidades=linea['unidades'], ingresos=linea['ingresos'],
+                        )
+                except IntegrityError:
+                    # Otro pedido del mismo día creó la fila entre tanto
+                    cls.objects.filter(**clave).update(**sumar)
+        return True
+    
+    @classmethod
+    def reconstruir(cls, desde=None, hasta=None):
+        """Recalcula desde ItemPedido los días indicados (o todos); devuelve cuántas filas quedan"""
+        items = ItemPedido.objects.filter(pedido__ventas_acumuladas=True).exclude(pedido__estado='cancelado')
+        if desde:
+            items = items.filter(pedido__fecha_pedido__date__gte=desde)
+        if hasta:
+            items = items.filter(pedido__fecha_pedido__date__lte=hasta)
+        filas = items.annotate(dia=_dia_pedido()).values(
+            'dia', 'producto_id', 'producto__categoria_id', 'pedido__metodo_pago',
+        ).annotate(unidades=Sum('cantidad'), ingresos=_importe(F('cantidad') * F('precio'))).order_by()
+        with transaction.atomic():
+            cls.objects.entre(desde, hasta).delete()
+            creadas = cls.objects.bulk_create((
+                cls(
+                    fecha=fila['dia'], producto_id=fila['producto_id'],
+                    categoria_id=fila['producto__categoria_id'], metodo_pago=fila['pedido__metodo_pago'],
+                    unidades=fila['unidades'], ingresos=fila['ingresos'],
+                )
+                for fila in filas.iterator(chunk_size=2000)
+            ), batch_size=1000)
+        return len(creadas)
+    
+    def __str__(self):
+        return f"{self.fecha} {self.producto_id} ({self.metodo_pago}): ${self.ingresos}"
+    
+    class Meta:
+        verbose_name = 'Venta Diaria'
+        verbose_name_plural = 'Ventas Diarias'
+        ordering = ['-fecha']
+        # También sirve de índice para los filtros por rango de fechas
+        constraints = [
+            models.UniqueConstraint(fields=['fecha', 'producto', 'metodo_pago'], name='venta_diaria_unica'),
+        ]
+
+
+class Tarea(models.Model):
+    """Trabajo diferido que ejecuta el comando procesar_tareas fuera de la petición"""
+    ESTADO_CHOICES = [
+        ('pendiente', 'Pendiente'),
+        ('en_proceso', 'En proceso'),
+        ('completada', 'Completada'),
+        ('fallida', 'Fallida'),
+    ]
+    
+    nombre = models.CharField(max_length=100)
+    argumentos = models.JSONField(default=list, blank=True)
+    # Dos encolados con la misma clave son la misma tarea
+    clave = models.CharField(max_length=200, unique=True, null=True, blank=True)
+    estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default='pendiente')
+    intentos = models.PositiveIntegerField(default=0)
+    max_intentos = models.PositiveIntegerField(default=3)
+    ejecutar_despues = models.DateTimeField(default=timezone.now)
+    error = models.TextField(blank=True)
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.nombre} #{self.id} ({self.estado})"
+    
+    class Meta:
+        verbose_name = 'Tarea'
+        verbose_name_plural = 'Tareas'
+        ordering = ['ejecutar_despues']
+        indexes = [
+            models.Index(fields=['ejecutar_despues'], condition=Q(estado='pendiente'), name='tarea_pendiente_idx'),
+            models.Index(fields=['fecha_actualizacion'], condition=Q(estado='en_proceso'), name='tarea_en_proceso_idx'),
+        ]
\ No newline at end of file
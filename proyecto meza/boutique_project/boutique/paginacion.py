@@ -0,0 +1,193 @@
+import base64
+import binascii
+import json
+from functools import cached_property
+
+from django.core.paginator import Paginator
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DatabaseError, connections
+from django.db.models import IntegerField, Max, Min, Q
+
+POR_PAGINA = 24
+POR_PAGINA_MAXIMO = 100
+
+
+def codificar_cursor(valores):
+    datos = json.dumps(valores, cls=DjangoJSONEncoder).encode()
+    return base64.urlsafe_b64encode(datos).decode().rstrip('=')
+
+
+def decodificar_cursor(cursor, tipos):
+    """Devuelve la lista de valores del cursor o None si no es válido.
+
+    ``tipos`` es el tipo de Python esperado para cada campo de la clave: un
+    cursor alterado a mano no debe llegar al filtro de la consulta.
+    """
+    if not cursor:
+        return None
+    try:
+        relleno = '=' * (-len(cursor) % 4)
+        valores = json.loads(base64.urlsafe_b64decode(cursor + relleno))
+    except (binascii.Error, ValueError, UnicodeDecodeError):
+        return None
+    if not isinstance(valores, list) or len(valores) != len(tipos):
+        return None
+    # type() y no isinstance(): True no es un id válido
+    if any(type(valor) is not tipo for valor, tipo in zip(valores, tipos)):
+        return None
+    return valores
+
+
+def _tipo_de(modelo, campo):
+    # Los valores que no son enteros (texto, fechas, decimales) viajan como texto en el JSON
+    campo = modelo._meta.pk if campo == 'pk' else modelo._meta.get_field(campo)
+    return int if isinstance(campo, IntegerField) else str
+
+
+def leer_por_pagina(valor, defecto=POR_PAGINA):
+    try:
+        return min(max(int(valor), 1), POR_PAGINA_MAXIMO)
+    except (TypeError, ValueError):
+        return defecto
+
+
+def _despues_de(campos, valores, operador):
+    # (a, b) > (x, y)  <=>  a > x OR (a = x AND b > y), para cualquier número de campos
+    condicion = Q()
+    iguales = {}
+    for campo, valor in zip(campos, valores):
+        condicion |= Q(**iguales, **{f'{campo}__{operador}': valor})
+        iguales[campo] = valor
+    return condicion
+
+
+class PaginaPorClave:
+    """Página de resultados paginada por clave (seek) en vez de OFFSET.
+
+    Se filtra por la última fila vista, así que el costo de la página 1000 es
+    el mismo que el de la primera. La consulta se ejecuta al acceder a
+    ``elementos`` por primera vez, para que una plantilla cacheada no la dispare.
+    """
+
+    def __init__(self, queryset, campos=('nombre', 'id'), despues=None, antes=None, por_pagina=POR_PAGINA):
+        self.queryset = queryset
+        self.campos = tuple(campos)
+        self.por_pagina = por_pagina
+        tipos = [_tipo_de(queryset.model, campo) for campo in self.campos]
+        self.despues = decodificar_cursor(despues, tipos)
+        self.antes = None if self.despues else decodificar_cursor(antes, tipos)
+        # Llegó un cursor que no se pudo leer: la página HTML vuelve al inicio, la API responde 400
+        self.cursor_invalido = bool(
+            (despues and self.despues is None) or (antes and not self.despues and self.antes is None)
+        )
+
+    def _consulta(self):
+        if self.antes:
+            return (
+                self.queryset
+                .filter(_despues_de(self.campos, self.antes, 'lt'))
+                .order_by(*[f'-{campo}' for campo in self.campos])[:self.por_pagina + 1]
+            )
+        queryset = self.queryset
+        if self.despues:
+            queryset = queryset.filter(_despues_de(self.campos, self.despues, 'gt'))
+        return queryset.order_by(*self.campos)[:self.por_pagina + 1]
+
+    def _ordenar(self, filas):
+        hay_mas = len(filas) > self.por_pagina
+        if self.antes:
+            return filas[:self.por_pagina][::-1], hay_mas, True
+        return filas[:self.por_pagina], self.despues is not None, hay_mas
+
+    @cached_property
+    def _resultados(self):
+        return self._ordenar(list(self._consulta()))
+
+    async def acargar(self):
+        """Ejecuta la consulta con el ORM async; después la página se usa igual"""
+        if '_resultados' not in self.__dict__:
+            self._resultados = self._ordenar([fila async for fila in self._consulta()])
+        return self
+
+    @property
+    def elementos(self):
+        return self._resultados[0]
+
+    @property
+    def tiene_anterior(self):
+        return bool(self.elementos) and self._resultados[1]
+
+    @property
+    def tiene_siguiente(self):
+        return bool(self.elementos) and self._resultados[2]
+
+    def _cursor(self, fila):
+        return codificar_cursor([getattr(fila, campo) for campo in self.campos])
+
+    @property
+    def cursor_anterior(self):
+        return self._cursor(self.elementos[0]) if self.tiene_anterior else None
+
+    @property
+    def cursor_siguiente(self):
+        return self._cursor(self.elementos[-1]) if self.tiene_siguiente else None
+
+    def __iter__(self):
+        return iter(self.elementos)
+
+    def __len__(self):
+        return len(self.elementos)
+
+
+def estimar_filas(modelo, using='default'):
+    """Número aproximado de filas de la tabla del modelo, sin recorrerla.
+
+    SQLite: las estadísticas de ANALYZE (sqlite_stat1) si existen; si no,
+    el rango de ids, que se lee del índice de la clave primaria y solo
+    sobrestima cuando hubo borrados. PostgreSQL: pg_class.reltuples.
+    """
+    conexion = connections[using]
+    tabla = modelo._meta.db_table
+    try:
+        with conexion.cursor() as cursor:
+            if conexion.vendor == 'postgresql':
+                cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [tabla])
+                fila = cursor.fetchone()
+                if fila and fila[0] >= 0:
+                    return fila[0]
+            elif conexion.vendor == 'sqlite':
+                # Una fila por índice; los parciales solo cuentan sus filas, así
+                # que el total de la tabla es el mayor de los primeros enteros
+                cursor.execute('SELECT stat FROM sqlite_stat1 WHERE tbl = %s', [tabla])
+                filas = cursor.fetchall()
+                if filas:
+                    return max(int(stat.split()[0]) for (stat,) in filas)
+    except DatabaseError:
+        # Sin ANALYZE previo la tabla sqlite_stat1 no existe
+        pass
+    rango = modelo._default_manager.using(using).aggregate(primero=Min('pk'), ultimo=Max('pk'))
+    if rango['primero'] is None:
+        return 0
+    return rango['ultimo'] - rango['primero'] + 1
+
+
+class PaginadorEstimado(Paginator):
+    """Paginator para el admin de tablas grandes.
+
+    Sin filtros, el total de la tabla se estima con ``estimar_filas`` en vez
+    de un COUNT(*) que la recorre entera; solo por encima de ``umbral`` filas,
+    para que las tablas pequeñas muestren el número exacto. Con filtros o
+    búsqueda se cuenta de verdad: los índices acotan esa consulta.
+    """
+
+    umbral = 10_000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimado = estimar_filas(queryset.model, queryset.db)
+            if estimado > self.umbral:
+                return estimado
+        return super().count
+
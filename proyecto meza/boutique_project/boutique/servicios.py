@@ -0,0 +1,166 @@
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Now
+
+from .models import Producto, Carrito, ResumenCarrito, Pedido, ItemPedido, Reserva
+from .tareas import pedido_realizado
+
+
+class CarritoVacio(Exception):
+    pass
+
+
+class StockInsuficiente(Exception):
+    """Una o más líneas del carrito no tienen stock suficiente"""
+
+    def __init__(self, lineas):
+        self.lineas = lineas
+        nombres = ', '.join(item.producto.nombre for item in lineas)
+        super().__init__(f'Sin stock suficiente para: {nombres}')
+
+
+class OperacionInvalida(ValueError):
+    """Una operación del lote no se puede aplicar; en ese caso no se aplica ninguna"""
+
+    def __init__(self, mensaje, indice=None):
+        self.indice = indice
+        super().__init__(mensaje if indice is None else f'Operación {indice}: {mensaje}')
+
+
+OPERACIONES_CARRITO = ('agregar', 'fijar', 'quitar')
+MAX_OPERACIONES = 100
+
+
+def _entero(valor):
+    return isinstance(valor, int) and not isinstance(valor, bool)
+
+
+def _leer_operaciones(operaciones):
+    if not isinstance(operaciones, list) or not 1 <= len(operaciones) <= MAX_OPERACIONES:
+        raise OperacionInvalida(f'Se esperaba una lista de 1 a {MAX_OPERACIONES} operaciones')
+    pasos = []
+    for indice, operacion in enumerate(operaciones):
+        if not isinstance(operacion, dict) or operacion.get('op') not in OPERACIONES_CARRITO:
+            raise OperacionInvalida(f'"op" debe ser {", ".join(OPERACIONES_CARRITO)}', indice)
+        if not _entero(operacion.get('producto')):
+            raise OperacionInvalida('"producto" debe ser un id', indice)
+        cantidad = None
+        if operacion['op'] == 'agregar':
+            cantidad = operacion.get('cantidad', 1)
+            if not _entero(cantidad) or cantidad < 1:
+                raise OperacionInvalida('"cantidad" debe ser un entero mayor que cero', indice)
+        elif operacion['op'] == 'fijar':
+            cantidad = operacion.get('cantidad')
+            if not _entero(cantidad) or cantidad < 0:
+                raise OperacionInvalida('"cantidad" debe ser un entero no negativo', indice)
+        pasos.append((indice, operacion['op'], operacion['producto'], cantidad))
+    return pasos
+
+
+def modificar_carrito(usuario, operaciones):
+    """Aplica un lote de operaciones al carrito en una sola transacción.
+
+    Cada operación es ``{'op': 'agregar' | 'fijar' | 'quitar', 'producto': id,
+    'cantidad': n}`` (agregar suma, por defecto 1; fijar en 0 quita la línea).
+    Se aplican en orden sobre las cantidades actuales y solo se escribe el
+    resultado final de cada producto: un DELETE para las líneas que quedan en
+    cero, un upsert para el resto y un agregado para el resumen. Las reservas
+    de stock se ajustan a las cantidades finales. Si una operación no es
+    válida o deja un producto por encima de su stock disponible se lanza
+    ``OperacionInvalida`` y el carrito queda como estaba. Devuelve el
+    ResumenCarrito actualizado.
+    """
+    pasos = _leer_operaciones(operaciones)
+    producto_ids = {producto_id for _, _, producto_id, _ in pasos}
+
+    with transaction.atomic():
+        productos = Producto.objects.filter(disponible=True).only('nombre').in_bulk(producto_ids)
+        actuales = dict(
+            Carrito.objects.filter(usuario=usuario, producto_id__in=producto_ids).values_list('producto_id', 'cantidad')
+        )
+        cantidades = dict(actuales)
+        ultima = {}
+        for indice, op, producto_id, cantidad in pasos:
+            if op != 'quitar' and producto_id not in productos:
+                raise OperacionInvalida('el producto no existe o no está disponible', indice)
+            if op == 'agregar':
+                cantidades[producto_id] = cantidades.get(producto_id, 0) + cantidad
+            else:
+                cantidades[producto_id] = cantidad or 0
+            ultima[producto_id] = indice
+
+        faltan = Reserva.reservar(usuario, cantidades)
+        if faltan:
+            producto_id, disponibles = next(iter(faltan.items()))
+            raise OperacionInvalida(
+                f'solo hay {disponibles} unidades disponibles de "{productos[producto_id].nombre}"',
+                ultima[producto_id],
+            )
+
+        quitar = [producto_id for producto_id, cantidad in cantidades.items() if not cantidad and producto_id in actuales]
+        if quitar:
+            Carrito.objects.filter(usuario=usuario, producto_id__in=quitar).delete()
+        guardar = [
+            Carrito(usuario=usuario, producto_id=producto_id, cantidad=cantidad)
+            for producto_id, cantidad in cantidades.items()
+            if cantidad and cantidad != actuales.get(producto_id)
+        ]
+        if guardar:
+            Carrito.objects.bulk_create(
+                guardar, update_conflicts=True, unique_fields=['usuario', 'producto'], update_fields=['cantidad'],
+            )
+        return ResumenCarrito.reconstruir(usuario.pk)
+
+
+def realizar_checkout(usuario, metodo_pago='efectivo'):
+    """Convierte el carrito del usuario en un pedido.
+
+    El stock se descuenta con un UPDATE condicional por producto
+    (``cantidad >= n`` más lo que tienen reservado los demás), así que dos
+    compras simultáneas nunca pueden dejarlo en negativo ni quitarle a otro
+    carrito lo que tiene reservado. Si alguna línea no alcanza se revierte
+    todo y se lanza ``StockInsuficiente`` con las líneas que fallaron; si
+    sale bien se liberan las reservas del usuario sobre lo comprado.
+    """
+    with transaction.atomic():
+        # Orden fijo por producto para que las transacciones concurrentes
+        # bloqueen las filas siempre en el mismo orden
+        items_carrito = list(Carrito.objects.del_usuario(usuario).order_by('producto_id'))
+        if not items_carrito:
+            raise CarritoVacio()
+
+        sin_stock = []
+        for item in items_carrito:
+            actualizados = Producto.objects.filter(
+                pk=item.producto_id, cantidad__gte=Reserva.retenido(usuario) + item.cantidad
+            ).update(cantidad=F('cantidad') - item.cantidad, fecha_actualizacion=Now())
+            if not actualizados:
+                sin_stock.append(item)
+
+        if sin_stock:
+            raise StockInsuficiente(sin_stock)
+
+        total = sum(item.subtotal() for item in items_carrito)
+        pedido = Pedido.objects.create(
+            usuario=usuario,
+            total=total,
+            estado='pendiente',
+            metodo_pago=metodo_pago,
+        )
+        ItemPedido.objects.bulk_create([
+            ItemPedido(
+                pedido=pedido,
+                producto=item.producto,
+                cantidad=item.cantidad,
+                precio=item.producto.precio_final,
+            )
+            for item in items_carrito
+        ])
+
+        # Solo se borran las líneas compradas, no las agregadas mientras tanto;
+        # el resumen lo recalcula la señal post_delete de Carrito
+        Carrito.objects.filter(pk__in=[item.pk for item in items_carrito]).delete()
+        Reserva.liberar(usuario, [item.producto_id for item in items_carrito])
+        pedido_realizado.encolar(pedido.pk, clave=f'pedido_realizado:{pedido.pk}')
+
+    return pedido
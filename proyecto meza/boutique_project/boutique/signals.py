@@ -0,0 +1,126 @@
+from django.contrib.auth.models import User
+from django.db import connections, transaction
+from django.db.models import QuerySet
+from django.db.models.signals import post_save, pre_delete, post_delete, m2m_changed, post_migrate
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .busqueda import TABLA_PRODUCTO, instalar_fts
+from .cache import invalidar_catalogo
+from .models import Producto, Categoria, Oferta, Pedido, ItemPedido, Carrito, ResumenCarrito
+from .tareas import generar_derivados_imagen, recalcular_precios, recalcular_precios_oferta, reconstruir_ventas
+
+
+# Se invalida al confirmar la transacción: si se hiciera antes, otra petición
+# podría volver a cachear los datos viejos mientras la escritura sigue abierta
+@receiver(post_save, sender=Producto)
+@receiver(post_delete, sender=Producto)
+@receiver(post_save, sender=Categoria)
+@receiver(post_delete, sender=Categoria)
+@receiver(post_save, sender=Oferta)
+@receiver(post_delete, sender=Oferta)
+def catalogo_modificado(sender, **kwargs):
+    transaction.on_commit(invalidar_catalogo)
+
+
+@receiver(m2m_changed, sender=Oferta.productos.through)
+def productos_de_oferta_modificados(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    # La lista de productos es parte de la oferta: se actualiza su fecha para la API
+    if reverse:
+        ofertas = Oferta.objects.filter(pk__in=pk_set) if pk_set else Oferta.objects.none()
+    else:
+        ofertas = Oferta.objects.filter(pk=instance.pk)
+    ofertas.update(fecha_actualizacion=timezone.now())
+    transaction.on_commit(invalidar_catalogo)
+
+
+# Los precios efectivos dependen de las ofertas; se recalculan en el worker
+@receiver(post_save, sender=Oferta)
+def precios_oferta_guardada(sender, instance, **kwargs):
+    recalcular_precios_oferta.encolar(instance.pk)
+
+
+@receiver(pre_delete, sender=Oferta)
+def precios_oferta_borrada(sender, instance, **kwargs):
+    # Después del borrado ya no se sabe a qué productos afectaba
+    producto_ids = list(instance.productos.values_list('pk', flat=True))
+    if producto_ids:
+        recalcular_precios.encolar(producto_ids)
+
+
+@receiver(m2m_changed, sender=Oferta.productos.through)
+def precios_productos_de_oferta(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            recalcular_precios.encolar([instance.pk])
+    elif action == 'pre_clear':
+        producto_ids = list(instance.productos.values_list('pk', flat=True))
+        if producto_ids:
+            recalcular_precios.encolar(producto_ids)
+    elif action in ('post_add', 'post_remove') and pk_set:
+        recalcular_precios.encolar(sorted(pk_set))
+
+
+# Cubre también los borrados en cascada (un producto eliminado) y los de
+# querysets (acción del admin, checkout). Tener un receptor hace además que
+# Django no use el borrado rápido, que no envía señales.
+@receiver(post_delete, sender=Carrito)
+def resumen_lineas_borradas(sender, instance, origin=None, **kwargs):
+    if origin is instance:
+        # Una línea sola: se descuenta por diferencia
+        cantidad = getattr(instance, '_cantidad_guardada', None)
+        if cantidad is None:
+            ResumenCarrito.reconstruir(instance.usuario_id)
+        else:
+            ResumenCarrito.aplicar_cambio(instance.usuario_id, -cantidad, -cantidad * instance.producto.precio_final)
+        return
+    modelo = origin.model if isinstance(origin, QuerySet) else type(origin)
+    if modelo is User:
+        # El resumen se borra junto con el usuario
+        return
+    # La señal llega cuando ya se borraron todas las líneas: basta un agregado por usuario
+    reconstruidos = origin.__dict__.setdefault('_resumenes_reconstruidos', set())
+    if instance.usuario_id not in reconstruidos:
+        reconstruidos.add(instance.usuario_id)
+        ResumenCarrito.reconstruir(instance.usuario_id)
+
+
+# El checkout crea pedidos e items sin señales (bulk_create) y los suma la
+# tarea pedido_realizado; estas cubren los cambios posteriores desde el admin
+@receiver(post_save, sender=Pedido)
+@receiver(post_delete, sender=Pedido)
+def ventas_pedido_modificado(sender, instance, created=False, **kwargs):
+    if not created:
+        reconstruir_ventas.encolar(timezone.localdate(instance.fecha_pedido).isoformat())
+
+
+@receiver(post_save, sender=ItemPedido)
+@receiver(post_delete, sender=ItemPedido)
+def ventas_item_modificado(sender, instance, **kwargs):
+    fecha = Pedido.objects.filter(pk=instance.pedido_id).values_list('fecha_pedido', flat=True).first()
+    if fecha is not None:
+        reconstruir_ventas.encolar(timezone.localdate(fecha).isoformat())
+
+
+@receiver(post_migrate)
+def reinstalar_busqueda(sender, using, **kwargs):
+    # Una migración que reconstruye la tabla de productos borra los triggers FTS
+    conexion = connections[using]
+    if sender.name == 'boutique' and TABLA_PRODUCTO in conexion.introspection.table_names():
+        instalar_fts(conexion)
+
+
+# Las imágenes se procesan en el worker; la clave evita repetir el trabajo
+# cada vez que se guarda el objeto sin cambiar la imagen
+@receiver(post_save, sender=Producto)
+def derivados_producto(sender, instance, **kwargs):
+    if instance.imagen:
+        generar_derivados_imagen.encolar('producto', instance.pk, clave=f'derivados:{instance.imagen.name}')
+
+
+@receiver(post_save, sender=Oferta)
+def derivados_oferta(sender, instance, **kwargs):
+    if instance.imagen:
+        generar_derivados_imagen.encolar('oferta', instance.pk, clave=f'derivados:{instance.imagen.name}')
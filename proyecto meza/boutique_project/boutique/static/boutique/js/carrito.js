@@ -0,0 +1,109 @@
+// Carrito sin recargar la página: los cambios de cantidad se juntan y se
+// envían en un solo lote a la API del carrito, que responde con las líneas y
+// el total para actualizar la página. Sin JavaScript siguen funcionando los
+// formularios y enlaces de siempre.
+(function () {
+    'use strict';
+
+    var panel = document.querySelector('[data-api-carrito]');
+    if (!panel || !window.fetch) {
+        return;
+    }
+    var url = panel.dataset.apiCarrito;
+    var pendientes = [];
+    var temporizador = null;
+
+    function tokenCsrf() {
+        var campo = panel.querySelector('input[name=csrfmiddlewaretoken]');
+        return campo ? campo.value : '';
+    }
+
+    function productoDe(elemento) {
+        return Number(elemento.closest('.cart-item').dataset.producto);
+    }
+
+    // Espera un momento para juntar varios cambios seguidos en una petición
+    function encolar(operacion, inmediato) {
+        pendientes.push(operacion);
+        clearTimeout(temporizador);
+        temporizador = setTimeout(enviar, inmediato ? 0 : 400);
+    }
+
+    function pedir(opciones) {
+        return fetch(url, opciones).then(function (respuesta) {
+            return respuesta.json().then(function (datos) {
+                if (!respuesta.ok) {
+                    throw new Error(datos.error || respuesta.statusText);
+                }
+                return datos;
+            });
+        });
+    }
+
+    function enviar() {
+        var operaciones = pendientes;
+        pendientes = [];
+        if (!operaciones.length) {
+            return;
+        }
+        pedir({
+            method: 'POST',
+            credentials: 'same-origin',
+            headers: {'Content-Type': 'application/json', 'X-CSRFToken': tokenCsrf()},
+            body: JSON.stringify({operaciones: operaciones})
+        }).then(actualizar, function (e) {
+            // No se aplicó nada: se vuelve a mostrar el carrito guardado
+            window.alert(e.message);
+            pedir({credentials: 'same-origin'}).then(actualizar);
+        });
+    }
+
+    function actualizar(datos) {
+        if (!datos.lineas.length) {
+            // El estado vacío lo dibuja la plantilla
+            window.location.reload();
+            return;
+        }
+        var lineas = {};
+        datos.lineas.forEach(function (linea) {
+            lineas[linea.producto] = linea;
+        });
+        panel.querySelectorAll('.cart-item').forEach(function (item) {
+            var linea = lineas[item.dataset.producto];
+            if (!linea) {
+                item.remove();
+                return;
+            }
+            item.querySelector('input[name=cantidad]').value = linea.cantidad;
+            item.querySelector('[data-subtotal]').textContent = '$' + linea.subtotal;
+        });
+        panel.querySelector('[data-total]').textContent = datos.total;
+
+        var insignia = document.querySelector('.user-actions .badge');
+        if (insignia) {
+            insignia.textContent = datos.articulos;
+        }
+    }
+
+    panel.addEventListener('change', function (evento) {
+        if (evento.target.name === 'cantidad') {
+            var cantidad = Math.max(parseInt(evento.target.value, 10) || 0, 0);
+            encolar({op: 'fijar', producto: productoDe(evento.target), cantidad: cantidad});
+        }
+    });
+
+    panel.addEventListener('submit', function (evento) {
+        evento.preventDefault();
+        var campo = evento.target.querySelector('input[name=cantidad]');
+        var cantidad = Math.max(parseInt(campo.value, 10) || 0, 0);
+        encolar({op: 'fijar', producto: productoDe(campo), cantidad: cantidad}, true);
+    });
+
+    panel.addEventListener('click', function (evento) {
+        var enlace = evento.target.closest('.cart-item .btn-danger');
+        if (enlace) {
+            evento.preventDefault();
+            encolar({op: 'quitar', producto: productoDe(enlace)}, true);
+        }
+    });
+}());
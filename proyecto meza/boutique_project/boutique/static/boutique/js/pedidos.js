@@ -0,0 +1,42 @@
+// Estado de los pedidos en vivo: la página de perfil escucha los eventos del
+// servidor (Server-Sent Events) y actualiza la etiqueta de cada pedido en vez
+// de recargar. EventSource se reconecta solo y retoma desde el último evento.
+(function () {
+    'use strict';
+
+    var panel = document.querySelector('[data-eventos]');
+    if (!panel || !window.EventSource) {
+        return;
+    }
+    var url = panel.dataset.eventos.split('?')[0];
+    var ultimo = new URLSearchParams(panel.dataset.eventos.split('?')[1]).get('desde') || '';
+    var fuente = null;
+
+    function actualizar(evento) {
+        ultimo = evento.lastEventId || ultimo;
+        var datos = JSON.parse(evento.data);
+        var tarjeta = panel.querySelector('[data-pedido="' + datos.pedido + '"]');
+        if (!tarjeta) {
+            return;
+        }
+        var etiqueta = tarjeta.querySelector('.status');
+        etiqueta.className = 'status status-' + datos.estado;
+        etiqueta.textContent = datos.estado_display;
+    }
+
+    function abrir() {
+        fuente = new EventSource(url + '?desde=' + encodeURIComponent(ultimo));
+        fuente.addEventListener('pedido', actualizar);
+    }
+
+    // Una pestaña oculta no necesita la conexión abierta
+    document.addEventListener('visibilitychange', function () {
+        if (document.hidden) {
+            fuente.close();
+        } else if (fuente.readyState === EventSource.CLOSED) {
+            abrir();
+        }
+    });
+
+    abrir();
+})();
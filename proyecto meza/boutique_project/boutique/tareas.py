@@ -0,0 +1,45 @@
+from .cache import invalidar_catalogo
+from .cola import tarea
+from .imagenes import VARIANTES_POR_MODELO, generar_derivados
+from .models import Producto, Oferta, ItemPedido, PrecioEfectivo, VentaDiaria
+
+# Trabajo lento que no debe bloquear la petición que lo origina
+
+MODELOS_CON_IMAGEN = {
+    'producto': Producto,
+    'oferta': Oferta,
+}
+
+
+@tarea
+def generar_derivados_imagen(modelo, pk):
+    objeto = MODELOS_CON_IMAGEN[modelo].objects.filter(pk=pk).only('id', 'imagen').first()
+    if objeto is not None and objeto.imagen:
+        generar_derivados(objeto.imagen, VARIANTES_POR_MODELO[modelo])
+
+
+@tarea
+def pedido_realizado(pedido_id):
+    VentaDiaria.acumular(pedido_id)
+    # Un producto agotado por el pedido desaparece de los listados cacheados
+    agotados = ItemPedido.objects.filter(pedido_id=pedido_id, producto__cantidad__lte=0)
+    if agotados.exists():
+        invalidar_catalogo()
+
+
+@tarea
+def reconstruir_ventas(fecha):
+    # Pedido editado o cancelado después de sumarse: se rehace su día completo
+    VentaDiaria.reconstruir(fecha, fecha)
+
+
+@tarea
+def recalcular_precios(producto_ids=None):
+    PrecioEfectivo.recalcular(producto_ids)
+
+
+@tarea
+def recalcular_precios_oferta(oferta_id):
+    # Los productos se leen al ejecutar: la oferta pudo cambiar desde que se encoló
+    producto_ids = Oferta.productos.through.objects.filter(oferta_id=oferta_id).values_list('producto_id', flat=True)
+    PrecioEfectivo.recalcular(list(producto_ids))
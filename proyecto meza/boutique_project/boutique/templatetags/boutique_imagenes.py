@@ -0,0 +1,30 @@
+from django import template
+from django.utils.html import format_html
+
+from boutique.imagenes import VARIANTES, TAMANOS, fuentes, ruta_derivado, anchos
+
+register = template.Library()
+
+
+@register.simple_tag
+def imagen_responsive(campo, variante, alt='', clase=''):
+    """<picture> con WebP y JPEG en 1x/2x; usa el original si aún no hay derivados"""
+    if not campo:
+        return ''
+    ancho, alto = VARIANTES[variante]
+    srcset = fuentes(campo, variante)
+    if srcset is None:
+        return format_html(
+            '<img src="{}" alt="{}" class="{}" width="{}" height="{}" loading="lazy">',
+            campo.url, alt, clase, ancho, alto,
+        )
+    return format_html(
+        '<picture>'
+        '<source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}" alt="{}" class="{}" width="{}" height="{}" loading="lazy" decoding="async">'
+        '</picture>',
+        srcset['webp'], TAMANOS[variante],
+        campo.storage.url(ruta_derivado(campo.name, variante, anchos(variante)[0], 'jpg')),
+        srcset['jpg'], TAMANOS[variante],
+        alt, clase, ancho, alto,
+    )
@@ -1,3 +1,1601 @@
-from django.test import TestCase
+import gzip
+import json
+import os
+import pstats
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, connections, transaction, OperationalError
+from django.template import Context, Template
+from django.http import Http404, StreamingHttpResponse
+from django.templatetags.static import static
+from django.test import AsyncClient, Client, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from .basedatos import RouterLectura, pragma
+from .bench import CLAVE_USUARIOS, comparar, percentil, sembrar_datos
+from .busqueda import buscar_productos
+from .cache import afragmento_en_cache
+from .cola import encolar, procesar_pendientes, tarea
+from .estaticos import servir
+from .metricas import registro
+from .imagenes import ruta_derivado
+from .middleware import CompresionMiddleware
+from .models import (
+    Producto, Carrito, ResumenCarrito, Categoria, Oferta, Pedido, ItemPedido, EventoPedido, Reserva, Tarea, PrecioEfectivo,
+    VentaDiaria,
+)
+from .paginacion import (
+    PaginadorEstimado, PaginaPorClave, codificar_cursor, decodificar_cursor, estimar_filas,
+)
+from .servicios import realizar_checkout, StockInsuficiente
+
+# Máximo de consultas SQL permitidas por vista. Si una vista supera su
+# presupuesto es que volvió a aparecer un patrón N+1.
+PRESUPUESTO_CONSULTAS = {
+    'inicio': 1,
+    'productos': 2,
+    'ofertas': 2,
+    # sesión + usuario + resumen del carrito + consulta propia de la vista
+    'carrito': 4,
+    'perfil': 4,
+}
+
+
+def crear_catalogo(num_categorias=3, productos_por_categoria=4, num_ofertas=3):
+    productos = []
+    for c in range(num_categorias):
+        categoria = Categoria.objects.create(nombre=f'Categoría {c}', descripcion='...')
+        for p in range(productos_por_categoria):
+            productos.append(Producto.objects.create(
+                nombre=f'Producto {c}-{p}',
+                precio=100 + p,
+                cantidad=10,
+                descripcion='Descripción de prueba',
+                categoria=categoria,
+            ))
+    for o in range(num_ofertas):
+        oferta = Oferta.objects.create(
+            nombre=f'Oferta {o}',
+            descripcion='...',
+            tipo_descuento='porcentaje',
+            valor_descuento=10,
+            fecha_fin=timezone.now() + timedelta(days=7),
+        )
+        oferta.productos.set(productos[o::num_ofertas])
+    return productos
+
+
+class PresupuestoConsultasTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.productos = crear_catalogo()
+        cls.usuario = User.objects.create_user(username='cliente', password='clave-segura-123')
+        for producto in cls.productos[:5]:
+            Carrito.objects.create(usuario=cls.usuario, producto=producto, cantidad=2)
+        for _ in range(3):
+            Pedido.objects.create(usuario=cls.usuario, total=100)
+
+    def setUp(self):
+        cache.clear()
+
+    def assertPresupuesto(self, nombre_url):
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(reverse(nombre_url))
+        self.assertEqual(response.status_code, 200)
+        presupuesto = PRESUPUESTO_CONSULTAS[nombre_url]
+        self.assertLessEqual(
+            len(consultas), presupuesto,
+            f'{nombre_url} ejecutó {len(consultas)} consultas (presupuesto: {presupuesto}):\n'
+            + '\n'.join(q['sql'] for q in consultas.captured_queries)
+        )
+        return response
+
+    def test_inicio(self):
+        self.assertPresupuesto('inicio')
+
+    def test_productos(self):
+        response = self.assertPresupuesto('productos')
+        self.assertContains(response, 'Categoría 2')
+
+    def test_ofertas(self):
+        response = self.assertPresupuesto('ofertas')
+        self.assertContains(response, 'Producto 0-0')
+
+    def test_carrito(self):
+        self.client.force_login(self.usuario)
+        response = self.assertPresupuesto('carrito')
+        self.assertEqual(len(response.context['items_carrito']), 5)
+
+    def test_perfil(self):
+        self.client.force_login(self.usuario)
+        self.assertPresupuesto('perfil')
+
+
+class CheckoutTests(TestCase):
+    def setUp(self):
+        self.usuario = User.objects.create_user(username='cliente', password='clave-segura-123')
+        self.productos = crear_catalogo(num_categorias=1, productos_por_categoria=3, num_ofertas=0)
+
+    def test_crea_pedido_y_descuenta_stock(self):
+        for producto in self.productos:
+            Carrito.objects.create(usuario=self.usuario, producto=producto, cantidad=3)
+
+        pedido = realizar_checkout(self.usuario)
+
+        self.assertEqual(pedido.items.count(), 3)
+        self.assertEqual(pedido.total, sum(3 * p.precio for p in self.productos))
+        self.assertFalse(Carrito.objects.filter(usuario=self.usuario).exists())
+        for producto in self.productos:
+            producto.refresh_from_db()
+            self.assertEqual(producto.cantidad, 7)
+
+    def test_sin_stock_revierte_todo(self):
+        Carrito.objects.create(usuario=self.usuario, producto=self.productos[0], cantidad=2)
+        Carrito.objects.create(usuario=self.usuario, producto=self.productos[1], cantidad=11)
+
+        with self.assertRaises(StockInsuficiente) as contexto:
+            realizar_checkout(self.usuario)
+
+        self.assertEqual([item.producto for item in contexto.exception.lineas], [self.productos[1]])
+        self.assertFalse(Pedido.objects.exists())
+        self.assertEqual(Carrito.objects.filter(usuario=self.usuario).count(), 2)
+        self.productos[0].refresh_from_db()
+        self.assertEqual(self.productos[0].cantidad, 10)
+
+
+class CheckoutConcurrenteTests(TransactionTestCase):
+    """Varios hilos compran a la vez el mismo producto con poco stock"""
+
+    databases = {'default', 'lectura'}
+    HILOS = 12
+    STOCK = 5
+
+    def test_no_vende_de_mas(self):
+        categoria = Categoria.objects.create(nombre='Tenis', descripcion='...')
+        producto = Producto.objects.create(
+            nombre='Edición limitada', precio=1000, cantidad=self.STOCK,
+            descripcion='...', categoria=categoria,
+        )
+        usuarios = [User.objects.create_user(username=f'comprador{i}') for i in range(self.HILOS)]
+        for usuario in usuarios:
+            Carrito.objects.create(usuario=usuario, producto=producto, cantidad=1)
+
+        resultados = []
+        barrera = threading.Barrier(self.HILOS)
+
+        def comprar(usuario):
+            barrera.wait()
+            try:
+                for _ in range(50):
+                    try:
+                        realizar_checkout(usuario)
+                        resultados.append('ok')
+                        return
+                    except StockInsuficiente:
+                        resultados.append('sin_stock')
+                        return
+                    except OperationalError:
+                        # SQLite serializa escritores: se reintenta si la base está bloqueada
+                        time.sleep(0.01)
+                resultados.append('bloqueado')
+            finally:
+                connection.close()
+
+        hilos = [threading.Thread(target=comprar, args=(u,)) for u in usuarios]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        producto.refresh_from_db()
+        vendidos = ItemPedido.objects.filter(producto=producto).count()
+        self.assertNotIn('bloqueado', resultados)
+        self.assertEqual(resultados.count('ok'), self.STOCK)
+        self.assertEqual(vendidos, self.STOCK)
+        self.assertEqual(producto.cantidad, 0)
+
+
+class SqliteProduccionTests(TransactionTestCase):
+    databases = {'default', 'lectura'}
+
+    def test_pragmas_de_conexion(self):
+        self.assertEqual(pragma(connection, 'busy_timeout'), settings.BOUTIQUE_SQLITE_PRAGMAS['busy_timeout'])
+        self.assertEqual(pragma(connection, 'synchronous'), 1)  # NORMAL
+        self.assertEqual(pragma(connections['lectura'], 'query_only'), 1)
+        with self.assertRaises(OperationalError):
+            with connections['lectura'].cursor() as cursor:
+                cursor.execute('DELETE FROM boutique_categoria')
+
+    def test_router(self):
+        router = RouterLectura()
+        self.assertEqual(router.db_for_read(Producto), 'lectura')
+        self.assertEqual(router.db_for_read(Oferta.productos.through), 'lectura')
+        self.assertEqual(router.db_for_read(Carrito), 'default')
+        self.assertEqual(router.db_for_read(Pedido), 'default')
+        self.assertEqual(router.db_for_write(Producto), 'default')
+        with transaction.atomic():
+            # La réplica no vería lo escrito en la transacción
+            self.assertEqual(router.db_for_read(Producto), 'default')
+
+        categoria = Categoria.objects.create(nombre='Vestidos', descripcion='...')
+        producto = Producto.objects.create(nombre='Vestido', precio=100, cantidad=3,
+                                           descripcion='...', categoria=categoria)
+        leido = Producto.objects.get(pk=producto.pk)
+        self.assertEqual(leido._state.db, 'lectura')
+        leido.cantidad = 2
+        leido.save()
+        self.assertEqual(Producto.objects.using('default').get(pk=producto.pk).cantidad, 2)
+
+    def test_catalogo_lee_de_la_replica(self):
+        crear_catalogo(num_categorias=1, productos_por_categoria=2, num_ofertas=0)
+        with CaptureQueriesContext(connection) as escritura, \
+                CaptureQueriesContext(connections['lectura']) as lectura:
+            self.assertEqual(self.client.get(reverse('productos')).status_code, 200)
+        self.assertTrue(any('boutique_producto' in q['sql'] for q in lectura.captured_queries))
+        self.assertFalse(any('boutique_producto' in q['sql'] for q in escritura.captured_queries))
+
+
+
+class SqliteConcurrenciaTests(unittest.TestCase):
+    """Escritores concurrentes sobre un archivo real en WAL.
+
+    La base de pruebas está en memoria, así que se usa una base temporal con
+    los ajustes de 'default'. Es un TestCase de unittest porque los de Django
+    no dejan abrir conexiones a alias que no declaran.
+    """
+
+    def test_escritores_concurrentes_sin_bloqueos(self):
+        # Transacciones que leen y luego escriben. Con BEGIN diferido dos de
+        # ellas se bloquean entre sí y una falla con "database is locked" sin
+        # esperar; con BEGIN IMMEDIATE y busy_timeout esperan su turno.
+        hilos, vueltas = 8, 25
+        carpeta = tempfile.mkdtemp()
+        connections.settings['concurrencia'] = {
+            **connections['default'].settings_dict,
+            'NAME': os.path.join(carpeta, 'concurrencia.sqlite3'),
+        }
+        try:
+            with connections['concurrencia'].cursor() as cursor:
+                cursor.execute('CREATE TABLE contador (id INTEGER PRIMARY KEY, valor INTEGER)')
+                cursor.execute('INSERT INTO contador VALUES (1, 0)')
+            self.assertEqual(pragma(connections['concurrencia'], 'journal_mode'), 'wal')
+
+            errores = []
+            barrera = threading.Barrier(hilos)
+
+            def sumar():
+                conexion = connections['concurrencia']
+                barrera.wait()
+                try:
+                    for _ in range(vueltas):
+                        with transaction.atomic(using='concurrencia'), conexion.cursor() as cursor:
+                            cursor.execute('SELECT valor FROM contador WHERE id = 1')
+                            valor = cursor.fetchone()[0]
+                            time.sleep(0.001)
+                            cursor.execute('UPDATE contador SET valor = %s WHERE id = 1', [valor + 1])
+                except OperationalError as e:
+                    errores.append(str(e))
+                finally:
+                    conexion.close()
+
+            trabajadores = [threading.Thread(target=sumar) for _ in range(hilos)]
+            for hilo in trabajadores:
+                hilo.start()
+            for hilo in trabajadores:
+                hilo.join()
+
+            self.assertEqual(errores, [])
+            with connections['concurrencia'].cursor() as cursor:
+                cursor.execute('SELECT valor FROM contador WHERE id = 1')
+                self.assertEqual(cursor.fetchone()[0], hilos * vueltas)
+        finally:
+            connections['concurrencia'].close()
+            del connections['concurrencia']
+            del connections.settings['concurrencia']
+            shutil.rmtree(carpeta, ignore_errors=True)
+
+
+class CarritoApiTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.productos = crear_catalogo(num_categorias=1, productos_por_categoria=3, num_ofertas=0)
+        self.usuario = User.objects.create_user(username='cliente', password='clave-segura-123')
+        Carrito.objects.create(usuario=self.usuario, producto=self.productos[0], cantidad=2)
+        self.client.force_login(self.usuario)
+        self.url = reverse('api_carrito')
+
+    def enviar(self, operaciones):
+        return self.client.post(self.url, {'operaciones': operaciones}, content_type='application/json')
+
+    def test_lote_en_una_peticion(self):
+        p0, p1, p2 = (producto.pk for producto in self.productos)
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.enviar([
+                {'op': 'agregar', 'producto': p1, 'cantidad': 2},
+                {'op': 'fijar', 'producto': p0, 'cantidad': 5},
+                {'op': 'agregar', 'producto': p2},
+                {'op': 'quitar', 'producto': p2},
+                {'op': 'agregar', 'producto': p1},
+            ])
+        self.assertEqual(response.status_code, 200)
+        datos = response.json()
+        self.assertEqual({linea['producto']: linea['cantidad'] for linea in datos['lineas']}, {p0: 5, p1: 3})
+        self.assertEqual(datos['articulos'], 8)
+        self.assertEqual(Decimal(datos['total']), 5 * 100 + 3 * 101)
+        # Lecturas, las reservas, un upsert y el resumen, sin importar cuántas operaciones trae el lote
+        self.assertLessEqual(len(consultas), 15)
+
+        resumen = ResumenCarrito.objects.get(usuario=self.usuario)
+        self.assertEqual((resumen.articulos, resumen.total), (8, Decimal('803')))
+        self.assertEqual(self.client.get(self.url).json(), datos)
+
+        response = self.enviar([{'op': 'fijar', 'producto': p0, 'cantidad': 0}])
+        self.assertEqual([linea['producto'] for linea in response.json()['lineas']], [p1])
+
+    def test_lote_invalido_no_aplica_nada(self):
+        response = self.enviar([
+            {'op': 'fijar', 'producto': self.productos[0].pk, 'cantidad': 1},
+            {'op': 'agregar', 'producto': self.productos[1].pk, 'cantidad': 11},
+        ])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['operacion'], 1)
+        self.assertEqual(list(Carrito.objects.values_list('producto_id', 'cantidad')), [(self.productos[0].pk, 2)])
+
+        for cuerpo in ([], [{'op': 'vaciar', 'producto': 1}], [{'op': 'fijar', 'producto': 1, 'cantidad': -1}]):
+            self.assertEqual(self.enviar(cuerpo).status_code, 400)
+        response = self.client.post(self.url, 'no es json', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        # Sin lista de operaciones, también con las trazas DEBUG activas
+        with self.assertNoLogs('boutique.views', 'DEBUG'):
+            for cuerpo in ({}, {'operaciones': 'x'}, ['x']):
+                response = self.client.post(self.url, cuerpo, content_type='application/json')
+                self.assertEqual(response.status_code, 400)
+
+    def test_sesion_y_csrf(self):
+        cliente = Client(enforce_csrf_checks=True)
+        self.assertEqual(cliente.get(self.url).status_code, 401)
+        cliente.force_login(self.usuario)
+        response = cliente.post(self.url, {'operaciones': []}, content_type='application/json')
+        self.assertEqual(response.status_code, 403)
+
+    def test_carrito_enlaza_la_api(self):
+        response = self.client.get(reverse('carrito'))
+        self.assertContains(response, f'data-api-carrito="{self.url}"')
+        self.assertContains(response, 'boutique/js/carrito.js')
+
+
+class ReservasTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.producto = crear_catalogo(num_categorias=1, productos_por_categoria=1, num_ofertas=0)[0]
+        self.ana = User.objects.create_user(username='ana', password='clave-segura-123')
+        self.beto = User.objects.create_user(username='beto', password='clave-segura-123')
+
+    def test_reservas_retienen_stock(self):
+        pk = self.producto.pk
+        self.assertEqual(Reserva.reservar(self.ana, {pk: 8}), {})
+        with self.assertNumQueries(1):
+            self.assertEqual(Reserva.disponible(pk, self.beto), 2)
+        # Las propias no cuentan: la cantidad es la total que quiere el usuario
+        self.assertEqual(Reserva.disponible(pk, self.ana), 10)
+        self.assertEqual(Reserva.reservar(self.beto, {pk: 3}), {pk: 2})
+        self.assertFalse(Reserva.objects.filter(usuario=self.beto).exists())
+        self.assertEqual(Reserva.reservar(self.beto, {pk: 2}), {})
+        self.assertEqual(Reserva.disponible(pk), 0)
+
+        Reserva.reservar(self.ana, {pk: 0})
+        self.assertEqual(Reserva.disponible(pk, self.beto), 10)
+
+    def test_vencidas_no_cuentan_y_se_barren(self):
+        antes = timezone.now() - timedelta(minutes=settings.BOUTIQUE_RESERVA_MINUTOS + 1)
+        for i in range(3):
+            usuario = User.objects.create_user(username=f'u{i}')
+            Reserva.reservar(usuario, {self.producto.pk: 1}, ahora=antes)
+        Reserva.reservar(self.ana, {self.producto.pk: 7}, ahora=antes)
+        self.assertEqual(Reserva.objects.count(), 4)
+        self.assertEqual(Reserva.disponible(self.producto.pk, self.beto), 10)
+        self.assertEqual(Reserva.reservar(self.beto, {self.producto.pk: 4}), {})
+
+        self.assertEqual(Reserva.liberar_vencidas(lote=2), 4)
+        self.assertEqual(list(Reserva.objects.values_list('usuario__username', flat=True)), ['beto'])
+
+        salida = StringIO()
+        call_command('liberar_reservas', stdout=salida)
+        self.assertIn('0 reservas vencidas liberadas', salida.getvalue())
+
+    def test_checkout_respeta_reservas_de_otros(self):
+        Carrito.objects.create(usuario=self.ana, producto=self.producto, cantidad=5)
+        Carrito.objects.create(usuario=self.beto, producto=self.producto, cantidad=8)
+        Reserva.reservar(self.beto, {self.producto.pk: 8})
+
+        with self.assertRaises(StockInsuficiente):
+            realizar_checkout(self.ana)
+        realizar_checkout(self.beto)
+
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.cantidad, 2)
+        self.assertFalse(Reserva.objects.exists())
+
+    def test_vistas_del_carrito_reservan(self):
+        Reserva.reservar(self.beto, {self.producto.pk: 9})
+        self.client.force_login(self.ana)
+        self.client.get(reverse('agregar_al_carrito', args=[self.producto.pk]))
+        response = self.client.get(reverse('agregar_al_carrito', args=[self.producto.pk]), follow=True)
+        self.assertContains(response, 'no tiene stock disponible')
+        item = Carrito.objects.get(usuario=self.ana)
+        self.assertEqual(item.cantidad, 1)
+        self.assertEqual(Reserva.objects.get(usuario=self.ana).cantidad, 1)
+
+        response = self.client.post(reverse('actualizar_carrito', args=[item.pk]), {'cantidad': 3}, follow=True)
+        self.assertContains(response, 'Solo quedan 1 unidades disponibles')
+        self.assertEqual(Carrito.objects.get(pk=item.pk).cantidad, 1)
+
+        response = self.client.post(
+            reverse('api_carrito'), {'operaciones': [{'op': 'agregar', 'producto': self.producto.pk}]},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 400)
+
+        self.client.get(reverse('eliminar_del_carrito', args=[item.pk]))
+        self.assertFalse(Reserva.objects.filter(usuario=self.ana).exists())
+
+
+class ResumenCarritoTests(TestCase):
+    def setUp(self):
+        self.usuario = User.objects.create_user(username='cliente', password='clave-segura-123')
+        self.productos = crear_catalogo(num_categorias=1, productos_por_categoria=2, num_ofertas=0)
+
+    def assertResumen(self, articulos, total):
+        resumen = ResumenCarrito.objects.get(usuario=self.usuario)
+        self.assertEqual((resumen.articulos, resumen.total), (articulos, total))
+        # El valor mantenido por diferencia coincide con el agregado en SQL
+        reconstruido = ResumenCarrito.reconstruir(self.usuario.pk)
+        self.assertEqual((reconstruido.articulos, reconstruido.total), (articulos, total))
+
+    def test_se_mantiene_al_agregar_actualizar_y_eliminar(self):
+        a, b = self.productos
+        item = Carrito.objects.create(usuario=self.usuario, producto=a, cantidad=2)
+        Carrito.objects.create(usuario=self.usuario, producto=b, cantidad=1)
+        self.assertResumen(3, 2 * a.precio + b.precio)
+
+        item = Carrito.objects.select_related('producto').get(pk=item.pk)
+        item.cantidad = 5
+        item.save()
+        self.assertResumen(6, 5 * a.precio + b.precio)
+
+        item.delete()
+        self.assertResumen(1, b.precio)
+
+    def test_se_mantiene_al_borrar_un_producto(self):
+        a, b = self.productos
+        Carrito.objects.create(usuario=self.usuario, producto=a, cantidad=2)
+        Carrito.objects.create(usuario=self.usuario, producto=b, cantidad=1)
+        Producto.objects.get(pk=a.pk).delete()
+        self.assertResumen(1, b.precio)
+
+    def test_se_mantiene_al_borrar_un_queryset(self):
+        a, b = self.productos
+        Carrito.objects.create(usuario=self.usuario, producto=a, cantidad=2)
+        Carrito.objects.create(usuario=self.usuario, producto=b, cantidad=1)
+        otro = User.objects.create_user(username='otro')
+        Carrito.objects.create(usuario=otro, producto=a, cantidad=4)
+
+        with self.assertNumQueries(2 + 2 * 5):
+            # SELECT y DELETE, y un solo agregado con su update_or_create por usuario
+            Carrito.objects.all().delete()
+        self.assertResumen(0, 0)
+        self.assertEqual(ResumenCarrito.objects.get(usuario=otro).articulos, 0)
+
+        # Borrar al usuario se lleva su resumen sin recrearlo
+        otro.delete()
+        self.assertFalse(ResumenCarrito.objects.filter(usuario_id=otro.pk).exists())
+
+    def test_cambio_de_precio_recalcula_carritos(self):
+        a = self.productos[0]
+        Carrito.objects.create(usuario=self.usuario, producto=a, cantidad=2)
+        producto = Producto.objects.get(pk=a.pk)
+        producto.precio = 50
+        producto.save()
+        self.assertResumen(2, 100)
+
+    def test_checkout_vacia_el_resumen(self):
+        Carrito.objects.create(usuario=self.usuario, producto=self.productos[0], cantidad=2)
+        realizar_checkout(self.usuario)
+        self.assertResumen(0, 0)
+
+    def test_insignia_en_la_cabecera(self):
+        cache.clear()
+        Carrito.objects.create(usuario=self.usuario, producto=self.productos[0], cantidad=3)
+        self.client.force_login(self.usuario)
+        response = self.client.get(reverse('inicio'))
+        self.assertContains(response, '<span class="badge">3</span>', html=True)
+
+
+class CacheCatalogoTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.productos = crear_catalogo(num_categorias=2, productos_por_categoria=2, num_ofertas=1)
+
+    def test_segunda_visita_no_consulta_la_base(self):
+        for nombre_url in ('inicio', 'productos', 'ofertas'):
+            self.client.get(reverse(nombre_url))
+            with self.assertNumQueries(0):
+                self.client.get(reverse(nombre_url))
+
+    def test_clave_por_categoria(self):
+        categoria = self.productos[0].categoria
+        response = self.client.get(reverse('productos'), {'categoria': categoria.id})
+        self.assertNotContains(response, 'Producto 1-0')
+        response = self.client.get(reverse('productos'))
+        self.assertContains(response, 'Producto 1-0')
+
+    def test_clave_por_estado_de_autenticacion(self):
+        self.client.get(reverse('productos'))
+        usuario = User.objects.create_user(username='cliente', password='clave-segura-123')
+        self.client.force_login(usuario)
+        response = self.client.get(reverse('productos'))
+        self.assertContains(response, 'Agregar al Carrito')
+
+    def test_guardar_producto_invalida(self):
+        self.client.get(reverse('productos'))
+        producto = self.productos[0]
+        producto.nombre = 'Nombre nuevo'
+        with self.captureOnCommitCallbacks(execute=True):
+            producto.save()
+        self.assertContains(self.client.get(reverse('productos')), 'Nombre nuevo')
+
+    def test_cambiar_productos_de_oferta_invalida(self):
+        oferta = Oferta.objects.get()
+        self.client.get(reverse('ofertas'))
+        with self.captureOnCommitCallbacks(execute=True):
+            oferta.productos.set([self.productos[3]])
+        response = self.client.get(reverse('ofertas'))
+        self.assertContains(response, self.productos[3].nombre)
+        self.assertNotContains(response, self.productos[0].nombre)
+
+
+class VistasAsyncTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.productos = crear_catalogo(num_categorias=2, productos_por_categoria=3, num_ofertas=1)
+
+    async def test_catalogo_y_api_por_asgi(self):
+        cliente = AsyncClient()
+        for nombre_url in ('inicio', 'productos', 'ofertas', 'api_productos', 'api_categorias', 'api_ofertas'):
+            response = await cliente.get(reverse(nombre_url))
+            self.assertEqual(response.status_code, 200, nombre_url)
+        response = await cliente.get(reverse('productos'))
+        self.assertContains(response, 'Producto 1-2')
+
+        url = reverse('api_producto', args=[self.productos[0].pk])
+        response = await cliente.get(url)
+        self.assertEqual(response.json()['nombre'], 'Producto 0-0')
+        response = await cliente.get(url, headers={'If-None-Match': response['ETag']})
+        self.assertEqual(response.status_code, 304)
+        response = await cliente.get(reverse('api_producto', args=[0]))
+        self.assertEqual(response.status_code, 404)
+
+    async def test_fragmento_en_cache_usa_la_clave_de_la_plantilla(self):
+        self.assertFalse(await afragmento_en_cache('productos', None, 24, None, None, False))
+        await AsyncClient().get(reverse('productos'))
+        self.assertTrue(await afragmento_en_cache('productos', None, 24, None, None, False))
+        self.assertFalse(await afragmento_en_cache('productos', None, 24, None, None, True))
+
+    async def test_pagina_async_igual_que_sincrona(self):
+        queryset = Producto.objects.order_by()
+        primera = await PaginaPorClave(queryset, por_pagina=2).acargar()
+        pagina = await PaginaPorClave(queryset, despues=primera.cursor_siguiente, por_pagina=2).acargar()
+        sincrona = PaginaPorClave(queryset, despues=primera.cursor_siguiente, por_pagina=2)
+        self.assertEqual(pagina.elementos, await sync_to_async(lambda: sincrona.elementos)())
+        self.assertTrue(pagina.tiene_anterior)
+        self.assertTrue(pagina.tiene_siguiente)
+
+
+class EventosPedidoTests(TestCase):
+    def setUp(self):
+        self.usuario = User.objects.create_user(username='cliente', password='clave-segura-123')
+        self.pedido = Pedido.objects.create(usuario=self.usuario, total=100)
+        self.url = reverse('eventos_pedidos')
+
+    def cambiar_estado(self, estado):
+        pedido = Pedido.objects.get(pk=self.pedido.pk)
+        pedido.estado = estado
+        pedido.save()
+        return EventoPedido.objects.last()
+
+    def test_registra_cada_cambio_de_estado(self):
+        self.cambiar_estado('confirmado')
+        pedido = Pedido.objects.get(pk=self.pedido.pk)
+        pedido.notas = 'Sin bolsa'
+        pedido.save()
+        pedido.estado = 'preparando'
+        pedido.save(update_fields=['notas'])
+        self.assertEqual(
+            list(self.pedido.eventos.values_list('anterior', 'estado')),
+            [('', 'pendiente'), ('pendiente', 'confirmado')],
+        )
+
+    def test_eventos_pendientes_por_wsgi(self):
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+        self.client.force_login(self.usuario)
+        evento = self.cambiar_estado('listo')
+
+        response = self.client.get(self.url)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+        # Sin punto de partida no se repite el historial
+        self.assertNotIn(b'event: pedido', response.content)
+
+        response = self.client.get(self.url, {'desde': 0}, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(response.content.count(b'event: pedido'), 2)
+        response = self.client.get(self.url, headers={'Last-Event-ID': evento.pk - 1})
+        self.assertIn(f'id: {evento.pk}\nevent: pedido\n'.encode(), response.content)
+        self.assertIn(b'"estado_display": "Listo para recoger"', response.content)
+
+    @override_settings(BOUTIQUE_EVENTOS_INTERVALO=0.01, BOUTIQUE_EVENTOS_DURACION=5)
+    async def test_stream_por_asgi(self):
+        cliente = AsyncClient()
+        await cliente.aforce_login(self.usuario)
+        response = await cliente.get(self.url)
+        self.assertTrue(response.streaming)
+        flujo = aiter(response.streaming_content)
+        self.assertEqual(await anext(flujo), b'retry: 10\n\n')
+
+        await sync_to_async(self.cambiar_estado)('entregado')
+        fragmento = await anext(flujo)
+        self.assertIn(b'"estado": "entregado"', fragmento)
+        self.assertIn(f'"pedido": {self.pedido.pk}'.encode(), fragmento)
+        await flujo.aclose()
+
+    def test_perfil_escucha_desde_el_ultimo_evento(self):
+        evento = self.cambiar_estado('preparando')
+        self.client.force_login(self.usuario)
+        response = self.client.get(reverse('perfil'))
+        self.assertContains(response, f'data-eventos="{self.url}?desde={evento.pk}"')
+        self.assertContains(response, f'data-pedido="{self.pedido.pk}"')
+        self.assertContains(response, '<span class="status status-preparando">Preparando</span>', html=True)
+
+
+class PaginacionPorClaveTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        categoria = Categoria.objects.create(nombre='Ropa', descripcion='...')
+        # Nombres repetidos para comprobar el desempate por id
+        for i in range(25):
+            Producto.objects.create(
+                nombre=f'Playera {i // 2:02d}', precio=100, cantidad=1,
+                descripcion='...', categoria=categoria,
+            )
+        self.esperado = list(Producto.objects.order_by('nombre', 'id'))
+
+    def test_recorre_todas_las_paginas_hacia_adelante_y_atras(self):
+        paginas = []
+        cursor = None
+        while True:
+            pagina = PaginaPorClave(Producto.objects.all(), despues=cursor, por_pagina=10)
+            paginas.append(pagina.elementos)
+            if not pagina.tiene_siguiente:
+                break
+            cursor = pagina.cursor_siguiente
+        self.assertEqual([p for pagina in paginas for p in pagina], self.esperado)
+        self.assertEqual([len(p) for p in paginas], [10, 10, 5])
+
+        pagina = PaginaPorClave(Producto.objects.all(), antes=PaginaPorClave(
+            Producto.objects.all(), despues=cursor, por_pagina=10).cursor_anterior, por_pagina=10)
+        self.assertEqual(pagina.elementos, self.esperado[10:20])
+        self.assertTrue(pagina.tiene_anterior)
+        self.assertTrue(pagina.tiene_siguiente)
+
+    def test_no_usa_offset(self):
+        cursor = PaginaPorClave(Producto.objects.all(), por_pagina=10).cursor_siguiente
+        with CaptureQueriesContext(connection) as consultas:
+            list(PaginaPorClave(Producto.objects.all(), despues=cursor, por_pagina=10))
+        self.assertEqual(len(consultas), 1)
+        self.assertNotIn('OFFSET', consultas[0]['sql'])
+
+    def test_vista_con_navegacion(self):
+        response = self.client.get(reverse('productos'), {'por_pagina': 10})
+        pagina = response.context['pagina']
+        self.assertEqual(len(pagina), 10)
+        self.assertContains(response, 'despues=' + pagina.cursor_siguiente)
+        self.assertNotContains(response, 'Anterior')
+
+        response = self.client.get(reverse('productos'), {'por_pagina': 10, 'despues': pagina.cursor_siguiente})
+        self.assertEqual(response.context['pagina'].elementos, self.esperado[10:20])
+        self.assertContains(response, 'Anterior')
+
+    def test_cursor_invalido_vuelve_al_inicio(self):
+        response = self.client.get(reverse('productos'), {'despues': 'no-es-un-cursor'})
+        self.assertEqual(response.context['pagina'].elementos[0], self.esperado[0])
+
+    def test_cursor_con_tipos_falsos_o_categoria_no_numerica(self):
+        self.assertIsNone(decodificar_cursor(codificar_cursor(['a', 'abc']), [str, int]))
+        self.assertIsNone(decodificar_cursor(codificar_cursor([None, None]), [str, int]))
+        self.assertIsNone(decodificar_cursor(codificar_cursor(['a', True]), [str, int]))
+        self.assertEqual(decodificar_cursor(codificar_cursor(['a', 3]), [str, int]), ['a', 3])
+
+        with self.assertNoLogs('boutique.views', 'ERROR'):
+            for parametros in ({'despues': codificar_cursor(['a', 'abc'])}, {'categoria': 'abc'}):
+                response = self.client.get(reverse('productos'), parametros)
+                self.assertEqual(response.context['pagina'].elementos[0], self.esperado[0])
+
+
+class ExplicarConsultasTests(TestCase):
+    def test_las_vistas_no_recorren_tablas_completas(self):
+        crear_catalogo()
+        usuario = User.objects.create_user(username='cliente')
+        Carrito.objects.create(usuario=usuario, producto=Producto.objects.first())
+        Pedido.objects.create(usuario=usuario)
+
+        salida = StringIO()
+        call_command('explicar_consultas', '--estricto', stdout=salida)
+        self.assertIn('producto_cat_nombre_idx', salida.getvalue())
+        self.assertIn('pedido_usuario_fecha_idx', salida.getvalue())
+
+
+class BusquedaTests(TestCase):
+    def setUp(self):
+        self.ropa = Categoria.objects.create(nombre='Ropa', descripcion='...')
+        self.calzado = Categoria.objects.create(nombre='Calzado', descripcion='...')
+        self.playera = Producto.objects.create(
+            nombre='Playera básica', precio=200, cantidad=5,
+            descripcion='Algodón peinado', categoria=self.ropa)
+        self.tenis = Producto.objects.create(
+            nombre='Tenis Campus', precio=2500, cantidad=5,
+            descripcion='Edición limitada, ideal para la playa', categoria=self.calzado)
+
+    def test_prefijo_y_ranking(self):
+        # "Playera" en el nombre pesa más que "playa" en la descripción
+        self.assertEqual(buscar_productos('pla'), [self.playera, self.tenis])
+
+    def test_ignora_acentos(self):
+        self.assertEqual(buscar_productos('algodon basica'), [self.playera])
+
+    def test_filtra_por_categoria(self):
+        self.assertEqual(buscar_productos('pla', categoria_id=self.calzado.id), [self.tenis])
+
+    def test_se_sincroniza_al_modificar_y_borrar(self):
+        self.tenis.nombre = 'Sandalia'
+        self.tenis.save()
+        self.assertEqual(buscar_productos('sandal'), [self.tenis])
+        self.assertEqual(buscar_productos('campus'), [])
+        self.tenis.delete()
+        self.assertEqual(buscar_productos('sandal'), [])
+
+    def test_texto_sin_palabras(self):
+        self.assertEqual(buscar_productos('"* OR -'), [])
+
+    def test_vista_y_api(self):
+        response = self.client.get(reverse('buscar'), {'q': 'tenis'})
+        self.assertContains(response, 'Tenis Campus')
+        response = self.client.get(reverse('api_buscar'), {'q': 'pla', 'categoria': self.ropa.id})
+        self.assertEqual([r['id'] for r in response.json()['resultados']], [self.playera.id])
+
+    def test_busqueda_del_admin(self):
+        admin = User.objects.create_superuser(username='admin', password='clave-segura-123')
+        self.client.force_login(admin)
+        response = self.client.get(reverse('admin:boutique_producto_changelist'), {'q': 'limitada'})
+        self.assertEqual(list(response.context['cl'].result_list), [self.tenis])
+
+
+class ApiTests(TestCase):
+    def setUp(self):
+        self.productos = crear_catalogo(num_categorias=2, productos_por_categoria=3, num_ofertas=1)
+
+    def test_paginacion_por_cursor(self):
+        url = reverse('api_productos') + '?por_pagina=4'
+        vistos = []
+        while url:
+            datos = self.client.get(url).json()
+            vistos += [p['id'] for p in datos['resultados']]
+            url = datos['siguiente']
+        self.assertEqual(vistos, list(Producto.objects.order_by('nombre', 'id').values_list('id', flat=True)))
+
+    def test_seleccion_de_campos(self):
+        datos = self.client.get(reverse('api_productos'), {'campos': 'id,precio'}).json()
+        self.assertEqual(set(datos['resultados'][0]), {'id', 'precio'})
+        response = self.client.get(reverse('api_productos'), {'campos': 'id,contraseña'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_cursor_alterado(self):
+        for cursor in (codificar_cursor(['a', 'abc']), codificar_cursor([None, None]), 'no-es-un-cursor'):
+            for parametro in ('despues', 'antes'):
+                response = self.client.get(reverse('api_productos'), {parametro: cursor})
+                self.assertEqual(response.status_code, 400, (parametro, cursor))
+                self.assertIn('Cursor', response.json()['error'])
+
+    def test_filtro_por_categoria(self):
+        categoria = self.productos[0].categoria_id
+        datos = self.client.get(reverse('api_productos'), {'categoria': categoria}).json()
+        self.assertEqual(len(datos['resultados']), 3)
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('api_productos'), {'categoria': 'abc'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('categoria', response.json()['error'])
+
+    def test_get_condicional(self):
+        url = reverse('api_productos')
+        response = self.client.get(url)
+        etag = response['ETag']
+        self.assertTrue(response.has_header('Last-Modified'))
+
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        producto = self.productos[0]
+        producto.precio = 1
+        producto.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_checkout_cambia_el_etag(self):
+        url = reverse('api_producto', args=[self.productos[0].id])
+        etag = self.client.get(url)['ETag']
+        usuario = User.objects.create_user(username='cliente')
+        Carrito.objects.create(usuario=usuario, producto=self.productos[0], cantidad=1)
+        realizar_checkout(usuario)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_gzip(self):
+        response = self.client.get(reverse('api_productos'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+
+    def test_categorias_y_ofertas(self):
+        self.assertEqual(len(self.client.get(reverse('api_categorias')).json()['resultados']), 2)
+        ofertas = self.client.get(reverse('api_ofertas')).json()['resultados']
+        self.assertEqual(len(ofertas[0]['productos']), 6)
+
+    def test_producto_inexistente(self):
+        self.assertEqual(self.client.get(reverse('api_producto', args=[999])).status_code, 404)
+
+
+def imagen_de_prueba(nombre='foto.png', tamano=(1600, 1200)):
+    buffer = BytesIO()
+    Image.new('RGBA', tamano, (155, 27, 48, 255)).save(buffer, 'PNG')
+    return SimpleUploadedFile(nombre, buffer.getvalue(), content_type='image/png')
+
+
+class DerivadosImagenTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        ajustes = override_settings(MEDIA_ROOT=self.media)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        self.categoria = Categoria.objects.create(nombre='Tenis', descripcion='...')
+
+    def crear_producto(self, imagen):
+        producto = Producto.objects.create(
+            nombre='Campus', precio=2500, cantidad=3, descripcion='...',
+            categoria=self.categoria, imagen=imagen,
+        )
+        self.assertEqual(procesar_pendientes(), 1)
+        return producto
+
+    def test_genera_variantes_en_webp_y_jpeg(self):
+        producto = self.crear_producto(imagen_de_prueba())
+        storage = producto.imagen.storage
+        for variante, anchos in (('tarjeta', (400, 800)), ('miniatura', (80, 160))):
+            for ancho in anchos:
+                for extension in ('webp', 'jpg'):
+                    self.assertTrue(storage.exists(ruta_derivado(producto.imagen.name, variante, ancho, extension)))
+        with storage.open(ruta_derivado(producto.imagen.name, 'tarjeta', 800, 'webp')) as archivo:
+            self.assertEqual(Image.open(archivo).size, (800, 400))
+
+    def test_no_amplia_imagenes_pequenas(self):
+        producto = self.crear_producto(imagen_de_prueba(tamano=(500, 300)))
+        storage = producto.imagen.storage
+        self.assertTrue(storage.exists(ruta_derivado(producto.imagen.name, 'tarjeta', 400, 'jpg')))
+        self.assertFalse(storage.exists(ruta_derivado(producto.imagen.name, 'tarjeta', 800, 'jpg')))
+
+        # Más angosta que la tarjeta 1x: solo se genera la miniatura y la tarjeta usa el original
+        producto = self.crear_producto(imagen_de_prueba('angosta.png', tamano=(300, 300)))
+        self.assertTrue(storage.exists(ruta_derivado(producto.imagen.name, 'miniatura', 160, 'jpg')))
+        self.assertFalse(storage.exists(ruta_derivado(producto.imagen.name, 'tarjeta', 400, 'jpg')))
+        html = Template("{% load boutique_imagenes %}{% imagen_responsive p.imagen 'tarjeta' %}").render(
+            Context({'p': producto}))
+        self.assertIn(f'src="{producto.imagen.url}"', html)
+
+        # Hero 1x de 1200x600: ni más angosta ni más baja se amplía
+        for nombre, tamano in (('cuadrada.png', (900, 900)), ('baja.png', (1600, 500))):
+            oferta = Oferta.objects.create(
+                nombre='Drop', descripcion='...', tipo_descuento='porcentaje', valor_descuento=10,
+                fecha_fin=timezone.now() + timedelta(days=1), imagen=imagen_de_prueba(nombre, tamano),
+            )
+            procesar_pendientes()
+            self.assertTrue(storage.exists(ruta_derivado(oferta.imagen.name, 'tarjeta', 400, 'jpg')))
+            self.assertFalse(storage.exists(ruta_derivado(oferta.imagen.name, 'hero', 1200, 'jpg')))
+
+    def test_etiqueta_con_srcset(self):
+        producto = self.crear_producto(imagen_de_prueba())
+        html = Template("{% load boutique_imagenes %}{% imagen_responsive p.imagen 'tarjeta' p.nombre %}").render(
+            Context({'p': producto}))
+        self.assertIn('type="image/webp"', html)
+        self.assertIn('-tarjeta-800w.webp 800w', html)
+        self.assertIn('sizes="(max-width: 640px) 100vw, 400px"', html)
+
+    def test_etiqueta_sin_derivados_usa_el_original(self):
+        producto = Producto(nombre='x', imagen='productos/sin-derivados.jpg')
+        html = Template("{% load boutique_imagenes %}{% imagen_responsive p.imagen 'tarjeta' %}").render(
+            Context({'p': producto}))
+        self.assertIn('src="/media/productos/sin-derivados.jpg"', html)
+        self.assertNotIn('<picture>', html)
+
+
+EJECUCIONES = []
+
+
+@tarea
+def tarea_de_prueba(valor, fallos=0):
+    EJECUCIONES.append(valor)
+    if EJECUCIONES.count(valor) <= fallos:
+        raise RuntimeError('falla a propósito')
+
+
+class ColaTareasTests(TestCase):
+    def setUp(self):
+        EJECUCIONES.clear()
+
+    def test_ejecuta_lo_pendiente(self):
+        tarea_de_prueba.encolar('a')
+        tarea_de_prueba.encolar('b')
+        self.assertEqual(procesar_pendientes(), 2)
+        self.assertEqual(EJECUCIONES, ['a', 'b'])
+        self.assertEqual(Tarea.objects.filter(estado='completada').count(), 2)
+        self.assertEqual(procesar_pendientes(), 0)
+
+    def test_clave_de_idempotencia(self):
+        primera = tarea_de_prueba.encolar('a', clave='unica')
+        segunda = tarea_de_prueba.encolar('a', clave='unica')
+        self.assertEqual(primera.pk, segunda.pk)
+        procesar_pendientes()
+        tarea_de_prueba.encolar('a', clave='unica')
+        self.assertEqual(procesar_pendientes(), 0)
+        self.assertEqual(EJECUCIONES, ['a'])
+
+    def test_reintentos_con_espera(self):
+        nueva = encolar('tarea_de_prueba', ['a', 1])
+        procesar_pendientes()
+        nueva.refresh_from_db()
+        self.assertEqual((nueva.estado, nueva.intentos), ('pendiente', 1))
+        self.assertIn('falla a propósito', nueva.error)
+        self.assertGreater(nueva.ejecutar_despues, timezone.now())
+
+        # Vence la espera y el segundo intento funciona
+        Tarea.objects.filter(pk=nueva.pk).update(ejecutar_despues=timezone.now())
+        procesar_pendientes()
+        nueva.refresh_from_db()
+        self.assertEqual((nueva.estado, nueva.intentos), ('completada', 2))
+
+    def test_falla_al_agotar_intentos(self):
+        nueva = encolar('tarea_de_prueba', ['a', 10])
+        for _ in range(nueva.max_intentos):
+            Tarea.objects.filter(pk=nueva.pk).update(ejecutar_despues=timezone.now())
+            procesar_pendientes()
+        nueva.refresh_from_db()
+        self.assertEqual(nueva.estado, 'fallida')
+
+    def test_volver_a_encolar_revive_la_fallida(self):
+        nueva = encolar('tarea_de_prueba', ['a', 3], clave='derivados:foto.jpg')
+        for _ in range(nueva.max_intentos):
+            Tarea.objects.filter(pk=nueva.pk).update(ejecutar_despues=timezone.now())
+            procesar_pendientes()
+
+        revivida = encolar('tarea_de_prueba', ['a', 3], clave='derivados:foto.jpg')
+        self.assertEqual(revivida.pk, nueva.pk)
+        self.assertEqual((revivida.estado, revivida.intentos, revivida.error), ('pendiente', 0, ''))
+        self.assertEqual(procesar_pendientes(), 1)
+        revivida.refresh_from_db()
+        self.assertEqual(revivida.estado, 'completada')
+
+    def test_recupera_tareas_abandonadas(self):
+        nueva = tarea_de_prueba.encolar('a')
+        Tarea.objects.filter(pk=nueva.pk).update(
+            estado='en_proceso', fecha_actualizacion=timezone.now() - timedelta(hours=1))
+        self.assertEqual(procesar_pendientes(), 1)
+        self.assertEqual(EJECUCIONES, ['a'])
+
+    def test_checkout_encola_el_trabajo_posterior(self):
+        usuario = User.objects.create_user(username='cliente')
+        producto = crear_catalogo(num_categorias=1, productos_por_categoria=1, num_ofertas=0)[0]
+        Carrito.objects.create(usuario=usuario, producto=producto, cantidad=1)
+        pedido = realizar_checkout(usuario)
+        self.assertTrue(Tarea.objects.filter(nombre='pedido_realizado', argumentos=[pedido.pk]).exists())
+
+
+class PrecioEfectivoTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.usuario = User.objects.create_user(username='cliente')
+        self.producto = crear_catalogo(num_categorias=1, productos_por_categoria=1, num_ofertas=0)[0]
+        self.oferta = Oferta.objects.create(
+            nombre='Rebajas', descripcion='...', tipo_descuento='porcentaje', valor_descuento=20,
+            fecha_fin=timezone.now() + timedelta(days=7),
+        )
+        self.oferta.productos.add(self.producto)
+        procesar_pendientes()
+
+    def precio_final(self):
+        return Producto.objects.con_precio().get(pk=self.producto.pk).precio_final
+
+    def test_aplica_la_mejor_oferta_vigente(self):
+        self.assertEqual(self.precio_final(), 80)
+        fija = Oferta.objects.create(
+            nombre='Fija', descripcion='...', tipo_descuento='monto_fijo', valor_descuento=30,
+            fecha_fin=timezone.now() + timedelta(days=7),
+        )
+        fija.productos.add(self.producto)
+        procesar_pendientes()
+        self.assertEqual(self.precio_final(), 70)
+        self.assertEqual(PrecioEfectivo.objects.get(producto=self.producto).oferta, fija)
+
+    def test_desactivar_o_borrar_la_oferta_restaura_el_precio(self):
+        self.oferta.activa = False
+        self.oferta.save()
+        procesar_pendientes()
+        self.assertEqual(self.precio_final(), 100)
+
+        self.oferta.activa = True
+        self.oferta.save()
+        procesar_pendientes()
+        self.assertEqual(self.precio_final(), 80)
+
+        self.oferta.delete()
+        procesar_pendientes()
+        self.assertEqual(self.precio_final(), 100)
+
+    def test_cambio_de_precio_base(self):
+        self.producto.precio = 200
+        self.producto.save()
+        self.assertEqual(self.precio_final(), 160)
+
+    def test_carrito_y_checkout_usan_el_precio_con_descuento(self):
+        Carrito.objects.create(usuario=self.usuario, producto=self.producto, cantidad=2)
+        self.assertEqual(ResumenCarrito.objects.get(usuario=self.usuario).total, 160)
+
+        # Si la oferta termina con el producto ya en el carrito, el total se recalcula
+        self.oferta.productos.remove(self.producto)
+        procesar_pendientes()
+        self.assertEqual(ResumenCarrito.objects.get(usuario=self.usuario).total, 200)
+
+        self.oferta.productos.add(self.producto)
+        procesar_pendientes()
+        pedido = realizar_checkout(self.usuario)
+        self.assertEqual(pedido.total, 160)
+        self.assertEqual(pedido.items.get().precio, 80)
+
+    def test_catalogo_muestra_el_precio_tachado(self):
+        response = self.client.get(reverse('productos'))
+        self.assertContains(response, '<del>$100.00</del> $80.00')
+
+    def test_comando_recalcula_todo(self):
+        PrecioEfectivo.objects.update(precio=1)
+        salida = StringIO()
+        call_command('recalcular_precios', stdout=salida)
+        self.assertIn('1 precios actualizados', salida.getvalue())
+        self.assertEqual(self.precio_final(), 80)
+
+
+class BarridoOfertasTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.producto = crear_catalogo(num_categorias=1, productos_por_categoria=1, num_ofertas=0)[0]
+        ahora = timezone.now()
+        self.oferta = Oferta.objects.create(
+            nombre='Fin de semana', descripcion='...', tipo_descuento='porcentaje', valor_descuento=50,
+            fecha_inicio=ahora + timedelta(hours=1), fecha_fin=ahora + timedelta(hours=2),
+        )
+        self.oferta.productos.add(self.producto)
+        procesar_pendientes()
+
+    def estado(self):
+        self.oferta.refresh_from_db()
+        return self.oferta.vigente, Producto.objects.con_precio().get(pk=self.producto.pk).precio_final
+
+    def test_abre_y_cierra_en_los_limites(self):
+        self.assertEqual(self.estado(), (False, 100))
+        self.assertEqual(Oferta.proximo_cambio(), self.oferta.fecha_inicio)
+
+        ahora = timezone.now()
+        self.assertEqual(Oferta.barrer(ahora + timedelta(minutes=90)), ([self.oferta.pk], []))
+        self.assertEqual(self.estado(), (True, 50))
+        self.assertEqual(Oferta.proximo_cambio(ahora), self.oferta.fecha_fin)
+
+        self.assertEqual(Oferta.barrer(ahora + timedelta(hours=3)), ([], [self.oferta.pk]))
+        self.assertEqual(self.estado(), (False, 100))
+        self.assertEqual(Oferta.barrer(ahora + timedelta(hours=3)), ([], []))
+
+    def test_las_vistas_solo_miran_el_indicador(self):
+        self.assertNotContains(self.client.get(reverse('ofertas')), 'Fin de semana')
+        with self.captureOnCommitCallbacks(execute=True):
+            Oferta.barrer(timezone.now() + timedelta(minutes=90))
+        self.assertContains(self.client.get(reverse('ofertas')), 'Fin de semana')
+        self.assertEqual(len(self.client.get(reverse('api_ofertas')).json()['resultados']), 1)
+
+    def test_comando(self):
+        Oferta.objects.filter(pk=self.oferta.pk).update(fecha_inicio=timezone.now() - timedelta(minutes=1))
+        salida = StringIO()
+        call_command('barrer_ofertas', stdout=salida)
+        self.assertIn('1 ofertas abiertas, 0 cerradas', salida.getvalue())
+
+
+class MotoresSesionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        User.objects.create_user(username='cliente', password='clave-segura-123', first_name='Ana')
+
+    def test_login_y_avisos_con_cada_motor(self):
+        for motor, engine in settings.MOTORES_SESION.items():
+            with self.subTest(motor=motor), override_settings(SESSION_ENGINE=engine):
+                self.client = self.client_class()
+                response = self.client.post(
+                    reverse('login'), {'username': 'cliente', 'password': 'clave-segura-123'}, follow=True)
+                self.assertContains(response, '¡Bienvenido/a Ana!')
+                self.assertEqual(self.client.get(reverse('perfil')).status_code, 200)
+
+    def test_cookies_no_consulta_la_tabla_de_sesiones(self):
+        with override_settings(SESSION_ENGINE=settings.MOTORES_SESION['cookies']):
+            self.client.post(reverse('login'), {'username': 'cliente', 'password': 'clave-segura-123'})
+            with CaptureQueriesContext(connection) as consultas:
+                self.client.get(reverse('perfil'))
+        self.assertFalse([q for q in consultas.captured_queries if 'django_session' in q['sql']])
+
+
+class EstaticosTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.static_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.static_root, ignore_errors=True)
+
+    def test_el_catalogo_no_repite_estilos_en_linea(self):
+        crear_catalogo()
+        response = self.client.get(reverse('productos'))
+        self.assertContains(response, 'boutique/css/boutique.css')
+        self.assertNotContains(response, 'style=')
+        self.assertNotContains(response, '<style>')
+
+    def test_collectstatic_con_hash_y_precomprimido(self):
+        almacen = {**settings.STORAGES, 'staticfiles': {'BACKEND': 'boutique.estaticos.EstaticosComprimidos'}}
+        with override_settings(STATIC_ROOT=self.static_root, STORAGES=almacen):
+            call_command('collectstatic', interactive=False, verbosity=0)
+            url = static('boutique/css/boutique.css')
+            self.assertRegex(url, r'boutique\.[0-9a-f]{12}\.css$')
+            ruta = url.split('/static/', 1)[1]
+
+            fabrica = RequestFactory()
+            response = servir(fabrica.get(url, HTTP_ACCEPT_ENCODING='gzip, deflate'), ruta)
+            self.assertEqual(response['Content-Encoding'], 'gzip')
+            self.assertEqual(response['Content-Type'], 'text/css')
+            self.assertIn('immutable', response['Cache-Control'])
+            self.assertIn('Accept-Encoding', response['Vary'])
+            response.close()
+
+            response = servir(fabrica.get(url, HTTP_ACCEPT_ENCODING='gzip;q=0'), ruta)
+            self.assertFalse(response.has_header('Content-Encoding'))
+            response.close()
+
+            response = servir(fabrica.get('/'), 'boutique/css/boutique.css')
+            self.assertNotIn('immutable', response['Cache-Control'])
+            response.close()
+
+            with self.assertRaises(Http404):
+                servir(fabrica.get('/'), '../settings.py')
+
+
+class CatalogoCondicionalTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.productos = crear_catalogo(num_categorias=1, productos_por_categoria=2, num_ofertas=0)
+
+    def test_304_sin_consultas_ni_plantilla(self):
+        response = self.client.get(reverse('productos'))
+        etag = response['ETag']
+        self.assertTrue(etag.startswith('W/"'))
+        self.assertIn('no-cache', response['Cache-Control'])
+
+        with self.assertNumQueries(0), self.assertTemplateNotUsed('productos.html'):
+            response = self.client.get(reverse('productos'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_cambia_al_modificar_el_catalogo(self):
+        etag = self.client.get(reverse('productos'))['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.productos[0].save()
+        response = self.client.get(reverse('productos'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_depende_del_usuario_y_del_carrito(self):
+        etag_anonimo = self.client.get(reverse('inicio'))['ETag']
+        usuario = User.objects.create_user(username='cliente')
+        self.client.force_login(usuario)
+        etag = self.client.get(reverse('inicio'))['ETag']
+        self.assertNotEqual(etag, etag_anonimo)
+
+        Carrito.objects.create(usuario=usuario, producto=self.productos[0], cantidad=1)
+        response = self.client.get(reverse('inicio'), HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, '<span class="badge">1</span>', html=True)
+
+    def test_avisos_pendientes_fuerzan_la_respuesta_completa(self):
+        self.client.force_login(User.objects.create_user(username='cliente'))
+        # Sin stock: agregar solo deja un aviso, el catálogo y el carrito no cambian
+        Producto.objects.filter(pk=self.productos[0].pk).update(cantidad=0)
+        etag = self.client.get(reverse('productos'))['ETag']
+        self.client.get(reverse('agregar_al_carrito', args=[self.productos[0].pk]))
+        response = self.client.get(reverse('productos'), HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, 'no tiene stock disponible')
+        self.assertFalse(response.has_header('ETag'))
+
+
+class CompresionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        crear_catalogo()
+
+    def test_comprime_paginas_grandes(self):
+        response = self.client.get(reverse('productos'), HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertIn('Producto 0-0', gzip.decompress(response.content).decode())
+
+    def test_paginas_con_token_csrf_no_usan_brotli(self):
+        # Con brotli disponible: el token CSRF obliga a usar gzip, que lleva relleno aleatorio
+        with mock.patch('boutique.middleware.brotli', object()):
+            response = self.client.get(reverse('registro'), HTTP_ACCEPT_ENCODING='br, gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('csrfmiddlewaretoken', gzip.decompress(response.content).decode())
+
+    def test_respeta_el_minimo(self):
+        response = self.client.get(reverse('api_categorias'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_streaming(self):
+        contenido = [b'x' * 2000, b'y' * 2000]
+        middleware = CompresionMiddleware(lambda request: StreamingHttpResponse(iter(contenido), content_type='text/csv'))
+        response = middleware(RequestFactory().get('/', HTTP_ACCEPT_ENCODING='gzip'))
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), b''.join(contenido))
+
+
+class BenchTests(TestCase):
+    def test_siembra_un_catalogo_coherente(self):
+        usuarios = sembrar_datos(categorias=2, productos=30, ofertas=2, usuarios=3, lineas_carrito=2, pedidos=1)
+        self.assertEqual(usuarios, ['bench0', 'bench1', 'bench2'])
+        self.assertEqual(Producto.objects.count(), 30)
+        self.assertEqual(PrecioEfectivo.objects.count(), 30)
+        self.assertEqual(Oferta.objects.vigentes().count(), 2)
+        self.assertTrue(len(buscar_productos('vestido')))
+        usuario = User.objects.get(username='bench0')
+        self.assertTrue(usuario.check_password(CLAVE_USUARIOS))
+        resumen = ResumenCarrito.objects.get(usuario=usuario)
+        self.assertEqual(resumen.articulos, sum(Carrito.objects.filter(usuario=usuario).values_list('cantidad', flat=True)))
+
+    def test_compara_con_la_linea_base(self):
+        base = {'inicio': {'p95': 10.0, 'consultas': 1.0}, 'carrito': {'p95': 10.0, 'consultas': 4.0}}
+        actual = {
+            'inicio': {'p95': 11.0, 'consultas': 1.0},
+            'carrito': {'p95': 15.0, 'consultas': 5.0},
+            'nueva': {'p95': 99.0, 'consultas': 9.0},
+        }
+        self.assertEqual(comparar(actual, base), [
+            'carrito: p95 10.0 -> 15.0 ms',
+            'carrito: consultas 4.0 -> 5.0',
+        ])
+        self.assertEqual(percentil([5, 1, 4, 2, 3], 50), 3)
+        self.assertIsNone(percentil([], 95))
+
+
+class MetricasTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        registro.reiniciar()
+        crear_catalogo(num_categorias=1, productos_por_categoria=2, num_ofertas=1)
+
+    @override_settings(BOUTIQUE_SERVER_TIMING=True)
+    def test_server_timing(self):
+        timing = self.client.get(reverse('productos'))['Server-Timing']
+        self.assertRegex(timing, r'total;dur=[\d.]+, sql;dur=[\d.]+;desc="[1-9]\d* consultas", plantilla;dur=[\d.]+')
+        # Con el fragmento ya en cache la segunda vez hay aciertos
+        timing = self.client.get(reverse('productos'))['Server-Timing']
+        self.assertRegex(timing, r'cache;desc="[1-9]\d*/\d+ aciertos"')
+
+    @override_settings(BOUTIQUE_SERVER_TIMING=False)
+    def test_server_timing_solo_para_staff(self):
+        self.assertFalse(self.client.get(reverse('inicio')).has_header('Server-Timing'))
+        self.client.force_login(User.objects.create_user(username='admin', is_staff=True))
+        self.assertTrue(self.client.get(reverse('inicio')).has_header('Server-Timing'))
+
+    @override_settings(BOUTIQUE_SERVER_TIMING=False)
+    async def test_vistas_async_con_sesion(self):
+        cliente = AsyncClient()
+        await cliente.aforce_login(await User.objects.acreate(username='cliente'))
+        for nombre_url in ('api_productos', 'api_categorias', 'api_ofertas', 'inicio'):
+            response = await cliente.get(reverse(nombre_url))
+            self.assertEqual(response.status_code, 200, nombre_url)
+            self.assertFalse(response.has_header('Server-Timing'))
+
+        await cliente.aforce_login(await User.objects.acreate(username='admin', is_staff=True))
+        self.assertTrue((await cliente.get(reverse('api_categorias'))).has_header('Server-Timing'))
+
+    def test_exporta_formato_prometheus(self):
+        self.client.get(reverse('inicio'))
+        self.client.get(reverse('inicio'))
+        response = self.client.get(reverse('metricas'))
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        texto = response.content.decode()
+        self.assertIn('boutique_peticiones_total{vista="inicio",metodo="GET",estado="200"} 2', texto)
+        self.assertIn('boutique_peticion_segundos_bucket{vista="inicio",le="+Inf"} 2', texto)
+        self.assertRegex(texto, r'boutique_sql_consultas_total\{vista="inicio"\} [1-9]')
+
+        self.assertEqual(self.client.get(reverse('metricas'), REMOTE_ADDR='203.0.113.9').status_code, 404)
+
+    def test_perfila_las_peticiones_lentas(self):
+        carpeta = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, carpeta)
+        with override_settings(BOUTIQUE_PERFILAR_MUESTRA=1, BOUTIQUE_PERFILAR_LENTAS_MS=0, BOUTIQUE_PERFILES_DIR=carpeta):
+            with self.assertLogs('boutique.metricas', 'INFO'):
+                self.client.get(reverse('ofertas'))
+        perfiles = os.listdir(carpeta)
+        self.assertEqual(len(perfiles), 1)
+        self.assertIn('-ofertas-', perfiles[0])
+        pstats.Stats(os.path.join(carpeta, perfiles[0]))
+
+    def test_trazas_del_carrito_con_nivel_debug(self):
+        usuario = User.objects.create_user(username='cliente')
+        self.client.force_login(usuario)
+        producto = Producto.objects.first()
+        with self.assertLogs('boutique.views', 'DEBUG') as logs:
+            self.client.get(reverse('agregar_al_carrito', args=[producto.pk]))
+            self.client.get(reverse('carrito'))
+        self.assertEqual(logs.records[0].producto, producto.pk)
+        self.assertEqual(logs.records[-1].cantidad, 1)
+
+
+class ImportacionCatalogoTests(TestCase):
+    def setUp(self):
+        self.carpeta = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.carpeta)
+        self.productos = crear_catalogo(num_categorias=2, productos_por_categoria=2, num_ofertas=0)
+        self.categoria = self.productos[0].categoria
+
+    def archivo(self, nombre, contenido):
+        ruta = os.path.join(self.carpeta, nombre)
+        with open(ruta, 'w', encoding='utf-8', newline='') as f:
+            f.write(contenido)
+        return ruta
+
+    def importar(self, *args, **opciones):
+        salida = StringIO()
+        call_command('importar_catalogo', *args, stdout=salida, stderr=StringIO(), **opciones)
+        return salida.getvalue()
+
+    def test_ida_y_vuelta(self):
+        for extension in ('csv', 'jsonl.gz'):
+            with self.subTest(formato=extension):
+                ruta = os.path.join(self.carpeta, f'productos.{extension}')
+                call_command('exportar_catalogo', 'productos', ruta, stderr=StringIO())
+                salida = self.importar('productos', ruta)
+                self.assertIn('0 creadas, 4 actualizadas, 0 omitidas', salida)
+        self.assertEqual(Producto.objects.count(), 4)
+
+    def test_exporta_a_stdout(self):
+        salida = StringIO()
+        call_command('exportar_catalogo', 'categorias', '-', formato='jsonl', stdout=salida, stderr=StringIO())
+        filas = [json.loads(linea) for linea in salida.getvalue().splitlines()]
+        self.assertEqual([fila['nombre'] for fila in filas], ['Categoría 0', 'Categoría 1'])
+
+    def test_actualiza_por_id_y_crea_sin_id(self):
+        producto = self.productos[0]
+        ruta = self.archivo('productos.csv', (
+            'id,nombre,precio,cantidad,descripcion,categoria,disponible\n'
+            f'{producto.pk},Renombrado,80.50,3,...,{self.categoria.pk},true\n'
+            f',Nuevo,20,1,...,{self.categoria.pk},sí\n'
+        ))
+        with self.captureOnCommitCallbacks(execute=True):
+            salida = self.importar('productos', ruta, lote=1)
+        self.assertIn('1 creadas, 1 actualizadas', salida)
+        producto.refresh_from_db()
+        self.assertEqual((producto.nombre, producto.precio, producto.cantidad), ('Renombrado', Decimal('80.50'), 3))
+        # Lo que haría save(): precio efectivo y búsqueda
+        self.assertEqual(PrecioEfectivo.objects.get(producto=producto).precio, Decimal('80.50'))
+        self.assertEqual([p.nombre for p in buscar_productos('Nuevo')], ['Nuevo'])
+
+    def test_columnas_parciales_solo_actualizan_esas(self):
+        producto = self.productos[0]
+        ruta = self.archivo('stock.jsonl', json.dumps({'id': producto.pk, 'cantidad': 7}) + '\n')
+        self.importar('productos', ruta)
+        producto.refresh_from_db()
+        self.assertEqual((producto.cantidad, producto.nombre), (7, 'Producto 0-0'))
+
+        # Sin nombre ni precio no se puede crear
+        ruta = self.archivo('stock2.jsonl', json.dumps({'cantidad': 7}) + '\n')
+        with self.assertRaisesMessage(CommandError, 'fila 1: faltan columnas para crear'):
+            self.importar('productos', ruta)
+
+    def test_errores_de_fila(self):
+        ruta = self.archivo('productos.csv', (
+            'nombre,precio,descripcion,categoria\n'
+            f'Bien,10,...,{self.categoria.pk}\n'
+            f'Mal,-5,...,{self.categoria.pk}\n'
+            'Huérfano,10,...,999999\n'
+        ))
+        with self.assertRaisesMessage(CommandError, 'fila 3: precio'):
+            self.importar('productos', ruta)
+
+        antes = Producto.objects.count()
+        salida = self.importar('productos', ruta, omitir_errores=True)
+        self.assertIn('1 creadas, 0 actualizadas, 2 omitidas', salida)
+        self.assertEqual(Producto.objects.count(), antes + 1)
+
+    def test_ofertas_con_productos(self):
+        inicio = timezone.now() - timedelta(days=1)
+        fin = timezone.now() + timedelta(days=1)
+        producto = self.productos[0]
+        ruta = self.archivo('ofertas.csv', (
+            'nombre,descripcion,tipo_descuento,valor_descuento,fecha_inicio,fecha_fin,productos\n'
+            f'Mitad,...,porcentaje,50,{inicio.isoformat()},{fin.isoformat()},{producto.pk} {self.productos[1].pk}\n'
+        ))
+        self.importar('ofertas', ruta)
+        oferta = Oferta.objects.get(nombre='Mitad')
+        self.assertTrue(oferta.vigente)
+        self.assertEqual(oferta.productos.count(), 2)
+        self.assertEqual(PrecioEfectivo.objects.get(producto=producto).precio, producto.precio / 2)
+
+        # Reimportar con otra lista reemplaza la anterior y devuelve el precio
+        ruta = self.archivo('ofertas.jsonl', json.dumps({'id': oferta.pk, 'productos': [self.productos[1].pk]}) + '\n')
+        self.importar('ofertas', ruta)
+        self.assertEqual(list(oferta.productos.values_list('pk', flat=True)), [self.productos[1].pk])
+        self.assertEqual(PrecioEfectivo.objects.get(producto=producto).precio, producto.precio)
+
+    def test_id_repetido_en_el_mismo_lote(self):
+        producto = self.productos[0]
+        ruta = self.archivo('productos.jsonl', ''.join(
+            json.dumps({'id': producto.pk, 'cantidad': cantidad}) + '\n' for cantidad in (1, 2)
+        ))
+        self.importar('productos', ruta)
+        producto.refresh_from_db()
+        self.assertEqual(producto.cantidad, 2)
+
+
+class VentasTests(TestCase):
+    def setUp(self):
+        self.usuario = User.objects.create_user(username='cliente')
+        self.productos = crear_catalogo(num_categorias=2, productos_por_categoria=1, num_ofertas=0)
+        procesar_pendientes()
+
+    def comprar(self, metodo_pago='efectivo', **cantidades):
+        for producto, cantidad in zip(self.productos, (cantidades.get('a', 1), cantidades.get('b', 1))):
+            if cantidad:
+                Carrito.objects.create(usuario=self.usuario, producto=producto, cantidad=cantidad)
+        pedido = realizar_checkout(self.usuario, metodo_pago=metodo_pago)
+        procesar_pendientes()
+        return pedido
+
+    def resumen(self, por):
+        return {fila['clave']: (fila['unidades'], fila['ingresos']) for fila in VentaDiaria.objects.resumen(por)}
+
+    def test_acumula_cada_pedido_una_vez(self):
+        a, b = self.productos
+        pedido = self.comprar(a=2, b=1)
+        self.comprar(metodo_pago='tarjeta', a=1, b=0)
+        self.assertFalse(VentaDiaria.acumular(pedido.pk))
+
+        self.assertEqual(self.resumen('producto'), {
+            a.nombre: (3, 3 * a.precio),
+            b.nombre: (1, b.precio),
+        })
+        self.assertEqual(self.resumen('metodo_pago'), {
+            'efectivo': (3, 2 * a.precio + b.precio),
+            'tarjeta': (1, a.precio),
+        })
+        self.assertEqual(self.resumen('categoria')[a.categoria.nombre], (3, 3 * a.precio))
+        self.assertEqual(self.resumen('dia'), {timezone.localdate(): (4, 3 * a.precio + b.precio)})
+
+    def test_cancelar_reconstruye_el_dia(self):
+        pedido = self.comprar(a=1, b=1)
+        self.comprar(a=2, b=0)
+        incremental = self.resumen('producto')
+        self.assertEqual(VentaDiaria.reconstruir(), 2)
+        self.assertEqual(self.resumen('producto'), incremental)
+
+        pedido.estado = 'cancelado'
+        pedido.save()
+        procesar_pendientes()
+        self.assertEqual(self.resumen('dia'), {timezone.localdate(): (2, 2 * self.productos[0].precio)})
+
+    def test_admin_exporta_y_reporta(self):
+        self.comprar(a=2, b=1)
+        self.client.force_login(User.objects.create_superuser(username='admin'))
+
+        response = self.client.get(reverse('admin:boutique_pedido_exportar'), {'formato': 'csv'})
+        self.assertTrue(response.streaming)
+        lineas = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lineas[0], 'pedido,fecha_pedido,usuario,estado,metodo_pago,producto_id,producto,cantidad,precio,subtotal')
+        self.assertEqual(len(lineas), 3)
+        self.assertTrue(lineas[1].endswith(f'{self.productos[0].nombre},2,100.00,200.00'))
+
+        response = self.client.get(reverse('admin:boutique_pedido_exportar'), {'formato': 'jsonl', 'desde': '2000-01-01', 'hasta': '2000-01-31'})
+        self.assertEqual(b''.join(response.streaming_content), b'')
+
+        response = self.client.get(reverse('admin:boutique_pedido_reporte'), {'por': 'producto'})
+        self.assertContains(response, self.productos[0].nombre)
+        self.assertEqual(response.context['totales']['unidades'], 3)
+
+
+class AdminListadosTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser(username='admin'))
+        self.productos = crear_catalogo(num_categorias=2, productos_por_categoria=3, num_ofertas=1)
+
+    def agregar_filas(self, n):
+        for i in range(n):
+            usuario = User.objects.create_user(username=f'cliente{User.objects.count()}')
+            for producto in self.productos[:2]:
+                Carrito.objects.create(usuario=usuario, producto=producto, cantidad=1)
+            realizar_checkout(usuario)
+            Carrito.objects.create(usuario=usuario, producto=self.productos[2], cantidad=1)
+
+    def consultas(self, url):
+        with CaptureQueriesContext(connection) as consultas:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        return len(consultas)
+
+    def test_consultas_no_crecen_con_las_filas(self):
+        urls = [
+            reverse(f'admin:boutique_{modelo}_changelist')
+            for modelo in ('producto', 'pedido', 'itempedido', 'carrito', 'oferta', 'tarea')
+        ]
+        self.agregar_filas(2)
+        antes = [self.consultas(url) for url in urls]
+        self.agregar_filas(5)
+        self.assertEqual([self.consultas(url) for url in urls], antes)
+
+    def test_subtotal_anotado(self):
+        self.agregar_filas(1)
+        response = self.client.get(reverse('admin:boutique_carrito_changelist'), {'o': '4'})
+        linea = Carrito.objects.get()
+        self.assertEqual(response.context['cl'].result_list[0].importe, linea.subtotal())
+
+    def test_paginador_estimado(self):
+        primera, *_, ultima = Producto.objects.order_by('pk')
+        Producto.objects.filter(pk__in=[p.pk for p in self.productos[1:-1]]).delete()
+
+        class Paginador(PaginadorEstimado):
+            umbral = 0
+
+        # Sin filtros: rango de ids (sin ANALYZE no hay sqlite_stat1); con filtros, exacto
+        self.assertEqual(Paginador(Producto.objects.all(), 10).count, ultima.pk - primera.pk + 1)
+        self.assertEqual(Paginador(Producto.objects.filter(disponible=True), 10).count, 2)
+        self.assertEqual(PaginadorEstimado(Producto.objects.all(), 10).count, 2)
+
+    def test_estimacion_con_indices_parciales(self):
+        # Fuera de la condición de los índices parciales: sus filas de
+        # sqlite_stat1 cuentan menos filas que la tabla
+        Producto.objects.exclude(pk=self.productos[0].pk).update(disponible=False)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+            cursor.execute(
+                'SELECT stat FROM sqlite_stat1 WHERE idx = %s', ['producto_nombre_idx'],
+            )
+            self.assertEqual(int(cursor.fetchone()[0].split()[0]), 1)
+        self.assertEqual(estimar_filas(Producto), Producto.objects.count())
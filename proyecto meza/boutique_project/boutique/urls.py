@@ -1,15 +1,17 @@
 from django.urls import path
-from . import views
+from . import api, metricas, views
 
 urlpatterns = [
     path('', views.inicio, name='inicio'),
     path('productos/', views.productos, name='productos'),
     path('ofertas/', views.ofertas, name='ofertas'),
+    path('buscar/', views.buscar, name='buscar'),
     path('ubicaciones/', views.ubicaciones, name='ubicaciones'),
     path('registro/', views.registro, name='registro'),
     path('login/', views.login_view, name='login'),
     path('logout/', views.logout_view, name='logout'),
     path('perfil/', views.perfil, name='perfil'),
+    path('perfil/eventos/', views.eventos_pedidos, name='eventos_pedidos'),
     path('carrito/', views.carrito, name='carrito'),
     path('agregar-carrito/<int:producto_id>/', views.agregar_al_carrito, name='agregar_al_carrito'),
     path('actualizar-carrito/<int:item_id>/', views.actualizar_carrito, name='actualizar_carrito'),
@@ -17,4 +19,11 @@ urlpatterns = [
     path('realizar-pedido/', views.realizar_pedido, name='realizar_pedido'),
     path('contacto/', views.contacto, name='contacto'),
     path('acerca-de/', views.acerca_de, name='acerca_de'),
+    path('api/v1/buscar/', views.api_buscar, name='api_buscar'),
+    path('api/v1/productos/', api.productos, name='api_productos'),
+    path('api/v1/productos/<int:producto_id>/', api.producto, name='api_producto'),
+    path('api/v1/categorias/', api.categorias, name='api_categorias'),
+    path('api/v1/ofertas/', api.ofertas, name='api_ofertas'),
+    path('api/v1/carrito/', views.api_carrito, name='api_carrito'),
+    path('metricas/', metricas.ver, name='metricas'),
 ]
\ No newline at end of file
@@ -1,12 +1,30 @@
+import asyncio
+import json
+import logging
+import time
+from decimal import Decimal
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import login, authenticate, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db import connection
-from django.http import JsonResponse
-from django.db import transaction
+from django.core.handlers.asgi import ASGIRequest
+from django.db import connection, transaction
+from django.db.models import Max, OuterRef, Subquery
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_http_methods
 from django.contrib.auth.models import User
-from .models import Producto, Carrito, Pedido, ItemPedido, Categoria, Oferta
+from .models import Producto, Carrito, Pedido, Categoria, Oferta, Reserva, EventoPedido
+from .busqueda import buscar_productos
+from .cache import afragmento_en_cache
+from .context_processors import obtener_resumen_carrito
+from .paginacion import PaginaPorClave, leer_por_pagina
+from .api import error
+from .servicios import modificar_carrito, realizar_checkout, CarritoVacio, OperacionInvalida, StockInsuficiente
+
+logger = logging.getLogger(__name__)
 
 # Verificar si las tablas existen
 def check_tables_exist():
@@ -20,47 +38,99 @@ def check_tables_exist():
         return False
 
 # Vistas principales
-def inicio(request):
+# Los querysets de las vistas públicas se evalúan dentro de {% cache %}:
+# si el fragmento está en caché no se hace ninguna consulta.
+#
+# inicio, productos y ofertas son async: miran primero si el fragmento está
+# en caché y, si no, leen con el ORM async. Lo que queda perezoso (fragmento
+# en caché, datos que la plantilla no usa) se evalúa al renderizar, que sigue
+# siendo síncrono y corre en el hilo de la petición.
+arender = sync_to_async(render)
+
+
+async def _autenticado(request):
+    # En el hilo: request.user queda cargado para la plantilla sin repetir la consulta
+    return await sync_to_async(lambda: request.user.is_authenticated)()
+
+
+async def inicio(request):
+    productos = Producto.objects.disponibles().con_precio()[:6]
+    ofertas = Oferta.objects.activas()[:3]
     try:
-        productos = Producto.objects.filter(disponible=True, cantidad__gt=0)[:6]
-        ofertas = Oferta.objects.filter(activa=True)[:3]
-    except Exception as e:
-        print(f"Error cargando datos: {e}")
+        if not await afragmento_en_cache('inicio', await _autenticado(request)):
+            productos = [producto async for producto in productos]
+    except Exception:
+        logger.exception('Error cargando datos de inicio')
         productos = []
         ofertas = []
     
-    return render(request, 'inicio.html', {
+    return await arender(request, 'inicio.html', {
         'productos': productos,
         'ofertas': ofertas
     })
 
-def productos(request):
+async def productos(request):
+    # Una categoría que no es un número se ignora, igual que en buscar
+    categoria_id = _entero(request.GET.get('categoria'))
+    por_pagina = leer_por_pagina(request.GET.get('por_pagina'))
+    despues = request.GET.get('despues')
+    antes = request.GET.get('antes')
     try:
-        categoria_id = request.GET.get('categoria')
-        productos = Producto.objects.filter(disponible=True, cantidad__gt=0)
+        productos = Producto.objects.para_catalogo()
         
-        if categoria_id:
+        if categoria_id is not None:
             productos = productos.filter(categoria_id=categoria_id)
         
+        # Paginación por (nombre, id): cada página cuesta lo mismo sin importar su profundidad
+        pagina = PaginaPorClave(productos, despues=despues, antes=antes, por_pagina=por_pagina)
         categorias = Categoria.objects.all()
-    except Exception as e:
-        print(f"Error cargando productos: {e}")
-        productos = []
+        variables = (categoria_id, por_pagina, despues, antes, await _autenticado(request))
+        if not await afragmento_en_cache('productos', *variables):
+            await pagina.acargar()
+            categorias = [categoria async for categoria in categorias]
+    except Exception:
+        logger.exception('Error cargando productos', extra={'categoria': categoria_id})
+        pagina = []
         categorias = []
     
-    return render(request, 'productos.html', {
-        'productos': productos,
-        'categorias': categorias
+    return await arender(request, 'productos.html', {
+        'productos': pagina,
+        'pagina': pagina,
+        'categorias': categorias,
+        'categoria_id': categoria_id,
+        'por_pagina': por_pagina,
+        'despues': despues,
+        'antes': antes,
     })
 
-def ofertas(request):
+async def ofertas(request):
+    ofertas = Oferta.objects.activas()
     try:
-        ofertas = Oferta.objects.filter(activa=True)
-    except Exception as e:
-        print(f"Error cargando ofertas: {e}")
+        if not await afragmento_en_cache('ofertas', await _autenticado(request)):
+            ofertas = [oferta async for oferta in ofertas]
+    except Exception:
+        logger.exception('Error cargando ofertas')
         ofertas = []
     
-    return render(request, 'ofertas.html', {'ofertas': ofertas})
+    return await arender(request, 'ofertas.html', {'ofertas': ofertas})
+
+def _entero(valor):
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        return None
+
+def buscar(request):
+    texto = request.GET.get('q', '').strip()
+    categoria_id = _entero(request.GET.get('categoria'))
+    resultados = buscar_productos(texto, categoria_id, limite=48) if texto else []
+    
+    return render(request, 'buscar.html', {
+        'q': texto,
+        'categoria_id': categoria_id,
+        'productos': resultados,
+        'categorias': Categoria.objects.all(),
+    })
 
 def ubicaciones(request):
     return render(request, 'ubicaciones.html')
@@ -111,6 +181,7 @@ def registro(request):
             return redirect('inicio')
             
         except Exception as e:
+            logger.exception('Error en el registro')
             messages.error(request, f'Error en el registro: {str(e)}')
     
     return render(request, 'registro.html')
@@ -138,28 +209,97 @@ def logout_view(request):
 # Vistas protegidas (requieren login)
 @login_required
 def perfil(request):
+    # El último evento de cada pedido sale en la misma consulta: desde ahí
+    # sigue el stream de eventos_pedidos
+    ultimo_evento = EventoPedido.objects.filter(pedido=OuterRef('pk')).order_by('-id').values('id')[:1]
     try:
-        pedidos = Pedido.objects.filter(usuario=request.user).order_by('-fecha_pedido')[:10]
-    except Exception as e:
-        print(f"Error cargando pedidos: {e}")
+        pedidos = list(
+            Pedido.objects.filter(usuario=request.user).annotate(ultimo_evento=Subquery(ultimo_evento))
+            .order_by('-fecha_pedido')[:10]
+        )
+    except Exception:
+        logger.exception('Error cargando pedidos', extra={'usuario': request.user.pk})
         pedidos = []
     
-    return render(request, 'perfil.html', {'pedidos': pedidos})
+    return render(request, 'perfil.html', {
+        'pedidos': pedidos,
+        'ultimo_evento': max((pedido.ultimo_evento or 0 for pedido in pedidos), default=0),
+    })
+
+# Sin eventos durante este tiempo se manda un comentario para que los proxies no corten
+LATIDO_EVENTOS = 15
+
+def _evento_sse(evento):
+    return f'id: {evento.pk}\nevent: pedido\ndata: {json.dumps(evento.como_json())}\n\n'
+
+async def _eventos_desde(usuario_id, desde, duracion):
+    intervalo = settings.BOUTIQUE_EVENTOS_INTERVALO
+    # El navegador espera esto (en ms) antes de reconectar cuando se cierra el stream
+    yield f'retry: {int(intervalo * 1000)}\n\n'
+    fin = time.monotonic() + duracion
+    ultimo_envio = time.monotonic()
+    while True:
+        eventos = EventoPedido.objects.filter(usuario_id=usuario_id, id__gt=desde).order_by('id')[:100]
+        async for evento in eventos:
+            desde = evento.pk
+            ultimo_envio = time.monotonic()
+            yield _evento_sse(evento)
+        ahora = time.monotonic()
+        if ahora >= fin:
+            return
+        if ahora - ultimo_envio >= LATIDO_EVENTOS:
+            ultimo_envio = ahora
+            yield ': latido\n\n'
+        await asyncio.sleep(min(intervalo, fin - ahora))
+
+async def eventos_pedidos(request):
+    """Cambios de estado de los pedidos del usuario como Server-Sent Events.
+
+    Cada conexión consulta EventoPedido por (usuario, id) cada
+    BOUTIQUE_EVENTOS_INTERVALO segundos y se cierra a los
+    BOUTIQUE_EVENTOS_DURACION; el navegador se reconecta solo enviando
+    Last-Event-ID, así que no se pierde ningún cambio. Bajo WSGI un hilo no
+    puede quedarse esperando: se responde lo pendiente y se cierra.
+    """
+    if not await _autenticado(request):
+        return HttpResponse(status=401)
+    usuario_id = request.user.pk
+    try:
+        desde = int(request.headers.get('Last-Event-ID') or request.GET['desde'])
+    except (KeyError, ValueError):
+        # Sin punto de partida: solo los cambios a partir de ahora
+        desde = (await EventoPedido.objects.filter(usuario_id=usuario_id).aaggregate(m=Max('id')))['m'] or 0
+
+    if isinstance(request, ASGIRequest):
+        response = StreamingHttpResponse(
+            _eventos_desde(usuario_id, desde, settings.BOUTIQUE_EVENTOS_DURACION), content_type='text/event-stream',
+        )
+        # Que nginx no guarde los eventos en su búfer
+        response['X-Accel-Buffering'] = 'no'
+    else:
+        cuerpo = ''.join([fragmento async for fragmento in _eventos_desde(usuario_id, desde, 0)])
+        response = HttpResponse(cuerpo, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    return response
 
 @login_required
 def carrito(request):
     try:
-        items_carrito = Carrito.objects.filter(usuario=request.user)
-        total = sum(item.subtotal() for item in items_carrito)
+        # Una sola consulta: la lista se reutiliza para el total, el log y la plantilla
+        items_carrito = list(Carrito.objects.del_usuario(request.user))
+        total = obtener_resumen_carrito(request).total
         
-        # Debug en consola
-        print(f"DEBUG CARRITO - Usuario: {request.user.username}")
-        print(f"DEBUG CARRITO - Items encontrados: {items_carrito.count()}")
-        for item in items_carrito:
-            print(f"DEBUG CARRITO - {item.cantidad} x {item.producto.nombre} = ${item.subtotal()}")
+        # Detalle línea por línea solo con el nivel DEBUG activo: no se formatea en producción
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug('Carrito', extra={'usuario': request.user.pk, 'lineas': len(items_carrito), 'total': total})
+            for item in items_carrito:
+                logger.debug('Línea de carrito', extra={
+                    'usuario': request.user.pk, 'producto': item.producto_id,
+                    'cantidad': item.cantidad, 'subtotal': item.subtotal(),
+                })
             
-    except Exception as e:
-        print(f"Error cargando carrito: {e}")
+    except Exception:
+        logger.exception('Error cargando carrito', extra={'usuario': request.user.pk})
         items_carrito = []
         total = 0
     
@@ -173,30 +313,31 @@ def agregar_al_carrito(request, producto_id):
     try:
         producto = get_object_or_404(Producto, id=producto_id, disponible=True)
         
-        # Verificar stock
-        if producto.cantidad <= 0:
-            messages.error(request, f'"{producto.nombre}" no tiene stock disponible')
-            return redirect('productos')
-        
-        # Usar get_or_create para manejar el carrito
-        carrito_item, created = Carrito.objects.get_or_create(
-            usuario=request.user,
-            producto=producto,
-            defaults={'cantidad': 1}
-        )
+        with transaction.atomic():
+            # La unidad nueva se reserva junto con las que ya están en el carrito
+            en_carrito = Carrito.objects.filter(usuario=request.user, producto=producto) \
+                .values_list('cantidad', flat=True).first() or 0
+            if Reserva.reservar(request.user, {producto.pk: en_carrito + 1}):
+                messages.error(request, f'"{producto.nombre}" no tiene stock disponible')
+                return redirect('productos')
+            
+            # Usar get_or_create para manejar el carrito
+            carrito_item, created = Carrito.objects.get_or_create(
+                usuario=request.user,
+                producto=producto,
+                defaults={'cantidad': 1}
+            )
+            
+            if not created:
+                carrito_item.cantidad += 1
+                carrito_item.save()
         
-        if not created:
-            carrito_item.cantidad += 1
-            carrito_item.save()
-            messages.success(request, f'Se agregó otra unidad de "{producto.nombre}" al carrito')
-        else:
+        if created:
             messages.success(request, f'"{producto.nombre}" agregado al carrito')
+        else:
+            messages.success(request, f'Se agregó otra unidad de "{producto.nombre}" al carrito')
         
-        # Debug
-        print(f"DEBUG AGREGAR - Usuario: {request.user.username}")
-        print(f"DEBUG AGREGAR - Producto: {producto.nombre}")
-        print(f"DEBUG AGREGAR - Creado: {created}")
-        print(f"DEBUG AGREGAR - Carrito count: {Carrito.objects.filter(usuario=request.user).count()}")
+        logger.debug('Agregado al carrito', extra={'usuario': request.user.pk, 'producto': producto.pk, 'creado': created})
         
         return redirect('carrito')
         
@@ -204,6 +345,7 @@ def agregar_al_carrito(request, producto_id):
         messages.error(request, 'Producto no encontrado')
         return redirect('productos')
     except Exception as e:
+        logger.exception('Error al agregar al carrito', extra={'usuario': request.user.pk, 'producto': producto_id})
         messages.error(request, f'Error al agregar al carrito: {str(e)}')
         return redirect('productos')
 
@@ -211,18 +353,25 @@ def agregar_al_carrito(request, producto_id):
 def actualizar_carrito(request, item_id):
     if request.method == 'POST':
         try:
-            item = get_object_or_404(Carrito, id=item_id, usuario=request.user)
+            item = get_object_or_404(Carrito.objects.select_related('producto__precio_efectivo'), id=item_id, usuario=request.user)
             cantidad = int(request.POST.get('cantidad', 1))
             
-            if cantidad <= 0:
-                item.delete()
-                messages.success(request, 'Producto eliminado del carrito')
-            else:
-                item.cantidad = cantidad
-                item.save()
-                messages.success(request, 'Carrito actualizado')
+            with transaction.atomic():
+                faltan = Reserva.reservar(request.user, {item.producto_id: max(cantidad, 0)})
+                if faltan:
+                    messages.error(
+                        request, f'Solo quedan {faltan[item.producto_id]} unidades disponibles de "{item.producto.nombre}"'
+                    )
+                elif cantidad <= 0:
+                    item.delete()
+                    messages.success(request, 'Producto eliminado del carrito')
+                else:
+                    item.cantidad = cantidad
+                    item.save()
+                    messages.success(request, 'Carrito actualizado')
                 
         except Exception as e:
+            logger.exception('Error al actualizar carrito', extra={'usuario': request.user.pk, 'linea': item_id})
             messages.error(request, f'Error al actualizar carrito: {str(e)}')
     
     return redirect('carrito')
@@ -230,56 +379,75 @@ def actualizar_carrito(request, item_id):
 @login_required
 def eliminar_del_carrito(request, item_id):
     try:
-        item = get_object_or_404(Carrito, id=item_id, usuario=request.user)
-        item.delete()
+        item = get_object_or_404(Carrito.objects.select_related('producto__precio_efectivo'), id=item_id, usuario=request.user)
+        with transaction.atomic():
+            item.delete()
+            Reserva.liberar(request.user, [item.producto_id])
         messages.success(request, 'Producto eliminado del carrito')
     except Exception as e:
+        logger.exception('Error al eliminar del carrito', extra={'usuario': request.user.pk, 'linea': item_id})
         messages.error(request, f'Error al eliminar del carrito: {str(e)}')
     
     return redirect('carrito')
 
+def _carrito_json(usuario, resumen):
+    return {
+        'lineas': [
+            {
+                'id': item.id,
+                'producto': item.producto_id,
+                'nombre': item.producto.nombre,
+                'cantidad': item.cantidad,
+                'precio_final': item.producto.precio_final,
+                'subtotal': item.subtotal(),
+            }
+            for item in Carrito.objects.del_usuario(usuario).order_by('id')
+        ],
+        'articulos': resumen.articulos,
+        # Recién reconstruido el total aún no tiene los dos decimales de la columna
+        'total': Decimal(resumen.total).quantize(Decimal('0.01')),
+    }
+
+@require_http_methods(['GET', 'POST'])
+def api_carrito(request):
+    """Carrito en JSON. Un POST con ``{"operaciones": [...]}`` aplica el lote
+    entero (ver servicios.modificar_carrito) y devuelve el carrito resultante,
+    para que la página se actualice sin recargar."""
+    if not request.user.is_authenticated:
+        return error('Hace falta iniciar sesión', status=401)
+    if request.method == 'GET':
+        return JsonResponse(_carrito_json(request.user, obtener_resumen_carrito(request)))
+    
+    try:
+        datos = json.loads(request.body)
+    except ValueError:
+        return error('El cuerpo debe ser JSON')
+    operaciones = datos.get('operaciones') if isinstance(datos, dict) else None
+    try:
+        resumen = modificar_carrito(request.user, operaciones)
+    except OperacionInvalida as e:
+        return JsonResponse({'error': str(e), 'operacion': e.indice}, status=400)
+    
+    logger.debug('Carrito modificado', extra={'usuario': request.user.pk, 'operaciones': len(operaciones)})
+    return JsonResponse(_carrito_json(request.user, resumen))
+
 @login_required
-@transaction.atomic
 def realizar_pedido(request):
     try:
-        items_carrito = Carrito.objects.filter(usuario=request.user)
-        
-        if not items_carrito.exists():
-            messages.error(request, 'Tu carrito está vacío')
-            return redirect('carrito')
-        
-        # Calcular total
-        total = sum(item.subtotal() for item in items_carrito)
-        
-        # Crear pedido
-        pedido = Pedido.objects.create(
-            usuario=request.user,
-            total=total,
-            estado='pendiente',
-            metodo_pago='efectivo'
-        )
-        
-        # Crear items del pedido y actualizar stock
-        for item_carrito in items_carrito:
-            ItemPedido.objects.create(
-                pedido=pedido,
-                producto=item_carrito.producto,
-                cantidad=item_carrito.cantidad,
-                precio=item_carrito.producto.precio
-            )
-            
-            # Actualizar stock del producto
-            producto = item_carrito.producto
-            producto.cantidad -= item_carrito.cantidad
-            producto.save()
-        
-        # Vaciar carrito
-        items_carrito.delete()
+        pedido = realizar_checkout(request.user)
         
         messages.success(request, f'¡Pedido realizado exitosamente! Número de pedido: #{pedido.id}')
         return redirect('perfil')
         
+    except CarritoVacio:
+        messages.error(request, 'Tu carrito está vacío')
+        return redirect('carrito')
+    except StockInsuficiente as e:
+        for item in e.lineas:
+            messages.error(request, f'No hay stock suficiente de "{item.producto.nombre}" para {item.cantidad} unidad(es)')
+        return redirect('carrito')
     except Exception as e:
+        logger.exception('Error al realizar pedido', extra={'usuario': request.user.pk})
         messages.error(request, f'Error al realizar pedido: {str(e)}')
         return redirect('carrito')
 
@@ -298,13 +466,26 @@ def contacto(request):
 def acerca_de(request):
     return render(request, 'acerca_de.html')
 
-# API simple para AJAX
-def api_productos(request):
-    try:
-        productos = Producto.objects.filter(disponible=True).values('id', 'nombre', 'precio', 'descripcion')[:10]
-        return JsonResponse({'productos': list(productos)})
-    except:
-        return JsonResponse({'productos': []})
+# API para AJAX
+def api_buscar(request):
+    texto = request.GET.get('q', '').strip()
+    categoria_id = _entero(request.GET.get('categoria'))
+    limite = leer_por_pagina(request.GET.get('limite'), defecto=20)
+    resultados = buscar_productos(texto, categoria_id, limite=limite)
+    
+    return JsonResponse({
+        'q': texto,
+        'resultados': [
+            {
+                'id': producto.id,
+                'nombre': producto.nombre,
+                'precio': producto.precio,
+                'precio_final': producto.precio_final,
+                'categoria': producto.categoria.nombre,
+            }
+            for producto in resultados
+        ],
+    })
 
 # Manejo de errores
 def handler404(request, exception):
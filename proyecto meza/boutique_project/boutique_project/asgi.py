@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'boutique_project.settings')
+# Sin conexiones persistentes: ver CONN_MAX_AGE en settings
+os.environ.setdefault('BOUTIQUE_CONN_MAX_AGE', '0')
 
 application = get_asgi_application()
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -41,12 +42,15 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'boutique.metricas.MetricasMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'boutique.middleware.CompresionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    'boutique.middleware.CatalogoCondicionalMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
@@ -54,7 +58,8 @@ ROOT_URLCONF = 'boutique_project.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates que además mide el tiempo de render (boutique.metricas)
+        'BACKEND': 'boutique.metricas.PlantillasMedidas',
         'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -63,6 +68,8 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'boutique.context_processors.carrito',
+                'boutique.context_processors.catalogo',
             ],
         },
     },
@@ -78,7 +85,175 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Conexiones persistentes: los PRAGMA se aplican una vez por hilo.
+        # Bajo ASGI (asgi.py lo pone en 0) las consultas síncronas corren en
+        # hilos que no cierran sus conexiones al terminar la petición, así
+        # que una edad mayor que 0 acumula conexiones abiertas
+        'CONN_MAX_AGE': int(os.environ.get('BOUTIQUE_CONN_MAX_AGE', 600)),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            # BEGIN IMMEDIATE: la transacción toma el bloqueo de escritura al
+            # empezar. Con BEGIN diferido, dos transacciones que leen y luego
+            # escriben se bloquean entre sí y una falla sin esperar busy_timeout
+            'transaction_mode': 'IMMEDIATE',
+        },
+    }
+}
+
+# Lecturas del catálogo (boutique.basedatos.RouterLectura). Sin réplica es
+# otra conexión al mismo archivo, en query_only: con WAL no espera a los
+# escritores. En las pruebas es un espejo de la base de pruebas de 'default'.
+BOUTIQUE_DB_LECTURA = 'lectura'
+DATABASES[BOUTIQUE_DB_LECTURA] = {
+    **DATABASES['default'],
+    'NAME': os.environ.get('BOUTIQUE_DB_REPLICA', DATABASES['default']['NAME']),
+    'TEST': {'MIRROR': 'default'},
+}
+
+DATABASE_ROUTERS = ['boutique.basedatos.RouterLectura']
+
+# PRAGMA de cada conexión SQLite nueva (boutique.basedatos)
+BOUTIQUE_SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': int(os.environ.get('BOUTIQUE_SQLITE_ESPERA_MS', 5000)),
+    'cache_size': -32000,  # KiB
+    'mmap_size': 128 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+}
+
+
+# Cache
+# 'locmem' (por proceso) o 'archivo' (compartida entre procesos del mismo equipo)
+
+BOUTIQUE_CACHE_BACKEND = os.environ.get('BOUTIQUE_CACHE_BACKEND', 'locmem')
+
+# Segundos que vive un fragmento del catálogo; los cambios lo invalidan antes
+BOUTIQUE_CACHE_TTL = int(os.environ.get('BOUTIQUE_CACHE_TTL', 300))
+
+if BOUTIQUE_CACHE_BACKEND == 'archivo':
+    BOUTIQUE_CACHE_DIR = Path(os.environ.get('BOUTIQUE_CACHE_DIR', BASE_DIR / '.cache'))
+    CACHES = {
+        'default': {
+            'BACKEND': 'boutique.metricas.ArchivoMedida',
+            'LOCATION': BOUTIQUE_CACHE_DIR,
+            'TIMEOUT': BOUTIQUE_CACHE_TTL,
+        },
+        'sesiones': {
+            'BACKEND': 'boutique.metricas.ArchivoMedida',
+            'LOCATION': BOUTIQUE_CACHE_DIR / 'sesiones',
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        },
     }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'boutique.metricas.LocMemMedida',
+            'LOCATION': 'boutique',
+            'TIMEOUT': BOUTIQUE_CACHE_TTL,
+        },
+        'sesiones': {
+            'BACKEND': 'boutique.metricas.LocMemMedida',
+            'LOCATION': 'boutique-sesiones',
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        },
+    }
+
+
+# Sesiones (manage.py bench_sesiones compara los modos)
+# 'db': tabla django_session, una lectura por petición y escrituras bloqueantes en SQLite
+# 'cached_db': lee de la cache 'sesiones' y solo escribe en la base al modificarse
+# 'cache': solo cache; con 'locmem' cada proceso tiene sus propias sesiones
+# 'cookies': firmadas en el navegador, sin tocar la base ni la cache
+
+BOUTIQUE_SESIONES = os.environ.get('BOUTIQUE_SESIONES', 'cached_db')
+
+MOTORES_SESION = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'cache': 'django.contrib.sessions.backends.cache',
+    'cookies': 'django.contrib.sessions.backends.signed_cookies',
+}
+
+SESSION_ENGINE = MOTORES_SESION[BOUTIQUE_SESIONES]
+SESSION_CACHE_ALIAS = 'sesiones'
+
+# Los avisos viajan en su propia cookie: mostrar uno no escribe la sesión
+MESSAGE_STORAGE = 'django.contrib.messages.storage.cookie.CookieStorage'
+
+
+# Respuestas más pequeñas que esto (en bytes) se envían sin comprimir
+BOUTIQUE_COMPRESION_MINIMO = 1024
+
+
+# Cola de tareas (manage.py procesar_tareas)
+
+# True ejecuta cada tarea al confirmar la transacción, sin worker (útil en desarrollo)
+BOUTIQUE_TAREAS_SINCRONAS = os.environ.get('BOUTIQUE_TAREAS_SINCRONAS', '') == '1'
+
+# Segundos de espera antes del primer reintento; se duplica en cada fallo
+BOUTIQUE_TAREAS_ESPERA = 30
+
+# Una tarea "en proceso" más antigua que esto se considera abandonada
+BOUTIQUE_TAREAS_TIMEOUT = 600
+
+
+# Reservas de stock (manage.py liberar_reservas)
+
+# Minutos que una línea del carrito retiene sus unidades desde el último cambio
+BOUTIQUE_RESERVA_MINUTOS = int(os.environ.get('BOUTIQUE_RESERVA_MINUTOS', 15))
+
+
+# Estado de los pedidos por Server-Sent Events (vista eventos_pedidos)
+
+# Segundos entre consultas de eventos nuevos de cada conexión abierta
+BOUTIQUE_EVENTOS_INTERVALO = float(os.environ.get('BOUTIQUE_EVENTOS_INTERVALO', 2))
+
+# Segundos que dura cada conexión antes de que el navegador se reconecte
+BOUTIQUE_EVENTOS_DURACION = int(os.environ.get('BOUTIQUE_EVENTOS_DURACION', 300))
+
+
+# Instrumentación (boutique.metricas)
+# Los backends de cache y de plantillas de arriba son los de Django con contadores
+
+# Cabecera Server-Timing en cada respuesta; los usuarios staff la reciben siempre
+BOUTIQUE_SERVER_TIMING = os.environ.get('BOUTIQUE_SERVER_TIMING', '1' if DEBUG else '') == '1'
+
+# Direcciones que pueden leer /metricas/ sin iniciar sesión como staff
+BOUTIQUE_METRICAS_IPS = os.environ.get('BOUTIQUE_METRICAS_IPS', '127.0.0.1,::1').split(',')
+
+# Fracción de peticiones que corren bajo cProfile (0 = ninguna); solo se
+# guardan los perfiles de las que tarden al menos BOUTIQUE_PERFILAR_LENTAS_MS
+BOUTIQUE_PERFILAR_MUESTRA = float(os.environ.get('BOUTIQUE_PERFILAR_MUESTRA', 0))
+BOUTIQUE_PERFILAR_LENTAS_MS = int(os.environ.get('BOUTIQUE_PERFILAR_LENTAS_MS', 500))
+BOUTIQUE_PERFILES_DIR = Path(os.environ.get('BOUTIQUE_PERFILES_DIR', BASE_DIR / 'perfiles'))
+
+
+# Logging
+# BOUTIQUE_LOG_NIVEL=DEBUG muestra las trazas de carrito de las vistas
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'clave_valor': {
+            '()': 'boutique.logs.FormatoClaveValor',
+            'format': '%(asctime)s %(levelname)s %(name)s %(message)s',
+        },
+    },
+    'handlers': {
+        'consola': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'clave_valor',
+        },
+    },
+    'loggers': {
+        'boutique': {
+            'handlers': ['consola'],
+            'level': os.environ.get('BOUTIQUE_LOG_NIVEL', 'INFO'),
+            'propagate': False,
+        },
+    },
 }
 
 
@@ -117,6 +292,29 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/5.1/howto/static-files/
 
 STATIC_URL = 'static/'
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+
+# En producción collectstatic genera nombres con hash y copias .gz/.br; en
+# desarrollo se sirven los originales para no tener que recolectar tras cada cambio
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': (
+            'django.contrib.staticfiles.storage.StaticFilesStorage' if DEBUG
+            else 'boutique.estaticos.EstaticosComprimidos'
+        ),
+    },
+}
+
+# Sin servidor web delante, Django sirve STATIC_ROOT con caché larga (boutique.estaticos.servir)
+BOUTIQUE_SERVIR_ESTATICOS = os.environ.get('BOUTIQUE_SERVIR_ESTATICOS', '') == '1'
+
+# Archivos subidos (imágenes de productos y ofertas, y sus derivados)
+
+MEDIA_URL = '/media/'
+MEDIA_ROOT = BASE_DIR / 'media'
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
@@ -19,10 +19,15 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 
+from boutique import estaticos
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', include('boutique.urls')),
 ]
 
+if settings.BOUTIQUE_SERVIR_ESTATICOS:
+    urlpatterns.insert(0, path(f'{settings.STATIC_URL.strip("/")}/<path:ruta>', estaticos.servir))
+
 if settings.DEBUG:
     urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file